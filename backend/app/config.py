@@ -9,9 +9,7 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # --- Carregamento explícito do .env ---
 # Força a leitura do arquivo .env usando o caminho absoluto.
 dotenv_path = BASE_DIR / ".env"
-print(f"DEBUG: Tentando carregar .env de: {dotenv_path}")
-load_success = load_dotenv(dotenv_path)
-print(f"DEBUG: Carregamento do .env {'BEM SUCEDIDO' if load_success else 'FALHOU'}. Verifique se o arquivo existe e se as chaves estão corretas.")
+load_dotenv(dotenv_path)
 
 # --- Definição das Configurações ---
 class Settings(BaseSettings):
@@ -23,6 +21,75 @@ class Settings(BaseSettings):
     APP_NAME: str = "Chamada Facial API"
     APP_VERSION: str = "1.0.0"
     SIMILARITY_THRESHOLD: float = 0.6  # Limiar de confiança (0.0 a 1.0)
+
+    # Perfil de implantação: "full" (CRUD + reconhecimento) ou "crud" (só
+    # turmas/professores/alunos/presencas, sem carregar modelos nem galeria)
+    APP_PROFILE: str = "full"
+
+    # Índice aproximado (IVF) da galeria de rostos
+    ANN_ENABLED: bool = False          # Usa o índice em galerias grandes
+    ANN_MIN_GALLERY_SIZE: int = 5000   # Abaixo disto, busca exaustiva
+    ANN_NPROBE: int = 8                # Listas visitadas (recall x latência)
+    ANN_INDEX_DIR: str = ""            # Diretório do índice em disco (vazio = não salva)
+
+    # Busca em dois estágios por protótipos de aluno (matching_service)
+    PROTOTYPE_MIN_ROWS: int = 256  # Abaixo disto, a varredura completa é mais barata
+    PROTOTYPE_TOP_K: int = 5       # Alunos re-ranqueados foto a foto no 1º passo
+
+    # Armazenamento da matriz de busca: float32, float16 ou int8 (quantizado,
+    # com re-ranqueamento exato em float32)
+    GALLERY_STORAGE_MODE: str = "float32"
+    # Snapshot da galeria em disco, aberto com mmap pelos workers (vazio = desligado)
+    GALLERY_SNAPSHOT_DIR: str = ""
+    # Intervalo (s) da sincronização incremental da galeria (0 = desligada)
+    GALLERY_SYNC_INTERVAL: float = 5.0
+    # Páginas de face_embeddings buscadas em paralelo na carga completa
+    GALLERY_LOAD_WORKERS: int = 4
+
+    # Limites de upload de imagens (0 = sem limite)
+    MAX_UPLOAD_BYTES: int = 15 * 1024 * 1024  # 413 acima disto
+    MAX_IMAGE_PIXELS: int = 50_000_000        # 413 acima disto (largura x altura)
+
+    # Perfis de detecção de rosto (face_service.DETECTION_PROFILES)
+    DETECTION_PROFILE: str = "fast"                # Reconhecimento (quiosque)
+    ENROLLMENT_DETECTION_PROFILE: str = "accurate" # Cadastro de fotos
+
+    # Cache de quadros quase idênticos do quiosque (frame_cache)
+    FRAME_CACHE_TTL: float = 2.0         # Validade (s) de cada resultado (0 = desligado)
+    FRAME_CACHE_SIZE: int = 256          # Entradas no total (LRU)
+    FRAME_CACHE_MAX_DISTANCE: int = 4    # Bits diferentes aceitos no dHash do rosto (de 64)
+
+    # Filtro de qualidade antes da extração de embeddings (quality_service)
+    QUALITY_GATE_ENABLED: bool = True
+    QUALITY_MIN_FACE_SIZE: int = 60       # Lado mínimo do rosto (px, imagem 300x300)
+    QUALITY_MIN_BRIGHTNESS: float = 40.0  # Brilho médio mínimo do rosto (0-255)
+    QUALITY_MAX_BRIGHTNESS: float = 220.0 # Brilho médio máximo do rosto (0-255)
+    QUALITY_MAX_CLIPPED: float = 0.5      # Fração máxima de pixels saturados
+    QUALITY_MIN_SHARPNESS: float = 30.0   # Variância mínima do Laplaciano
+
+    # Processos para detecção/encoding/DeepFace (worker_pool; 0 = no thread
+    # da requisição). Cada processo carrega os próprios modelos na memória
+    RECOGNITION_WORKERS: int = 0
+
+    # Micro-batching do embedding DeepFace e da busca na galeria (batching)
+    BATCH_MAX_SIZE: int = 16        # Itens por lote (<= 1 desliga)
+    BATCH_MAX_WAIT_MS: float = 5.0  # Janela de coleta de um lote (0 desliga)
+
+    # Etapas do reconhecimento híbrido em paralelo: DeepFace começa logo após
+    # a detecção, junto com o face_recognition (always_both), ou de forma
+    # especulativa, cancelada se o face_recognition tiver alta confiança (smart)
+    HYBRID_PARALLEL_STAGES: bool = True
+    HYBRID_STAGE_WORKERS: int = 8   # Threads da etapa DeepFace concorrente
+
+    # Aquecimento dos modelos e da galeria na inicialização (warmup); /ready
+    # responde 503 até terminar. Desligado, /ready fica pronto de imediato
+    WARMUP_ENABLED: bool = True
+    # Etapas que falham são repetidas em background até darem certo
+    WARMUP_RETRY_DELAY: float = 2.0  # Espera antes da 1ª nova tentativa (dobra a cada uma)
+    WARMUP_RETRY_MAX_DELAY: float = 60.0  # Teto da espera entre tentativas
+
+    # Reconhecimento restrito às turmas do quiosque
+    RECOGNITION_GLOBAL_FALLBACK: bool = False  # Busca em todos os alunos se não houver match na turma
     
     # Configuração Pydantic (Permite que o Pydantic leia .env, mas forçamos
     # o carregamento acima para garantir a ordem)
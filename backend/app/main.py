@@ -2,15 +2,50 @@
 main.py
 --------
 Main FastAPI application file.
+
+APP_PROFILE selects what this process serves:
+- full: CRUD plus face registration/recognition (models warmed up on startup)
+- crud: turmas/professores/alunos/presencas CRUD only; the recognition
+  stack (face_recognition, DeepFace, TensorFlow) is never imported
 """
 
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from app.config import settings
 from app.routers import (
     turmas, professores, alunos, presencas
 )
+from app.services.db_service import close_async_db_manager
+from app.services.worker_pool import shutdown_recognition_pool
+
+APP_PROFILES = ("full", "crud")
+
+if settings.APP_PROFILE not in APP_PROFILES:
+    raise ValueError(
+        f"Unknown APP_PROFILE '{settings.APP_PROFILE}'. "
+        f"Options: {', '.join(APP_PROFILES)}"
+    )
+
+RECOGNITION_ENABLED = settings.APP_PROFILE == "full"
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Startup warm-up; shutdown of the process pool and the async DB client"""
+    if RECOGNITION_ENABLED:
+        from app.services.warmup import warmup_state
+
+        # Runs in the background: /ready reports 503 until every stage is done
+        warmup_state.start()
+    yield
+    shutdown_recognition_pool()
+    await close_async_db_manager()
 
-app = FastAPI(title="Sistema de Chamada Automática")
+
+app = FastAPI(title="Sistema de Chamada Automática", lifespan=lifespan)
 
 # CORS configuration
 # Add your frontend URLs here
@@ -31,6 +66,12 @@ app.add_middleware(
 )
 
 # Include routers
+if RECOGNITION_ENABLED:
+    from app.routers import reconhecimento
+
+    # Before alunos: /alunos/galeria/status and /alunos/reconhecer/* would
+    # otherwise be captured by the CRUD /alunos/{aluno_id} routes
+    app.include_router(reconhecimento.router)
 app.include_router(turmas.router)
 app.include_router(professores.router)
 app.include_router(alunos.router)
@@ -43,6 +84,7 @@ def root():
     return {
         "message": "Sistema de Chamada Automática API",
         "version": "3.0",
+        "profile": settings.APP_PROFILE,
         "description": "Face recognition attendance system",
         "endpoints": {
             "turmas": "/turmas - Manage classes",
@@ -51,11 +93,32 @@ def root():
             "presencas": "/presencas - Manage attendance",
             "cadastrar": "/alunos/cadastrar - Register student with photos",
             "reconhecer": "/alunos/reconhecer - Recognize face and register attendance",
-            "teste": "/alunos/reconhecer/teste - Test face recognition"
+            "teste": "/alunos/reconhecer/teste - Test face recognition",
+            "health": "/health - Liveness check",
+            "ready": "/ready - Readiness check (models and gallery warmed up)"
         }
     }
 
 
+@app.get("/health")
+def health():
+    """Liveness check: the process is up (models may still be loading)"""
+    return {"status": "ok"}
+
+
+@app.get("/ready")
+def ready():
+    """Readiness check: 503 until the startup warm-up has finished"""
+    if not RECOGNITION_ENABLED:
+        # crud profile: nothing to warm up
+        return {"pronto": True, "etapas": {}}
+
+    from app.services.warmup import warmup_state
+
+    status = warmup_state.status()
+    return JSONResponse(status_code=200 if status["pronto"] else 503, content=status)
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000, reload=True)
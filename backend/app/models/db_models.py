@@ -6,8 +6,8 @@ Matches the PostgreSQL schema created in database_schema.sql
 """
 
 from sqlalchemy import (
-    Column, Integer, String, Boolean, ForeignKey,
-    Float, LargeBinary, Text, TIMESTAMP
+    Column, Integer, BigInteger, String, Boolean, ForeignKey,
+    Float, LargeBinary, Text, TIMESTAMP, CheckConstraint
 )
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -158,6 +158,12 @@ class FaceEmbedding(Base):
         nullable=False,
         index=True
     )
+    modelo = Column(
+        String(50),
+        nullable=False,
+        default="face_recognition",
+        index=True
+    )
     embedding = Column(LargeBinary, nullable=False)
     foto_nome = Column(String(255), nullable=True)
     created_at = Column(TIMESTAMP(timezone=True), default=datetime.utcnow)
@@ -168,7 +174,37 @@ class FaceEmbedding(Base):
     def __repr__(self):
         return (
             f"<FaceEmbedding(id={self.id}, aluno_id={self.aluno_id}, "
-            f"foto='{self.foto_nome}')>"
+            f"modelo='{self.modelo}', foto='{self.foto_nome}')>"
+        )
+
+
+# =====================================================
+# MODEL: GalleryTombstone (Gallery change log)
+# =====================================================
+class GalleryTombstone(Base):
+    __tablename__ = "gallery_tombstones"
+    __table_args__ = (
+        CheckConstraint(
+            "tipo IN ('embedding', 'aluno', 'purge')",
+            name="gallery_tombstones_tipo_check"
+        ),
+    )
+
+    id = Column(BigInteger, primary_key=True, index=True)
+    tipo = Column(String(20), nullable=False)  # 'embedding', 'aluno' or 'purge'
+    embedding_id = Column(Integer, nullable=True)
+    aluno_id = Column(Integer, nullable=True)  # NULL on purge markers
+    # Purge markers only: highest tombstone id removed by the purge
+    purged_until_id = Column(BigInteger, nullable=True)
+    created_at = Column(
+        TIMESTAMP(timezone=True), default=datetime.utcnow, index=True
+    )
+
+    def __repr__(self):
+        return (
+            f"<GalleryTombstone(id={self.id}, tipo='{self.tipo}', "
+            f"embedding_id={self.embedding_id}, aluno_id={self.aluno_id}, "
+            f"purged_until_id={self.purged_until_id})>"
         )
 
 
@@ -1,5 +1,8 @@
 """
 Routers package - API endpoint modules
+
+reconhecimento is not imported here: app.main includes it only in the
+"full" APP_PROFILE, so CRUD-only deployments never load the recognition stack.
 """
 from . import (
     turmas,
@@ -0,0 +1,525 @@
+"""
+app/routers/reconhecimento.py
+-----------------------------
+API endpoints for face registration and recognition (served under /alunos).
+
+Kept apart from the student CRUD router so CRUD-only deployments
+(APP_PROFILE=crud) never import the recognition stack.
+
+Database access goes through AsyncSupabaseDB (get_async_db_manager), so
+Supabase round trips never block the event loop; CPU-bound recognition
+work runs in the threadpool (and the process pool, if configured).
+"""
+import asyncio
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException, Request, UploadFile, File, Form
+from app.services.db_service import get_async_db_manager, AsyncSupabaseDB
+from app.services.gallery_service import get_face_gallery, FaceGallery
+from app.services.matching_service import GallerySnapshot
+from app.config import settings
+from app.services.face_service import (
+    RecognitionContext, ImageTooLargeError, get_face_encoding,
+    FACE_RECOGNITION_MODEL, FACE_RECOGNITION_TOLERANCE, DETECTION_PROFILES
+)
+from app.services.deepface_service import get_deepface_encoding, embedding_batcher, DEEPFACE_MODEL
+from app.services.embedding_codec import encode_embedding, to_bytea_literal
+from app.services.hybrid_face_service import recognize_face_hybrid
+from app.services.frame_cache import FrameCache, get_frame_cache, make_key
+from app.services.worker_pool import get_recognition_pool
+from app.services.batching import match_batcher
+from fastapi.concurrency import run_in_threadpool
+from app.models.response import ResultadoSimilaridade
+from typing import List, Dict, Any, Optional
+
+
+router = APIRouter(prefix="/alunos", tags=["Reconhecimento"])
+
+
+async def _save_embedding(
+    db: AsyncSupabaseDB,
+    gallery: FaceGallery,
+    aluno_id: int,
+    nome: str,
+    turma_id: Optional[int],
+    embedding,
+    modelo: str,
+    foto_nome: str
+) -> None:
+    """Persist one embedding and patch it into the in-memory gallery"""
+    row = await db.add_embedding(
+        aluno_id=aluno_id,
+        embedding_data=to_bytea_literal(
+            encode_embedding(embedding, model_name=modelo)
+        ),
+        foto_nome=foto_nome,
+        modelo=modelo
+    )
+    gallery.add_face(
+        aluno_id=aluno_id,
+        embedding=embedding,
+        modelo=modelo,
+        foto_nome=foto_nome,
+        nome=nome,
+        turma_id=turma_id,
+        embedding_id=row.get('id')
+    )
+
+
+def _detection_profile(perfil: Optional[str], default: str) -> str:
+    """Validate the 'perfil' form field (detection profile name)"""
+    perfil = perfil or default
+    if perfil not in DETECTION_PROFILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown detection profile '{perfil}'. "
+                   f"Options: {', '.join(DETECTION_PROFILES)}"
+        )
+    return perfil
+
+
+@router.post("/cadastrar")
+async def cadastrar_com_foto(
+    nome: str = Form(...),
+    fotos: List[UploadFile] = File(...),
+    turma_id: Optional[int] = Form(None),
+    perfil: Optional[str] = Form(None),
+    db: AsyncSupabaseDB = Depends(get_async_db_manager),
+    gallery: FaceGallery = Depends(get_face_gallery)
+):
+    """
+    Register a new student with face photos.
+    
+    Supports multiple photos for better recognition accuracy.
+    Each photo stores one embedding per recognition model
+    (face_recognition and the DeepFace model used by the hybrid service).
+    
+    Parameters:
+    - nome: Student name
+    - fotos: One or more face photos
+    - turma_id: Optional class ID
+    - perfil: Detection profile (default: ENROLLMENT_DETECTION_PROFILE)
+    - db: Database manager (injected)
+    
+    Returns:
+    - Success message with student ID and photo count
+    """
+    if not fotos or len(fotos) == 0:
+        raise HTTPException(status_code=400, detail="At least one photo is required")
+    perfil = _detection_profile(perfil, settings.ENROLLMENT_DETECTION_PROFILE)
+    
+    # Convert turma_id=0 to None (0 is not a valid foreign key)
+    if turma_id == 0:
+        turma_id = None
+    
+    # Create student
+    aluno_data = await db.create_aluno(
+        nome=nome,
+        turma_id=turma_id,
+        check_professor=False
+    )
+    aluno_id = aluno_data['id']
+    
+    # Process each photo and save one embedding per model
+    successful_embeddings = 0
+    deepface_embeddings = 0
+    failed_photos = []
+    deepface_failures = []
+    
+    for idx, foto in enumerate(fotos):
+        try:
+            foto_nome = foto.filename or f"photo_{idx+1}.jpg"
+            
+            # Decode and detect once; both models share the context
+            context = await run_in_threadpool(
+                RecognitionContext.from_upload,
+                foto, profile=perfil, pool=get_recognition_pool()
+            )
+            
+            # Extract face encoding (CPU-bound: off the event loop, and in
+            # the process pool when RECOGNITION_WORKERS > 0)
+            encoding = await run_in_threadpool(get_face_encoding, context)
+            if encoding is None:
+                failed_photos.append(f"{foto.filename or f'photo_{idx+1}'} (no face detected)")
+                continue
+            
+            # DeepFace embedding, so the hybrid DeepFace stage compares
+            # against vectors from its own embedding space
+            df_encoding = await run_in_threadpool(get_deepface_encoding, context)
+            
+            # Both inserts are independent: run them together
+            saves = [_save_embedding(
+                db, gallery, aluno_id, nome, turma_id,
+                encoding, FACE_RECOGNITION_MODEL, foto_nome
+            )]
+            if df_encoding is not None:
+                saves.append(_save_embedding(
+                    db, gallery, aluno_id, nome, turma_id,
+                    df_encoding, DEEPFACE_MODEL, foto_nome
+                ))
+            fr_saved, *df_saved = await asyncio.gather(*saves, return_exceptions=True)
+            if isinstance(fr_saved, Exception):
+                raise fr_saved
+            successful_embeddings += 1
+            # The face_recognition embedding is already saved: a failed
+            # DeepFace insert is reported on its own, not as a failed photo
+            if df_saved and isinstance(df_saved[0], Exception):
+                print(f"⚠️ DeepFace embedding not saved for {foto_nome}: {df_saved[0]}")
+                deepface_failures.append(f"{foto_nome} (error: {str(df_saved[0])})")
+            else:
+                deepface_embeddings += len(df_saved)
+            
+        except ImageTooLargeError as e:
+            failed_photos.append(f"{foto.filename or f'photo_{idx+1}'} (too large: {str(e)})")
+        except Exception as e:
+            failed_photos.append(f"{foto.filename or f'photo_{idx+1}'} (error: {str(e)})")
+    
+    # Build response
+    response = {
+        "mensagem": f"{nome} cadastrado com sucesso!",
+        "id": aluno_id,
+        "fotos_processadas": successful_embeddings,
+        "embeddings_deepface": deepface_embeddings,
+        "total_fotos": len(fotos)
+    }
+    
+    if failed_photos:
+        response["fotos_com_erro"] = failed_photos
+    if deepface_failures:
+        response["embeddings_deepface_com_erro"] = deepface_failures
+    
+    if successful_embeddings == 0:
+        # Rollback: delete student if no photos were processed
+        await db.delete_aluno(aluno_id)
+        gallery.remove_aluno(aluno_id)
+        raise HTTPException(
+            status_code=400,
+            detail=f"No faces detected in any photo. Errors: {', '.join(failed_photos)}"
+        )
+    
+    return response
+
+
+def _scope_gallery(
+    snapshot: GallerySnapshot,
+    turma_id: Optional[int],
+    turma_ids: Optional[List[int]]
+) -> GallerySnapshot:
+    """
+    Restrict recognition to the given classes (if any were sent).
+    Falls back to a global search only when RECOGNITION_GLOBAL_FALLBACK is set.
+    """
+    scope = set(turma_ids or [])
+    if turma_id:
+        scope.add(turma_id)
+    if not scope:
+        return snapshot
+    return snapshot.scoped(
+        scope, global_fallback=settings.RECOGNITION_GLOBAL_FALLBACK
+    )
+
+
+def _recognition_context(foto: UploadFile, perfil: str) -> RecognitionContext:
+    """Read and decode the upload once (413 if too large, 400 if not an image)"""
+    try:
+        return RecognitionContext.from_upload(
+            foto, profile=perfil, pool=get_recognition_pool()
+        )
+    except ImageTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid image: {e}")
+
+
+def _same_face(context: RecognitionContext, entry) -> bool:
+    """
+    Whether a near-identical cached frame can be reused for this frame.
+
+    A cached recognition leads to an attendance write, so the face in this
+    frame must match the face that produced it (face_recognition distance
+    within FACE_RECOGNITION_TOLERANCE). Cached "not recognized" results are
+    reused as is.
+    """
+    result, encoding = entry
+    if not result.aluno_id:
+        return True
+    if encoding is None:
+        return False
+    current = context.encoding()
+    return current is not None and bool(
+        np.linalg.norm(current - encoding) <= FACE_RECOGNITION_TOLERANCE
+    )
+
+
+# Upper bound for the top_k form field of the recognition endpoints
+MAX_TOP_K = 20
+
+
+def _candidatos(result) -> List[Dict[str, Any]]:
+    """Ranked top-k candidates of a recognition as ResultadoSimilaridade"""
+    return [
+        ResultadoSimilaridade(
+            id=candidate["aluno_id"],
+            nome=candidate["nome"] or "",
+            similaridade=round(candidate["similaridade"], 2),
+            check_professor=candidate["check_professor"]
+        ).dict()
+        for candidate in result.candidates
+    ]
+
+
+@router.post("/reconhecer")
+async def reconhecer_rosto(
+    request: Request,
+    foto: UploadFile = File(...),
+    turma_id: Optional[int] = Form(None),
+    turma_ids: Optional[List[int]] = Form(None),
+    top_k: int = Form(0, ge=0, le=MAX_TOP_K),
+    perfil: Optional[str] = Form(None),
+    cliente: Optional[str] = Form(None),
+    db: AsyncSupabaseDB = Depends(get_async_db_manager),
+    gallery: FaceGallery = Depends(get_face_gallery),
+    cache: FrameCache = Depends(get_frame_cache)
+):
+    """
+    Recognize a face and register attendance.
+    
+    Uses hybrid recognition (face_recognition + DeepFace) for better accuracy.
+    Near-identical frames from the same kiosk within FRAME_CACHE_TTL reuse
+    the previous result ("cache": true).
+    
+    Parameters:
+    - foto: Face photo to recognize
+    - turma_id: Optional class ID; only its students are considered
+    - turma_ids: Optional list of class IDs (multi-class kiosks)
+    - top_k: If > 0, also return the top_k closest students ("candidatos")
+    - perfil: Detection profile ("fast", "default", "accurate"; default: DETECTION_PROFILE)
+    - cliente: Optional kiosk identifier for the frame cache (default: client IP)
+    - db: Database manager (injected)
+    
+    Returns:
+    - Recognition result with student info and attendance ID
+    """
+    perfil = _detection_profile(perfil, settings.DETECTION_PROFILE)
+    
+    # Get all registered faces (decoded, from the in-memory gallery)
+    known_faces = await run_in_threadpool(gallery.snapshot)
+    
+    if len(known_faces) == 0:
+        raise HTTPException(
+            status_code=404,
+            detail="No registered students found"
+        )
+    
+    context = await run_in_threadpool(_recognition_context, foto, perfil)
+    
+    # Same kiosk, same parameters and gallery version: near-identical
+    # frames reuse the previous result
+    cache_key = make_key(
+        cliente or (request.client.host if request.client else ""),
+        tuple(sorted(set(turma_ids or []) | ({turma_id} if turma_id else set()))),
+        perfil, top_k, gallery.version
+    )
+    cached_entry = await run_in_threadpool(
+        cache.get, cache_key, context.image,
+        face_box=lambda: context.face_location,
+        verify=lambda entry: _same_face(context, entry)
+    )
+    cached = cached_entry is not None
+    if cached:
+        result = cached_entry[0]
+    else:
+        # Perform hybrid recognition (restricted to the kiosk's classes, if any)
+        known_faces = _scope_gallery(known_faces, turma_id, turma_ids)
+        result = await run_in_threadpool(
+            recognize_face_hybrid, context, known_faces, mode="smart", top_k=top_k
+        )
+        if result.method_used != "error":
+            # The encoding (memoized on the context by the face_recognition
+            # stage) lets a later near-identical frame re-check the identity
+            encoding = await run_in_threadpool(context.encoding) if result.aluno_id else None
+            await run_in_threadpool(
+                cache.put, cache_key, context.image, (result, encoding), context.face_location
+            )
+    candidatos = _candidatos(result)
+    
+    if not result.aluno_id:
+        return {
+            "reconhecido": False,
+            "mensagem": (
+                "Image rejected by quality check" if result.rejection
+                else "Face not recognized"
+            ),
+            "confianca": result.confidence,
+            "metodo": result.method_used,
+            "tempo_processamento": result.processing_time,
+            "qualidade": result.rejection,
+            "candidatos": candidatos,
+            "cache": cached
+        }
+    
+    # Get student info
+    aluno = await db.get_aluno_by_id(result.aluno_id)
+    if not aluno:
+        raise HTTPException(status_code=404, detail="Student not found in database")
+    
+    # Check if student is validated
+    if not aluno.get('check_professor'):
+        return {
+            "reconhecido": True,
+            "aluno_id": result.aluno_id,
+            "aluno_nome": aluno['nome'],
+            "confianca": result.confidence,
+            "metodo": result.method_used,
+            "mensagem": "Student pending professor validation",
+            "presenca_registrada": False,
+            "candidatos": candidatos,
+            "cache": cached
+        }
+    
+    # Check if student is currently in class (for entry/exit logic)
+    # Register attendance
+    aluno_turma_id = aluno.get('turma_id')
+    presenca = await db.create_presenca(
+        aluno_id=result.aluno_id,
+        turma_id=aluno_turma_id if aluno_turma_id else 0,
+        confianca=result.confidence if result.confidence else 0.0
+    )
+    
+    return {
+        "reconhecido": True,
+        "aluno_id": result.aluno_id,
+        "aluno_nome": aluno['nome'],
+        "turma_id": aluno_turma_id,
+        "confianca": result.confidence,
+        "metodo": result.method_used,
+        "tempo_processamento": result.processing_time,
+        "presenca_registrada": True,
+        "presenca_id": presenca['id'],
+        "data_hora": presenca['data_hora'],
+        "mensagem": "Presença registrada com sucesso",
+        "candidatos": candidatos,
+        "cache": cached
+    }
+
+
+@router.post("/reconhecer/teste")
+async def testar_reconhecimento(
+    foto: UploadFile = File(...),
+    turma_id: Optional[int] = Form(None),
+    turma_ids: Optional[List[int]] = Form(None),
+    top_k: int = Form(0, ge=0, le=MAX_TOP_K),
+    perfil: Optional[str] = Form(None),
+    db: AsyncSupabaseDB = Depends(get_async_db_manager),
+    gallery: FaceGallery = Depends(get_face_gallery)
+):
+    """
+    Test face recognition without registering attendance.
+    
+    Useful for testing and validation.
+    
+    Parameters:
+    - foto: Face photo to test
+    - turma_id: Optional class ID; only its students are considered
+    - turma_ids: Optional list of class IDs (multi-class kiosks)
+    - top_k: If > 0, also return the top_k closest students ("candidatos")
+    - perfil: Detection profile ("fast", "default", "accurate"; default: DETECTION_PROFILE)
+    - db: Database manager (injected)
+    
+    Returns:
+    - Recognition result without attendance registration
+    """
+    perfil = _detection_profile(perfil, settings.DETECTION_PROFILE)
+    
+    # Get all registered faces (decoded, from the in-memory gallery)
+    known_faces = await run_in_threadpool(gallery.snapshot)
+    
+    if len(known_faces) == 0:
+        raise HTTPException(
+            status_code=404,
+            detail="No registered students found"
+        )
+    
+    # Perform hybrid recognition (restricted to the kiosk's classes, if any)
+    context = await run_in_threadpool(_recognition_context, foto, perfil)
+    known_faces = _scope_gallery(known_faces, turma_id, turma_ids)
+    result = await run_in_threadpool(
+        recognize_face_hybrid, context, known_faces, mode="smart", top_k=top_k
+    )
+    candidatos = _candidatos(result)
+    
+    if not result.aluno_id:
+        return {
+            "reconhecido": False,
+            "mensagem": (
+                "Image rejected by quality check" if result.rejection
+                else "Face not recognized"
+            ),
+            "confianca": result.confidence,
+            "metodo": result.method_used,
+            "tempo_processamento": result.processing_time,
+            "qualidade": result.rejection,
+            "candidatos": candidatos,
+            "detalhes": result.to_dict()
+        }
+    
+    # Get student info
+    aluno = await db.get_aluno_by_id(result.aluno_id)
+    
+    return {
+        "reconhecido": True,
+        "aluno_id": result.aluno_id,
+        "aluno_nome": aluno['nome'] if aluno else "Unknown",
+        "turma_id": aluno.get('turma_id') if aluno else None,
+        "confianca": result.confidence,
+        "metodo": result.method_used,
+        "tempo_processamento": result.processing_time,
+        "check_professor": aluno.get('check_professor') if aluno else False,
+        "candidatos": candidatos,
+        "detalhes": result.to_dict()
+    }
+
+
+@router.get("/galeria/status")
+def galeria_status(gallery: FaceGallery = Depends(get_face_gallery)):
+    """
+    Status of the in-memory face gallery on this API node.
+    
+    Returns:
+    - geracao: highest face_embeddings id loaded (high-water mark)
+    - lapide: last gallery_tombstones id applied
+    - atraso_segundos: seconds since the last successful sync
+    """
+    return gallery.status()
+
+
+@router.get("/reconhecer/cache")
+def cache_status(cache: FrameCache = Depends(get_frame_cache)):
+    """
+    Hit/miss counters of the kiosk frame cache on this API node.
+    
+    Returns:
+    - exact_hits / near_hits: frames answered from the cache (same pixels /
+      face at the same position with a face-crop perceptual hash within
+      FRAME_CACHE_MAX_DISTANCE bits)
+    - rejected: near-identical frames whose face did not match the cached
+      student (recognized again)
+    - misses, expired, evictions, entradas, taxa_acerto
+    """
+    return cache.stats()
+
+
+@router.get("/reconhecer/lotes")
+def batching_status():
+    """
+    Occupancy of the recognition micro-batches on this API node.
+    
+    Returns, per stage ("deepface" embeddings, "galeria" matching):
+    - lotes / itens / media_por_lote: batches run and items served
+    - ocupacao: items / (batches x BATCH_MAX_SIZE)
+    - espera_media_ms: mean time an item waited for its batch
+    - tamanhos: histogram of batch sizes
+    """
+    return {
+        "deepface": embedding_batcher.stats(),
+        "galeria": match_batcher.stats(),
+    }
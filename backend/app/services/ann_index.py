@@ -0,0 +1,319 @@
+"""
+app/services/ann_index.py
+-------------------------
+Índice aproximado (IVF) para galerias grandes.
+
+Os embeddings são agrupados por k-means em listas invertidas; uma busca
+visita apenas as `nprobe` listas cujos centróides estão mais próximos do
+probe, em vez de varrer a galeria inteira. Os candidatos devolvidos são
+re-ranqueados com a distância exata pela EmbeddingMatrix.
+
+O índice guarda apenas centróides, o raio de cada lista (maior distância
+de um membro ao centróide) e a atribuição chave → lista (as chaves são os
+ids de face_embeddings); os vetores continuam na galeria. Inserções e
+remoções são incrementais (sync) e o índice pode ser salvo em disco para
+evitar o treino a cada inicialização.
+
+Pela desigualdade triangular, nenhum membro de uma lista não visitada fica
+a menos de d(q, centróide) - raio do probe. search_bounded devolve esse
+limite junto com os candidatos, e a EmbeddingMatrix só aceita o candidato
+do índice quando ele é provadamente o mais próximo.
+"""
+import os
+import threading
+from typing import Callable, Dict, Iterable, Optional, Tuple, Union
+
+import numpy as np
+
+# Parâmetros padrão (podem ser sobrescritos pelas configurações)
+DEFAULT_NPROBE = 8
+KMEANS_ITERATIONS = 10
+KMEANS_MAX_TRAINING_POINTS_PER_LIST = 64
+MAX_LISTS = 1024
+# Re-treina quando a galeria cresce além deste fator do tamanho de treino
+RETRAIN_GROWTH_FACTOR = 4
+# Folga relativa nos raios (erro de arredondamento em float32)
+RADIUS_TOLERANCE = 1e-5
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+def _nearest_centroids(
+    vectors: np.ndarray,
+    centroids: np.ndarray,
+    centroid_sq_norms: np.ndarray
+) -> np.ndarray:
+    # ||x - c||² = ||x||² - 2 x·c + ||c||²  (||x||² é constante por linha)
+    scores = centroid_sq_norms[None, :] - 2.0 * (vectors @ centroids.T)
+    return np.argmin(scores, axis=1)
+
+
+class IVFIndex:
+    """
+    Índice IVF (inverted file) sobre os embeddings de um modelo.
+
+    Attributes:
+        n_lists: Número de listas invertidas
+        normalize: Se True, agrupa vetores normalizados (métricas cosine e
+                   euclidean_l2)
+        trained_size: Tamanho da galeria usada no último treino
+    """
+
+    def __init__(self, normalize: bool = False):
+        self.normalize = normalize
+        self.centroids: Optional[np.ndarray] = None
+        self.centroid_sq_norms: Optional[np.ndarray] = None
+        self.radius: Optional[np.ndarray] = None  # por lista (-inf se vazia)
+        self.trained_size = 0
+        self._assignments: Dict[int, int] = {}   # chave -> lista
+        self._lists: list = []                   # lista -> set de chaves
+        self._lock = threading.Lock()
+
+    @property
+    def n_lists(self) -> int:
+        return 0 if self.centroids is None else self.centroids.shape[0]
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def __len__(self) -> int:
+        return len(self._assignments)
+
+    # ========================================
+    # TREINO
+    # ========================================
+
+    def train(
+        self,
+        vectors: np.ndarray,
+        n_lists: Optional[int] = None,
+        seed: int = 0
+    ) -> None:
+        """
+        Treina os centróides com k-means.
+
+        Args:
+            vectors: Matriz (N, D) com a galeria atual
+            n_lists: Número de listas; padrão sqrt(N) (limitado a MAX_LISTS)
+            seed: Semente para reprodutibilidade
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.normalize:
+            vectors = _normalize(vectors)
+        n = vectors.shape[0]
+        if n_lists is None:
+            n_lists = min(int(np.sqrt(n)), MAX_LISTS)
+        n_lists = max(1, min(n_lists, n))
+
+        rng = np.random.default_rng(seed)
+        max_points = n_lists * KMEANS_MAX_TRAINING_POINTS_PER_LIST
+        sample = vectors
+        if n > max_points:
+            sample = vectors[rng.choice(n, max_points, replace=False)]
+
+        centroids = sample[rng.choice(sample.shape[0], n_lists, replace=False)].copy()
+        for _ in range(KMEANS_ITERATIONS):
+            labels = _nearest_centroids(
+                sample, centroids, np.einsum('ij,ij->i', centroids, centroids)
+            )
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=n_lists).astype(np.float32)
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, None]
+            if self.normalize:
+                centroids = _normalize(centroids)
+
+        with self._lock:
+            self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+            self.centroid_sq_norms = np.einsum(
+                'ij,ij->i', self.centroids, self.centroids
+            )
+            self.radius = np.full(n_lists, -np.inf, dtype=np.float32)
+            self.trained_size = n
+            self._assignments = {}
+            self._lists = [set() for _ in range(n_lists)]
+
+    def needs_training(self, gallery_size: int) -> bool:
+        """Indica se o índice ainda não foi treinado ou ficou desatualizado"""
+        if not self.is_trained:
+            return True
+        return gallery_size > self.trained_size * RETRAIN_GROWTH_FACTOR
+
+    # ========================================
+    # INSERÇÃO / REMOÇÃO
+    # ========================================
+
+    def add(self, keys: Iterable[int], vectors: np.ndarray) -> None:
+        """Atribui novos embeddings às listas mais próximas (e amplia os raios)"""
+        keys = list(keys)
+        if not keys:
+            return
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(keys), -1)
+        if self.normalize:
+            vectors = _normalize(vectors)
+        labels = _nearest_centroids(
+            vectors, self.centroids, self.centroid_sq_norms
+        )
+        spread = np.linalg.norm(
+            vectors.astype(np.float64) - self.centroids[labels], axis=1
+        )
+        with self._lock:
+            np.maximum.at(self.radius, labels, spread * (1 + RADIUS_TOLERANCE))
+            for key, label in zip(keys, labels.tolist()):
+                previous = self._assignments.get(key)
+                if previous is not None:
+                    self._lists[previous].discard(key)
+                self._assignments[key] = label
+                self._lists[label].add(key)
+
+    def remove(self, keys: Iterable[int]) -> None:
+        """
+        Remove embeddings do índice (chaves desconhecidas são ignoradas).
+
+        Os raios não encolhem: continuam sendo um limite superior válido.
+        """
+        with self._lock:
+            for key in keys:
+                label = self._assignments.pop(key, None)
+                if label is not None:
+                    self._lists[label].discard(key)
+
+    def sync(
+        self,
+        keys: np.ndarray,
+        vectors: Union[np.ndarray, Callable[[np.ndarray], np.ndarray]]
+    ) -> bool:
+        """
+        Sincroniza o índice com a galeria atual de forma incremental.
+
+        Insere as chaves novas e remove as que não existem mais, sem
+        re-treinar os centróides.
+
+        Args:
+            keys: Chave de cada linha da galeria
+            vectors: Matriz (N, D) ou função linhas -> vetores (ex.:
+                     EmbeddingMatrix.row_vectors em storage quantizado)
+
+        Returns:
+            True se o índice foi alterado
+        """
+        with self._lock:
+            current = set(self._assignments)
+        wanted = set(keys.tolist())
+        removed = current - wanted
+        added = wanted - current
+        if removed:
+            self.remove(removed)
+        if added:
+            rows = np.flatnonzero(np.isin(keys, list(added)))
+            batch = vectors(rows) if callable(vectors) else vectors[rows]
+            self.add(keys[rows].tolist(), batch)
+        return bool(removed or added)
+
+    # ========================================
+    # BUSCA
+    # ========================================
+
+    def search(self, probe: np.ndarray, nprobe: int = DEFAULT_NPROBE) -> np.ndarray:
+        """
+        Retorna as chaves candidatas das `nprobe` listas mais próximas.
+
+        Args:
+            probe: Embedding do rosto desconhecido
+            nprobe: Listas visitadas (mais listas = maior recall e latência)
+        """
+        return self.search_bounded(probe, nprobe)[0]
+
+    def search_bounded(
+        self,
+        probe: np.ndarray,
+        nprobe: int = DEFAULT_NPROBE
+    ) -> Tuple[np.ndarray, float]:
+        """
+        Como search, mais um limite inferior para as listas não visitadas.
+
+        Returns:
+            (chaves candidatas, menor d(q, centróide) - raio entre as listas
+            não visitadas e não vazias). A distância é a do espaço do índice
+            (euclidiana nos vetores crus, ou nos normalizados com
+            normalize=True); inf se todas as listas foram visitadas.
+        """
+        query = np.asarray(probe, dtype=np.float32).reshape(1, -1)
+        if self.normalize:
+            query = _normalize(query)
+        query = query[0]
+        scores = self.centroid_sq_norms - 2.0 * (self.centroids @ query)
+        nprobe = max(1, min(nprobe, self.n_lists))
+        if nprobe < self.n_lists:
+            probed = np.argpartition(scores, nprobe - 1)[:nprobe]
+        else:
+            probed = np.arange(self.n_lists)
+        with self._lock:
+            candidates = [key for label in probed.tolist()
+                          for key in self._lists[label]]
+            radius = self.radius.copy()
+
+        unprobed = np.ones(self.n_lists, dtype=bool)
+        unprobed[probed] = False
+        unprobed &= radius > -np.inf
+        bound = np.inf
+        if unprobed.any():
+            # float64 para o limite não herdar o cancelamento do score
+            centroid_distances = np.linalg.norm(
+                self.centroids[unprobed].astype(np.float64) - query, axis=1
+            )
+            bound = float(np.maximum(centroid_distances - radius[unprobed], 0.0).min())
+        return np.asarray(candidates, dtype=np.int64), bound
+
+    # ========================================
+    # PERSISTÊNCIA
+    # ========================================
+
+    def save(self, path: str) -> None:
+        """Salva centróides e atribuições em um arquivo .npz"""
+        with self._lock:
+            keys = np.fromiter(self._assignments.keys(), dtype=np.int64,
+                               count=len(self._assignments))
+            labels = np.fromiter(self._assignments.values(), dtype=np.int32,
+                                 count=len(self._assignments))
+            centroids = self.centroids
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp.npz"
+        np.savez(
+            tmp_path,
+            centroids=centroids,
+            radius=self.radius,
+            keys=keys,
+            labels=labels,
+            normalize=np.array(self.normalize),
+            trained_size=np.array(self.trained_size)
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "IVFIndex":
+        """Carrega um índice salvo com save()"""
+        with np.load(path) as data:
+            index = cls(normalize=bool(data["normalize"]))
+            index.centroids = data["centroids"].astype(np.float32)
+            index.centroid_sq_norms = np.einsum(
+                'ij,ij->i', index.centroids, index.centroids
+            )
+            index.trained_size = int(data["trained_size"])
+            index._lists = [set() for _ in range(index.n_lists)]
+            index.radius = np.full(index.n_lists, -np.inf, dtype=np.float32)
+            if "radius" not in data.files:
+                # Arquivo sem raios (versão antiga): as atribuições são
+                # descartadas e o próximo sync re-insere tudo, medindo os raios
+                return index
+            index.radius = data["radius"].astype(np.float32)
+            for key, label in zip(data["keys"].tolist(),
+                                  data["labels"].tolist()):
+                index._assignments[key] = label
+                index._lists[label].add(key)
+        return index
@@ -0,0 +1,177 @@
+"""
+app/services/batching.py
+------------------------
+Micro-batching dinâmico das etapas de embedding e de busca na galeria.
+
+Na troca de turma dezenas de quiosques chamam /alunos/reconhecer no mesmo
+segundo e cada requisição rodaria sozinha o forward do DeepFace e o
+cálculo de distâncias. Um MicroBatcher fica na frente da etapa:
+
+1. A requisição entrega seu item e espera (no thread do threadpool)
+2. O primeiro item de um lote abre uma janela de BATCH_MAX_WAIT_MS; o lote
+   fecha ao fim da janela ou ao atingir BATCH_MAX_SIZE itens
+3. Itens com a mesma chave (mesmo modelo, mesma matriz e métrica) são
+   processados juntos por uma única chamada da função de lote, e cada
+   resultado volta para a requisição que o pediu
+
+Na galeria só a busca exaustiva entra na fila (EmbeddingMatrix.can_batch):
+com índice ANN, matriz quantizada ou protótipos cada probe já segue um
+caminho próprio, e a janela seria só espera.
+
+Com BATCH_MAX_WAIT_MS = 0 ou BATCH_MAX_SIZE <= 1 o item é processado na
+hora, sem fila. stats() expõe a ocupação dos lotes para calibrar a janela.
+"""
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+from app.config import settings
+
+
+class MicroBatcher:
+    """
+    Agrupa itens enviados por threads diferentes em lotes.
+
+    Attributes:
+        name: Nome da etapa (métricas)
+        max_size: Itens por lote
+        max_wait: Janela de coleta, em segundos
+    """
+
+    def __init__(
+        self,
+        name: str,
+        process: Callable[[Hashable, List[Any]], List[Any]],
+        max_size: int,
+        max_wait_ms: float,
+        concurrency: int = 1
+    ):
+        """
+        Args:
+            name: Nome da etapa (métricas)
+            process: Função (chave, itens) -> resultados, na mesma ordem
+            max_size: Itens por lote
+            max_wait_ms: Janela de coleta em milissegundos
+            concurrency: Lotes processados ao mesmo tempo (ex.: processos
+                         do pool de reconhecimento)
+        """
+        self.name = name
+        self.max_size = max_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._process = process
+        self._concurrency = max(concurrency, 1)
+        self._queue: "queue.Queue[Tuple[Hashable, Any, Future, float]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._sizes: Counter = Counter()
+        self._items = 0
+        self._wait_total = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_wait > 0 and self.max_size > 1
+
+    def submit(self, key: Hashable, item: Any) -> Any:
+        """Processa o item em um lote e devolve o seu resultado (bloqueia)"""
+        if not self.enabled:
+            return self._process(key, [item])[0]
+        future: Future = Future()
+        self._queue.put((key, item, future, time.perf_counter()))
+        self._start()
+        return future.result()
+
+    def _start(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self._concurrency,
+                    thread_name_prefix=f"batch-{self.name}"
+                )
+                self._thread = threading.Thread(
+                    target=self._collect_loop, name=f"batcher-{self.name}", daemon=True
+                )
+                self._thread.start()
+
+    def _collect_loop(self) -> None:
+        while True:
+            pending = [self._queue.get()]
+            deadline = time.perf_counter() + self.max_wait
+            while len(pending) < self.max_size:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    pending.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+
+            groups: Dict[Hashable, List[Tuple[Any, Future, float]]] = {}
+            for key, item, future, queued_at in pending:
+                groups.setdefault(key, []).append((item, future, queued_at))
+            for key, entries in groups.items():
+                self._executor.submit(self._run_batch, key, entries)
+
+    def _run_batch(self, key: Hashable, entries: List[Tuple[Any, Future, float]]) -> None:
+        started = time.perf_counter()
+        with self._lock:
+            self._sizes[len(entries)] += 1
+            self._items += len(entries)
+            self._wait_total += sum(started - queued_at for _, _, queued_at in entries)
+        try:
+            results = self._process(key, [item for item, _, _ in entries])
+        except Exception as e:
+            for _, future, _ in entries:
+                future.set_exception(e)
+            return
+        for (_, future, _), result in zip(entries, results):
+            future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        """Ocupação dos lotes desde o início do processo"""
+        with self._lock:
+            sizes = dict(sorted(self._sizes.items()))
+            items, wait_total = self._items, self._wait_total
+        batches = sum(sizes.values())
+        return {
+            "ativo": self.enabled,
+            "tamanho_maximo": self.max_size,
+            "janela_ms": round(self.max_wait * 1000, 2),
+            "lotes": batches,
+            "itens": items,
+            "media_por_lote": round(items / batches, 2) if batches else None,
+            "ocupacao": round(items / (batches * self.max_size), 4) if batches else None,
+            "espera_media_ms": round(wait_total / items * 1000, 3) if items else None,
+            "tamanhos": sizes,
+        }
+
+
+def _match_batch(key: Tuple[Any, str, Optional[float]], probes: List[np.ndarray]):
+    matrix, metric, threshold = key
+    return matrix.best_matches(probes, metric, threshold)
+
+
+# Busca na galeria: um produto matriz-matriz por (matriz, métrica, limiar)
+match_batcher = MicroBatcher(
+    "galeria", _match_batch,
+    max_size=settings.BATCH_MAX_SIZE,
+    max_wait_ms=settings.BATCH_MAX_WAIT_MS
+)
+
+
+def best_match(matrix, probe: np.ndarray, metric: str, threshold: Optional[float]):
+    """
+    EmbeddingMatrix.best_match passando pelo match_batcher quando a matriz
+    consegue processar o lote de uma vez (EmbeddingMatrix.can_batch);
+    nos demais caminhos a busca roda na hora, sem esperar a janela.
+    """
+    if not matrix.can_batch:
+        return matrix.best_match(probe, metric, threshold)
+    return match_batcher.submit((matrix, metric, threshold), probe)
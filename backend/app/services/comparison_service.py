@@ -3,28 +3,20 @@ app/services/comparison_service.py
 -----------------------------------
 Serviço para comparar modelos de reconhecimento facial (face_recognition vs DeepFace).
 Calcula métricas: Cohen's Kappa, Macro F1, Precision, Recall, Accuracy.
+
+pandas, scikit-learn, matplotlib e seaborn só são importados pelos métodos
+que os usam, para que importar este módulo não pese na API.
 """
 import numpy as np
-import pandas as pd
-from typing import Dict, List, Tuple, Optional
-from sklearn.metrics import (
-    cohen_kappa_score, 
-    f1_score, 
-    precision_score, 
-    recall_score, 
-    accuracy_score,
-    confusion_matrix,
-    classification_report
-)
+from typing import TYPE_CHECKING, Dict, List, Tuple, Optional
 import json
 import time
 from datetime import datetime
-import matplotlib
-matplotlib.use('Agg')  # Backend não-interativo
-import matplotlib.pyplot as plt
-import seaborn as sns
 import os
 
+if TYPE_CHECKING:
+    import pandas as pd
+
 class ModelComparison:
     """Classe para comparar dois modelos de reconhecimento facial."""
     
@@ -93,6 +85,16 @@ class ModelComparison:
         Returns:
             Dicionário com todas as métricas calculadas
         """
+        from sklearn.metrics import (
+            cohen_kappa_score,
+            f1_score,
+            precision_score,
+            recall_score,
+            accuracy_score,
+            confusion_matrix,
+            classification_report
+        )
+
         data = self.results[model_name]
         y_true = np.array(data["ground_truth"])
         y_pred = np.array(data["predictions"])
@@ -227,6 +229,10 @@ class ModelComparison:
     
     def _generate_plots(self, comparison: Dict, output_dir: str, timestamp: str):
         """Gera gráficos comparativos."""
+        import matplotlib
+        matplotlib.use('Agg')  # Backend não-interativo
+        import matplotlib.pyplot as plt
+        import seaborn as sns
         
         # Configurar estilo
         sns.set_theme(style="whitegrid")
@@ -318,13 +324,15 @@ class ModelComparison:
         
         print(f"Gráficos salvos em: {output_dir}")
     
-    def export_to_dataframe(self) -> pd.DataFrame:
+    def export_to_dataframe(self) -> "pd.DataFrame":
         """
         Exporta os resultados para um DataFrame pandas.
         
         Returns:
             DataFrame com todos os resultados
         """
+        import pandas as pd
+
         data = []
         
         for i in range(len(self.results["face_recognition"]["predictions"])):
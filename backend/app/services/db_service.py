@@ -3,10 +3,20 @@ app/services/db_service.py
 --------------------------
 Database service for Supabase REST API communication.
 Updated for new schema: turmas, professores, alunos, presencas, face_embeddings.
+
+SupabaseDB wraps the synchronous client (CRUD routes, gallery loading and
+scripts). AsyncSupabaseDB has the same methods as coroutines on the async
+client, whose pooled HTTP connections serve the async recognition routes
+without blocking the event loop. Both build their queries in
+SupabaseQueries; only the execution (SupabaseDB._run, AsyncSupabaseDB._run)
+and the multi-query methods differ.
 """
-from supabase import create_client, Client
+import asyncio
+from abc import ABC, abstractmethod
+from supabase import create_client, acreate_client, Client, AsyncClient
 from app.config import settings
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, AsyncIterator, Callable, Iterator, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timezone
 import pytz
 
@@ -63,78 +73,128 @@ def format_records_timestamps(
     return [format_record_timestamps(record) for record in records]
 
 
-class SupabaseDB:
-    """Manages communication with Supabase using REST API"""
-    
-    def __init__(self, url: str, key: str):
-        self.client: Client = create_client(url, key)
+def _rows(response) -> List[Dict[str, Any]]:
+    return response.data
+
+
+def _formatted_rows(response) -> List[Dict[str, Any]]:
+    return format_records_timestamps(response.data)
+
+
+def _first_row(response) -> Dict[str, Any]:
+    return response.data[0] if response.data else {}
+
+
+def _first_row_or_none(response) -> Optional[Dict[str, Any]]:
+    return response.data[0] if response.data else None
+
+
+def _single_row(response) -> Optional[Dict[str, Any]]:
+    return response.data if response.data else None
+
+
+def _changed(response) -> bool:
+    return len(response.data) > 0
+
+
+class SupabaseQueries(ABC):
+    """
+    Queries shared by SupabaseDB and AsyncSupabaseDB.
+
+    Every single-query method builds its PostgREST query here and passes it
+    to _run together with the function that shapes the response. Only _run
+    differs: SupabaseDB executes the query and returns the result, while
+    AsyncSupabaseDB returns a coroutine to be awaited. Methods that chain
+    several queries (professors, paging) are written in each class on top
+    of the builders below.
+    """
+
+    FACE_COLUMNS = (
+        'id, aluno_id, modelo, embedding, foto_nome, created_at, '
+        'alunos(nome, turma_id, ativo, check_professor)'
+    )
+    TOMBSTONE_COLUMNS = 'id, embedding_id, aluno_id, tipo, purged_until_id'
+    # Rows per request when paging (PostgREST's default max-rows). Keyset
+    # pages stop at an empty page, so a lower server limit still works.
+    PAGE_SIZE = 1000
+
+    client: Any
+
+    @abstractmethod
+    def _run(self, query, shape: Callable[[Any], Any]) -> Any:
+        """Execute the query and shape its response (sync or async)"""
 
     # ========================================
     # TURMAS (Classes)
     # ========================================
-    
+
     def list_turmas(self) -> List[Dict[str, Any]]:
         """Get all classes"""
-        response = self.client.table('turmas').select('*').execute()
-        return format_records_timestamps(response.data)
-    
+        return self._run(
+            self.client.table('turmas').select('*'), _formatted_rows
+        )
+
     def create_turma(self, nome: str) -> Dict[str, Any]:
         """Create a new class"""
-        response = self.client.table('turmas').insert({
-            "nome": nome
-        }).execute()
-        return response.data[0] if response.data else {}
-    
+        return self._run(
+            self.client.table('turmas').insert({"nome": nome}), _first_row
+        )
+
     def delete_turma(self, turma_id: int) -> bool:
         """Delete a class by ID"""
-        response = self.client.table('turmas').delete().eq(
-            'id', turma_id
-        ).execute()
-        return len(response.data) > 0
+        return self._run(
+            self.client.table('turmas').delete().eq('id', turma_id), _changed
+        )
 
     # ========================================
     # PROFESSORES (Professors)
     # ========================================
-    
+
     def list_professores(self) -> List[Dict[str, Any]]:
         """Get all professors"""
-        response = self.client.table('professores').select('*').execute()
-        return format_records_timestamps(response.data)
-    
-    def create_professor(
-        self, nome: str, email: str, turma_ids: List[int]
-    ) -> Dict[str, Any]:
-        """Create a new professor and assign classes"""
-        # Create professor
-        prof_response = self.client.table('professores').insert({
+        return self._run(
+            self.client.table('professores').select('*'), _formatted_rows
+        )
+
+    def delete_professor(self, professor_id: int) -> bool:
+        """Delete a professor by ID"""
+        return self._run(
+            self.client.table('professores').delete().eq('id', professor_id),
+            _changed
+        )
+
+    def _insert_professor_query(self, nome: str, email: str):
+        return self.client.table('professores').insert({
             "nome": nome,
             "email": email
-        }).execute()
-        
-        if not prof_response.data:
-            return {}
-        
-        professor = prof_response.data[0]
-        professor_id = professor['id']
-        
-        # Assign classes (turmas_professores)
-        if turma_ids:
-            associations = [
-                {"professor_id": professor_id, "turma_id": tid}
-                for tid in turma_ids
-            ]
-            self.client.table('turmas_professores').insert(
-                associations
-            ).execute()
-        
-        return professor
-    
-    def update_professor(
-        self, professor_id: int, nome: str = None, email: str = None,
-        turma_ids: List[int] = None, ativo: bool = None
+        })
+
+    def _update_professor_query(self, professor_id: int, update_data: Dict[str, Any]):
+        return self.client.table('professores').update(
+            update_data
+        ).eq('id', professor_id)
+
+    def _professor_query(self, professor_id: int):
+        return self.client.table('professores').select(
+            '*'
+        ).eq('id', professor_id).single()
+
+    def _assign_turmas_query(self, professor_id: int, turma_ids: List[int]):
+        associations = [
+            {"professor_id": professor_id, "turma_id": tid}
+            for tid in turma_ids
+        ]
+        return self.client.table('turmas_professores').insert(associations)
+
+    def _unassign_turmas_query(self, professor_id: int):
+        return self.client.table('turmas_professores').delete().eq(
+            'professor_id', professor_id
+        )
+
+    @staticmethod
+    def _professor_update_data(
+        nome: str = None, email: str = None, ativo: bool = None
     ) -> Dict[str, Any]:
-        """Update a professor and their assigned classes"""
-        # Update professor basic info
         update_data = {}
         if nome is not None:
             update_data["nome"] = nome
@@ -142,49 +202,12 @@ class SupabaseDB:
             update_data["email"] = email
         if ativo is not None:
             update_data["ativo"] = ativo
-        
-        if update_data:
-            prof_response = self.client.table('professores').update(
-                update_data
-            ).eq('id', professor_id).execute()
-            
-            if not prof_response.data:
-                return {}
-        
-        # Update class assignments if turma_ids is provided
-        if turma_ids is not None:
-            # Remove existing associations
-            self.client.table('turmas_professores').delete().eq(
-                'professor_id', professor_id
-            ).execute()
-            
-            # Add new associations
-            if turma_ids:
-                associations = [
-                    {"professor_id": professor_id, "turma_id": tid}
-                    for tid in turma_ids
-                ]
-                self.client.table('turmas_professores').insert(
-                    associations
-                ).execute()
-        
-        # Return updated professor
-        response = self.client.table('professores').select(
-            '*'
-        ).eq('id', professor_id).single().execute()
-        return response.data if response.data else {}
-    
-    def delete_professor(self, professor_id: int) -> bool:
-        """Delete a professor by ID"""
-        response = self.client.table('professores').delete().eq(
-            'id', professor_id
-        ).execute()
-        return len(response.data) > 0
+        return update_data
 
     # ========================================
     # ALUNOS (Students)
     # ========================================
-    
+
     def list_alunos(
         self, turma_id: Optional[int] = None
     ) -> List[Dict[str, Any]]:
@@ -192,23 +215,24 @@ class SupabaseDB:
         query = self.client.table('alunos').select('*, turmas(nome)')
         if turma_id:
             query = query.eq('turma_id', turma_id)
-        response = query.execute()
-        return format_records_timestamps(response.data)
-    
+        return self._run(query, _formatted_rows)
+
     def get_aluno_by_id(self, aluno_id: int) -> Optional[Dict[str, Any]]:
         """Get a student by ID"""
-        response = self.client.table('alunos').select(
-            '*, turmas(nome)'
-        ).eq('id', aluno_id).single().execute()
-        return response.data if response.data else None
-    
+        return self._run(
+            self.client.table('alunos').select(
+                '*, turmas(nome)'
+            ).eq('id', aluno_id).single(),
+            _single_row
+        )
+
     def get_aluno_by_name(self, nome: str) -> Optional[Dict[str, Any]]:
         """Get a student by name"""
-        response = self.client.table('alunos').select(
-            '*'
-        ).eq('nome', nome).limit(1).execute()
-        return response.data[0] if response.data else None
-    
+        return self._run(
+            self.client.table('alunos').select('*').eq('nome', nome).limit(1),
+            _first_row_or_none
+        )
+
     def create_aluno(
         self, nome: str, turma_id: Optional[int] = None,
         check_professor: bool = False
@@ -221,57 +245,189 @@ class SupabaseDB:
         # Only include turma_id if it's provided (not None)
         if turma_id is not None:
             aluno_data["turma_id"] = turma_id
-        
-        response = self.client.table('alunos').insert(
-            aluno_data
-        ).execute()
-        return response.data[0] if response.data else {}
-    
+
+        return self._run(
+            self.client.table('alunos').insert(aluno_data), _first_row
+        )
+
     def update_aluno(
         self, aluno_id: int, **fields
     ) -> Optional[Dict[str, Any]]:
         """Update student fields"""
-        response = self.client.table('alunos').update(fields).eq(
-            'id', aluno_id
-        ).execute()
-        return response.data[0] if response.data else None
-    
+        return self._run(
+            self.client.table('alunos').update(fields).eq('id', aluno_id),
+            _first_row_or_none
+        )
+
     def delete_aluno(self, aluno_id: int) -> bool:
         """Delete a student by ID"""
-        response = self.client.table('alunos').delete().eq(
-            'id', aluno_id
-        ).execute()
-        return len(response.data) > 0
+        return self._run(
+            self.client.table('alunos').delete().eq('id', aluno_id), _changed
+        )
 
     # ========================================
     # FACE EMBEDDINGS
     # ========================================
-    
-    def get_all_faces(self) -> List[Dict[str, Any]]:
-        """Get all face embeddings with student info"""
-        response = self.client.table('face_embeddings').select(
-            'aluno_id, embedding, foto_nome, alunos(nome, turma_id)'
-        ).execute()
-        return response.data
-    
+
+    def _first_faces_page_query(self):
+        """First id-ordered page, with the exact row count"""
+        return self.client.table('face_embeddings').select(
+            self.FACE_COLUMNS, count='exact'
+        ).order('id').limit(self.PAGE_SIZE)
+
+    def _last_face_id_query(self):
+        """Newest face embedding id (upper end of the id spans)"""
+        return self.client.table('face_embeddings').select(
+            'id'
+        ).order('id', desc=True).limit(1)
+
+    def _faces_span_query(self, after: int, until: int, page_size: int):
+        """Next keyset page of face embeddings with id in (after, until]"""
+        return self.client.table('face_embeddings').select(
+            self.FACE_COLUMNS
+        ).gt('id', after).lte('id', until).order('id').limit(page_size)
+
+    def _id_spans(self, first, last) -> Tuple[int, int, List[Tuple[int, int]]]:
+        """
+        Exact row count, page size and the id spans (after, until] left
+        after the first page, one span per page of expected rows.
+
+        The spans split ids, not offsets: a row deleted during the load
+        cannot shift a later row out of the page that should read it.
+        Each span is read with keyset pages, so sparse or dense ids both
+        work. If the server cap is lower than PAGE_SIZE, the page size
+        shrinks to what the first page returned.
+        """
+        expected = first.count if first.count is not None else len(first.data)
+        page_size = self.PAGE_SIZE
+        if 0 < len(first.data) < min(self.PAGE_SIZE, expected):
+            page_size = len(first.data)
+        if len(first.data) < page_size or not last.data:
+            return expected, page_size, []
+
+        after, until = first.data[-1]['id'], last.data[0]['id']
+        if until <= after:
+            return expected, page_size, []
+        remaining = max(expected - len(first.data), 1)
+        count = min(-(-remaining // page_size), until - after)
+        bounds = [after + (until - after) * i // count for i in range(count + 1)]
+        return expected, page_size, list(zip(bounds[:-1], bounds[1:]))
+
+    @staticmethod
+    def _report_load(
+        expected: int, loaded: int, pages: int,
+        stats: Optional[Dict[str, int]]
+    ) -> None:
+        if loaded < expected:
+            # Rows deleted during the load (their tombstones are synced)
+            print(f"⚠️ face_embeddings: {loaded} of {expected} rows loaded")
+        if stats is not None:
+            stats.update(expected=expected, loaded=loaded, pages=pages)
+
+    def _late_rows_query(
+        self, table: str, columns: str, last_id: int, created_after: str
+    ):
+        """Rows created after created_after with id up to last_id"""
+        return self.client.table(table).select(
+            columns
+        ).gt('created_at', created_after).lte('id', last_id).order('id')
+
+    def _rows_after_query(self, table: str, columns: str, after: int):
+        """Next keyset page of rows with id greater than after"""
+        return self.client.table(table).select(
+            columns
+        ).gt('id', after).order('id').limit(self.PAGE_SIZE)
+
+    def get_faces_since(
+        self, last_id: int, created_after: str = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Get face embeddings with id greater than last_id (oldest first).
+        If created_after (ISO timestamp) is given, rows created after it are
+        returned too, even with a smaller id (inserts committed out of order).
+        """
+        return self._rows_since(
+            'face_embeddings', self.FACE_COLUMNS, last_id, created_after
+        )
+
+    def get_faces_by_alunos(self, aluno_ids: List[int]) -> List[Dict[str, Any]]:
+        """Get all face embeddings of the given students"""
+        return self._run(
+            self.client.table('face_embeddings').select(
+                self.FACE_COLUMNS
+            ).in_('aluno_id', aluno_ids),
+            _rows
+        )
+
+    def get_alunos_by_ids(self, aluno_ids: List[int]) -> List[Dict[str, Any]]:
+        """Get the gallery-relevant fields of the given students"""
+        return self._run(
+            self.client.table('alunos').select(
+                'id, nome, turma_id, ativo, check_professor'
+            ).in_('id', aluno_ids),
+            _rows
+        )
+
     def add_embedding(
-        self, aluno_id: int, embedding_data: str, foto_nome: str = None
-    ) -> bool:
-        """Save face embedding for a student"""
+        self, aluno_id: int, embedding_data: str, foto_nome: str = None,
+        modelo: str = "face_recognition"
+    ) -> Dict[str, Any]:
+        """
+        Save face embedding for a student and return the created row.
+        embedding_data is a BYTEA hex literal (see embedding_codec) and
+        modelo identifies the model that produced it.
+        """
         face_data = {
             "aluno_id": aluno_id,
+            "modelo": modelo,
             "embedding": embedding_data,
             "foto_nome": foto_nome
         }
-        response = self.client.table('face_embeddings').insert(
-            face_data
-        ).execute()
-        return len(response.data) > 0
+        return self._run(
+            self.client.table('face_embeddings').insert(face_data), _first_row
+        )
+
+    def update_embedding(
+        self, embedding_id: int, embedding_data: str
+    ) -> bool:
+        """Rewrite a stored embedding (used by the format migration)"""
+        return self._run(
+            self.client.table('face_embeddings').update({
+                "embedding": embedding_data
+            }).eq('id', embedding_id),
+            _changed
+        )
+
+    # ========================================
+    # GALLERY TOMBSTONES
+    # ========================================
+
+    def get_tombstones_since(
+        self, last_id: int, created_after: str = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Get gallery tombstones with id greater than last_id (oldest first).
+        If created_after (ISO timestamp) is given, tombstones created after it
+        are returned too, even with a smaller id (inserts committed out of
+        order).
+        """
+        return self._rows_since(
+            'gallery_tombstones', self.TOMBSTONE_COLUMNS, last_id, created_after
+        )
+
+    def get_tombstone_watermark(self) -> int:
+        """Get the id of the newest gallery tombstone (0 if none)"""
+        return self._run(
+            self.client.table('gallery_tombstones').select(
+                'id'
+            ).order('id', desc=True).limit(1),
+            lambda response: response.data[0]['id'] if response.data else 0
+        )
 
     # ========================================
     # PRESENCAS (Attendance)
     # ========================================
-    
+
     def list_presencas(
         self, data_inicio: str = None, data_fim: str = None,
         turma_id: int = None
@@ -280,39 +436,32 @@ class SupabaseDB:
         query = self.client.table('presencas').select(
             '*, alunos(nome), turmas(nome)'
         )
-        
+
         if data_inicio:
             query = query.gte('data_hora', data_inicio)
         if data_fim:
             query = query.lte('data_hora', data_fim)
         if turma_id:
             query = query.eq('turma_id', turma_id)
-        
-        response = query.order('data_hora', desc=True).execute()
-        return format_records_timestamps(response.data)
-    
+
+        return self._run(query.order('data_hora', desc=True), _formatted_rows)
+
     def get_student_last_attendance_today(
         self, aluno_id: int
     ) -> Optional[Dict[str, Any]]:
         """Get student's last attendance record for today"""
         from datetime import date
         today = date.today().isoformat()
-        
-        response = self.client.table('presencas').select(
-            '*'
-        ).eq('aluno_id', aluno_id).gte(
-            'data_hora', today
-        ).order('data_hora', desc=True).limit(1).execute()
-        
-        return response.data[0] if response.data else None
-    
-    def is_student_in_class(self, aluno_id: int) -> bool:
-        """
-        Check if student is currently in class.
-        Since we removed tipo_registro, always return False.
-        """
-        return False
-    
+
+        return self._run(
+            self.client.table('presencas').select(
+                '*'
+            ).eq('aluno_id', aluno_id).gte(
+                'data_hora', today
+            ).order('data_hora', desc=True).limit(1),
+            _first_row_or_none
+        )
+
     def create_presenca(
         self, aluno_id: int, turma_id: int, confianca: float = None
     ) -> Dict[str, Any]:
@@ -324,33 +473,181 @@ class SupabaseDB:
             "turma_id": turma_id,
             "confianca": confianca
         }
-        response = self.client.table('presencas').insert(
-            presenca_data
-        ).execute()
-        return response.data[0] if response.data else {}
-    
+        return self._run(
+            self.client.table('presencas').insert(presenca_data), _first_row
+        )
+
     def validate_presenca(
         self, presenca_id: int, professor_id: int,
         observacao: str = None
     ) -> bool:
         """Validate attendance by professor"""
-        from datetime import datetime
-        response = self.client.table('presencas').update({
-            "check_professor": True,
-            "validado_por": professor_id,
-            "validado_em": datetime.utcnow().isoformat(),
-            "observacao": observacao
-        }).eq('id', presenca_id).execute()
-        return len(response.data) > 0
-    
+        return self._run(
+            self.client.table('presencas').update({
+                "check_professor": True,
+                "validado_por": professor_id,
+                "validado_em": datetime.utcnow().isoformat(),
+                "observacao": observacao
+            }).eq('id', presenca_id),
+            _changed
+        )
+
     def get_presenca_by_id(
         self, presenca_id: int
     ) -> Optional[Dict[str, Any]]:
         """Get attendance record by ID"""
-        response = self.client.table('presencas').select(
-            '*, alunos(nome), turmas(nome)'
-        ).eq('id', presenca_id).single().execute()
-        return response.data if response.data else None
+        return self._run(
+            self.client.table('presencas').select(
+                '*, alunos(nome), turmas(nome)'
+            ).eq('id', presenca_id).single(),
+            _single_row
+        )
+
+
+class SupabaseDB(SupabaseQueries):
+    """Manages communication with Supabase using REST API"""
+
+    def __init__(self, url: str, key: str):
+        self.client: Client = create_client(url, key)
+
+    def _run(self, query, shape: Callable[[Any], Any]) -> Any:
+        return shape(query.execute())
+
+    # ========================================
+    # PROFESSORES (Professors)
+    # ========================================
+
+    def create_professor(
+        self, nome: str, email: str, turma_ids: List[int]
+    ) -> Dict[str, Any]:
+        """Create a new professor and assign classes"""
+        prof_response = self._insert_professor_query(nome, email).execute()
+
+        if not prof_response.data:
+            return {}
+
+        professor = prof_response.data[0]
+
+        # Assign classes (turmas_professores)
+        if turma_ids:
+            self._assign_turmas_query(professor['id'], turma_ids).execute()
+
+        return professor
+
+    def update_professor(
+        self, professor_id: int, nome: str = None, email: str = None,
+        turma_ids: List[int] = None, ativo: bool = None
+    ) -> Dict[str, Any]:
+        """Update a professor and their assigned classes"""
+        # Update professor basic info
+        update_data = self._professor_update_data(nome, email, ativo)
+        if update_data:
+            prof_response = self._update_professor_query(
+                professor_id, update_data
+            ).execute()
+
+            if not prof_response.data:
+                return {}
+
+        # Update class assignments if turma_ids is provided
+        if turma_ids is not None:
+            # Remove existing associations, then add the new ones
+            self._unassign_turmas_query(professor_id).execute()
+            if turma_ids:
+                self._assign_turmas_query(professor_id, turma_ids).execute()
+
+        # Return updated professor
+        response = self._professor_query(professor_id).execute()
+        return response.data if response.data else {}
+
+    # ========================================
+    # FACE EMBEDDINGS
+    # ========================================
+
+    def get_all_faces(self) -> List[Dict[str, Any]]:
+        """Get all face embeddings with student info"""
+        rows = []
+        for page in self.iter_all_faces():
+            rows.extend(page)
+        return rows
+
+    def iter_all_faces(
+        self, stats: Optional[Dict[str, int]] = None
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Yield all face embeddings page by page, as the pages arrive.
+
+        PostgREST caps each response (max-rows, 1000 by default), so the table
+        is read in id-ordered keyset pages. The first page also returns the
+        exact row count; the ids above it are split into spans (_id_spans)
+        read concurrently (GALLERY_LOAD_WORKERS threads). A delete during
+        the load never makes a later row fall between pages.
+
+        If stats is given, it receives 'expected' (exact count), 'loaded'
+        and 'pages'. A shortfall is also printed, so a truncated load is
+        never silent.
+        """
+        first = self._first_faces_page_query().execute()
+        last = self._last_face_id_query().execute()
+        expected, page_size, spans = self._id_spans(first, last)
+
+        loaded, pages = len(first.data), 1
+        yield first.data
+
+        if spans:
+            workers = max(1, min(settings.GALLERY_LOAD_WORKERS, len(spans)))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = [
+                    pool.submit(self._get_faces_span, after, until, page_size)
+                    for after, until in spans
+                ]
+                for future in as_completed(futures):
+                    for page in future.result():
+                        loaded += len(page)
+                        pages += 1
+                        yield page
+
+        self._report_load(expected, loaded, pages, stats)
+
+    def _get_faces_span(
+        self, after: int, until: int, page_size: int
+    ) -> List[List[Dict[str, Any]]]:
+        """Keyset pages of the face embeddings with id in (after, until]"""
+        pages = []
+        while True:
+            rows = self._faces_span_query(after, until, page_size).execute().data
+            if rows:
+                pages.append(rows)
+            if len(rows) < page_size:
+                return pages
+            after = rows[-1]['id']
+
+    def _rows_since(
+        self, table: str, columns: str, last_id: int, created_after: str = None
+    ) -> List[Dict[str, Any]]:
+        """Late rows (see get_faces_since), then keyset pages after last_id"""
+        rows = []
+        if created_after:
+            rows.extend(self._late_rows_query(
+                table, columns, last_id, created_after
+            ).execute().data)
+        while True:
+            response = self._rows_after_query(table, columns, last_id).execute()
+            if not response.data:
+                return rows
+            rows.extend(response.data)
+            last_id = response.data[-1]['id']
+
+    # ========================================
+    # PRESENCAS (Attendance)
+    # ========================================
+
+    def is_student_in_class(self, aluno_id: int) -> bool:
+        """
+        Check if student is currently in class.
+        Since we removed tipo_registro, always return False.
+        """
+        return False
 
     # ========================================
     # LEGACY METHODS (backward compatibility)
@@ -407,6 +704,171 @@ class SupabaseDB:
         return self.get_aluno_by_name(nome)
 
 
+class AsyncSupabaseDB(SupabaseQueries):
+    """
+    Async counterpart of SupabaseDB (same methods, as coroutines).
+
+    The async client is created on first use (connect), inside the running
+    event loop. Independent queries can be awaited together with
+    asyncio.gather.
+    """
+
+    def __init__(self, url: str, key: str):
+        self.url = url
+        self.key = key
+        self.client: Optional[AsyncClient] = None
+        self._connect_lock = asyncio.Lock()
+
+    async def connect(self) -> "AsyncSupabaseDB":
+        """Create the async client (idempotent)"""
+        if self.client is None:
+            async with self._connect_lock:
+                if self.client is None:
+                    self.client = await acreate_client(self.url, self.key)
+        return self
+
+    async def close(self) -> None:
+        """Close the pooled HTTP connections of the async client"""
+        client, self.client = self.client, None
+        if client is not None:
+            await client.postgrest.aclose()
+
+    async def _run(self, query, shape: Callable[[Any], Any]) -> Any:
+        return shape(await query.execute())
+
+    # ========================================
+    # PROFESSORES (Professors)
+    # ========================================
+
+    async def create_professor(
+        self, nome: str, email: str, turma_ids: List[int]
+    ) -> Dict[str, Any]:
+        """Create a new professor and assign classes"""
+        prof_response = await self._insert_professor_query(nome, email).execute()
+
+        if not prof_response.data:
+            return {}
+
+        professor = prof_response.data[0]
+
+        # Assign classes (turmas_professores)
+        if turma_ids:
+            await self._assign_turmas_query(professor['id'], turma_ids).execute()
+
+        return professor
+
+    async def update_professor(
+        self, professor_id: int, nome: str = None, email: str = None,
+        turma_ids: List[int] = None, ativo: bool = None
+    ) -> Dict[str, Any]:
+        """Update a professor and their assigned classes"""
+        update_data = self._professor_update_data(nome, email, ativo)
+
+        # The basic info update and the removal of the old class
+        # assignments are independent: run them together
+        pending = []
+        if update_data:
+            pending.append(
+                self._update_professor_query(professor_id, update_data).execute()
+            )
+        if turma_ids is not None:
+            pending.append(self._unassign_turmas_query(professor_id).execute())
+        responses = await asyncio.gather(*pending)
+
+        if update_data and not responses[0].data:
+            return {}
+
+        # Add new associations
+        if turma_ids:
+            await self._assign_turmas_query(professor_id, turma_ids).execute()
+
+        # Return updated professor
+        response = await self._professor_query(professor_id).execute()
+        return response.data if response.data else {}
+
+    # ========================================
+    # FACE EMBEDDINGS
+    # ========================================
+
+    async def get_all_faces(self) -> List[Dict[str, Any]]:
+        """Get all face embeddings with student info"""
+        rows = []
+        async for page in self.iter_all_faces():
+            rows.extend(page)
+        return rows
+
+    async def iter_all_faces(
+        self, stats: Optional[Dict[str, int]] = None
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        Yield all face embeddings page by page, as the pages arrive.
+
+        Same paging as SupabaseDB.iter_all_faces; the id spans are read
+        concurrently, at most GALLERY_LOAD_WORKERS at a time.
+        """
+        first, last = await asyncio.gather(
+            self._first_faces_page_query().execute(),
+            self._last_face_id_query().execute()
+        )
+        expected, page_size, spans = self._id_spans(first, last)
+
+        loaded, pages = len(first.data), 1
+        yield first.data
+
+        if spans:
+            semaphore = asyncio.Semaphore(max(1, settings.GALLERY_LOAD_WORKERS))
+
+            async def fetch(after: int, until: int) -> List[List[Dict[str, Any]]]:
+                async with semaphore:
+                    return await self._get_faces_span(after, until, page_size)
+
+            for next_span in asyncio.as_completed([fetch(*span) for span in spans]):
+                for page in await next_span:
+                    loaded += len(page)
+                    pages += 1
+                    yield page
+
+        self._report_load(expected, loaded, pages, stats)
+
+    async def _get_faces_span(
+        self, after: int, until: int, page_size: int
+    ) -> List[List[Dict[str, Any]]]:
+        """Keyset pages of the face embeddings with id in (after, until]"""
+        pages = []
+        while True:
+            response = await self._faces_span_query(after, until, page_size).execute()
+            if response.data:
+                pages.append(response.data)
+            if len(response.data) < page_size:
+                return pages
+            after = response.data[-1]['id']
+
+    async def _rows_since(
+        self, table: str, columns: str, last_id: int, created_after: str = None
+    ) -> List[Dict[str, Any]]:
+        """Late rows (see get_faces_since) and keyset pages after last_id"""
+        async def late_rows() -> List[Dict[str, Any]]:
+            if not created_after:
+                return []
+            response = await self._late_rows_query(
+                table, columns, last_id, created_after
+            ).execute()
+            return response.data
+
+        async def new_rows() -> List[Dict[str, Any]]:
+            rows, after = [], last_id
+            while True:
+                response = await self._rows_after_query(table, columns, after).execute()
+                if not response.data:
+                    return rows
+                rows.extend(response.data)
+                after = response.data[-1]['id']
+
+        # Both queries are independent: run them together
+        late, new = await asyncio.gather(late_rows(), new_rows())
+        return late + new
+
+
 # Global instance and FastAPI dependency
 db_manager = SupabaseDB(
     url=settings.SUPABASE_URL,
@@ -417,3 +879,20 @@ db_manager = SupabaseDB(
 def get_db_manager() -> SupabaseDB:
     """Returns the global database manager instance"""
     return db_manager
+
+
+# Global async instance and FastAPI dependency (connected on first use)
+async_db_manager = AsyncSupabaseDB(
+    url=settings.SUPABASE_URL,
+    key=settings.SUPABASE_KEY
+)
+
+
+async def get_async_db_manager() -> AsyncSupabaseDB:
+    """Returns the global async database manager instance"""
+    return await async_db_manager.connect()
+
+
+async def close_async_db_manager() -> None:
+    """Closes the async client connections (application shutdown)"""
+    await async_db_manager.close()
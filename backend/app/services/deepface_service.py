@@ -6,14 +6,13 @@ Oferece múltiplos modelos e backends para comparação.
 """
 import numpy as np
 from fastapi import UploadFile
-from typing import Optional, List, Dict, Tuple
-import io
-from PIL import Image
-from deepface import DeepFace
+from typing import Optional, List, Dict, Tuple, Union
 import json
-import tempfile
-import os
-from app.services.face_service import preprocess_image
+from app.services.face_service import RecognitionContext, load_image, read_image
+from app.services.matching_service import as_embedding_matrix
+from app.services.batching import MicroBatcher, best_match as batched_best_match
+from app.services.worker_pool import get_recognition_pool
+from app.config import settings
 
 # Configurações do DeepFace
 DEEPFACE_MODEL = "Facenet512"  # Opções: VGG-Face, Facenet, Facenet512, OpenFace, DeepFace, DeepID, ArcFace, Dlib, SFace
@@ -34,7 +33,7 @@ DEEPFACE_THRESHOLDS = {
 }
 
 def get_deepface_encoding(
-    file: UploadFile,
+    file: Union[UploadFile, np.ndarray, RecognitionContext],
     model_name: str = DEEPFACE_MODEL,
     detector_backend: str = DEEPFACE_DETECTOR,
     preprocess: bool = True
@@ -43,58 +42,129 @@ def get_deepface_encoding(
     Extrai o embedding facial usando DeepFace.
     
     Args:
-        file: Arquivo de imagem enviado
+        file: Arquivo de imagem enviado, imagem RGB uint8 já decodificada
+              (face_service.read_image) ou RecognitionContext; com o
+              contexto, usa o recorte alinhado do rosto já detectado e
+              pula o detector do DeepFace
         model_name: Modelo de reconhecimento facial a ser usado
         detector_backend: Backend de detecção de faces
-        preprocess: Se True, redimensiona para 300x300px (padrão: True)
+        preprocess: Se True, redimensiona para 300x300px (padrão: True);
+                    ignorado quando a imagem já vem decodificada
     
     Returns:
         Array numpy com o embedding ou None se nenhum rosto for detectado
     """
     try:
-        # Ler bytes da imagem
-        image_bytes = file.file.read()
+        run = _run_inline
         
-        # Preprocessar imagem se solicitado
-        if preprocess:
-            image_bytes = preprocess_image(image_bytes)
-        
-        # Converter para PIL Image
-        image = Image.open(io.BytesIO(image_bytes))
-        
-        # Salvar temporariamente (DeepFace trabalha melhor com arquivos)
-        with tempfile.NamedTemporaryFile(
-            delete=False, suffix='.jpg'
-        ) as tmp_file:
-            image.save(tmp_file.name)
-            tmp_path = tmp_file.name
-        
-        try:
-            # Extrair embedding
-            embedding_objs = DeepFace.represent(
-                img_path=tmp_path,
-                model_name=model_name,
-                detector_backend=detector_backend,
-                enforce_detection=True
-            )
-            
-            # DeepFace.represent retorna uma lista de dicionários
-            # Pegamos o primeiro rosto detectado
-            if embedding_objs and len(embedding_objs) > 0:
-                embedding = np.array(embedding_objs[0]["embedding"])
-                return embedding
-            
-        finally:
-            # Limpar arquivo temporário
-            if os.path.exists(tmp_path):
-                os.unlink(tmp_path)
+        # Ler e decodificar a imagem (a menos que já venha decodificada)
+        if isinstance(file, RecognitionContext):
+            run = file.run  # pool de processos do contexto, se houver
+            if file.face_crop is not None:
+                # Recorte já alinhado: entra no lote do embedding_batcher
+                return embedding_batcher.submit((model_name,), file.face_crop)
+            else:
+                # face_recognition não achou rosto: o detector do DeepFace
+                # ainda tenta na imagem inteira
+                image = file.image
+        elif isinstance(file, np.ndarray):
+            image = file
+        else:
+            image = read_image(file, preprocess=preprocess)
         
-        return None
+        # Extrair embedding direto do array, sem arquivo temporário
+        return run(_represent, image, model_name, detector_backend)
         
     except Exception as e:
         print(f"Erro ao extrair embedding com DeepFace: {e}")
         return None
 
+
+def _run_inline(fn, *args):
+    return fn(*args)
+
+
+def _represent_batch(images: List[np.ndarray], model_name: str) -> List[Optional[np.ndarray]]:
+    """
+    Embeddings de vários recortes de rosto (detector "skip") em um único
+    forward do modelo (pode rodar em um processo do pool).
+
+    Reproduz o pré-processamento de DeepFace.represent: extract_faces
+    entrega ao modelo o rosto em RGB, e os recortes de face_service já são
+    RGB, então só vão para [0, 1] (sem inverter canais), resize_image e
+    normalize_input "base". O resultado de um recorte não depende do
+    tamanho do lote (scripts/check_embedding_batch.py). Modelos sem rede Keras, ou uma
+    API interna diferente, caem para uma chamada de represent por imagem.
+    """
+    if len(images) > 1:
+        try:
+            from deepface import DeepFace
+            from deepface.modules import preprocessing
+
+            model = DeepFace.build_model(model_name)
+            target_size = model.input_shape
+            batch = np.concatenate([
+                preprocessing.normalize_input(
+                    img=preprocessing.resize_image(
+                        img=np.asarray(image, dtype=np.float32) / 255.0,
+                        target_size=(target_size[1], target_size[0])
+                    ),
+                    normalization="base"
+                )
+                for image in images
+            ])
+            embeddings = np.asarray(model.model(batch, training=False))
+            return [np.array(embedding, dtype=np.float64) for embedding in embeddings]
+        except Exception as e:
+            print(f"Lote DeepFace indisponível ({e}), processando imagem por imagem")
+
+    results = []
+    for image in images:
+        try:
+            results.append(_represent(image, model_name, "skip"))
+        except Exception as e:
+            print(f"Erro ao extrair embedding com DeepFace: {e}")
+            results.append(None)
+    return results
+
+
+def _embedding_batch(key: Tuple[str], images: List[np.ndarray]) -> List[Optional[np.ndarray]]:
+    (model_name,) = key
+    pool = get_recognition_pool()
+    run = pool.run if pool is not None else _run_inline
+    return run(_represent_batch, images, model_name)
+
+
+# Lotes de recortes do mesmo modelo: um forward do DeepFace por lote
+embedding_batcher = MicroBatcher(
+    "deepface", _embedding_batch,
+    max_size=settings.BATCH_MAX_SIZE,
+    max_wait_ms=settings.BATCH_MAX_WAIT_MS,
+    concurrency=settings.RECOGNITION_WORKERS
+)
+
+
+def _represent(
+    image: np.ndarray,
+    model_name: str,
+    detector_backend: str
+) -> Optional[np.ndarray]:
+    """DeepFace.represent da imagem RGB (pode rodar em um processo do pool)"""
+    from deepface import DeepFace
+
+    embedding_objs = DeepFace.represent(
+        img_path=_as_deepface_input(image),
+        model_name=model_name,
+        detector_backend=detector_backend,
+        enforce_detection=True
+    )
+    
+    # DeepFace.represent retorna uma lista de dicionários
+    # Pegamos o primeiro rosto detectado
+    if embedding_objs and len(embedding_objs) > 0:
+        return np.array(embedding_objs[0]["embedding"])
+    return None
+
 def calculate_distance(embedding1: np.ndarray, embedding2: np.ndarray, metric: str = DEEPFACE_DISTANCE_METRIC) -> float:
     """
     Calcula a distância entre dois embeddings usando a métrica especificada.
@@ -128,89 +198,48 @@ def calculate_distance(embedding1: np.ndarray, embedding2: np.ndarray, metric: s
 
 def recognize_face_deepface(
     unknown_encoding: np.ndarray, 
-    known_faces_data: List[Dict[str, any]],
+    known_faces_data,
     model_name: str = DEEPFACE_MODEL,
     distance_metric: str = DEEPFACE_DISTANCE_METRIC
 ) -> Optional[Tuple[int, float, float]]:
     """
     Compara o embedding de um rosto desconhecido com todos os rostos conhecidos usando DeepFace.
     
+    As distâncias para toda a galeria são calculadas de uma vez sobre a
+    EmbeddingMatrix (um único produto matriz-vetor), com o mesmo resultado
+    de aplicar calculate_distance a cada embedding.
+    
     Args:
         unknown_encoding: O embedding do rosto a ser identificado
-        known_faces_data: Lista de dicionários com 'aluno_id' e 'embedding'
-        model_name: Modelo usado (para determinar threshold)
+        known_faces_data: GallerySnapshot (usa a partição de model_name), EmbeddingMatrix
+                          ou lista de dicionários com 'aluno_id' e 'embedding'
+        model_name: Modelo usado (partição da galeria e threshold)
         distance_metric: Métrica de distância
     
     Returns:
         Tupla (aluno_id, confidence, distance) do melhor match, ou None
     """
-    if not known_faces_data:
+    if known_faces_data is None or len(known_faces_data) == 0:
         return None
     
-    # Preparar embeddings conhecidos
-    known_encodings = []
-    known_ids = []
-    
-    import pickle
-    import base64
-    
-    for face_record in known_faces_data:
-        try:
-            # Desserializar o embedding de bytes pickle para numpy array
-            embedding_data = face_record['embedding']
-            
-            # Check if it's a hex-encoded string from Supabase BYTEA
-            if isinstance(embedding_data, str) and embedding_data.startswith('\\x'):
-                # Remove \x prefix and decode hex to get original base64
-                hex_str = embedding_data.replace('\\x', '')
-                embedding_bytes = bytes.fromhex(hex_str)
-                # The result is the base64 string as bytes, decode to str
-                embedding_b64_str = embedding_bytes.decode('utf-8')
-                # Now decode base64 to get pickle bytes
-                pickle_bytes = base64.b64decode(embedding_b64_str)
-                # Finally unpickle to numpy array
-                embedding_array = pickle.loads(pickle_bytes)
-            elif isinstance(embedding_data, str):
-                # Decode base64 string to bytes first
-                embedding_bytes = base64.b64decode(embedding_data)
-                # Then unpickle to numpy array
-                embedding_array = pickle.loads(embedding_bytes)
-            elif isinstance(embedding_data, bytes):
-                # Direct pickle deserialização
-                embedding_array = pickle.loads(embedding_data)
-            elif isinstance(embedding_data, memoryview):
-                # Se vier como memoryview, converter para bytes primeiro
-                embedding_array = pickle.loads(bytes(embedding_data))
-            else:
-                # Fallback: tentar converter diretamente
-                embedding_array = np.array(embedding_data)
-            
-            known_encodings.append(embedding_array)
-            known_ids.append(face_record['aluno_id'])
-            
-        except Exception as e:
-            print(f"Erro ao processar embedding do aluno ID "
-                  f"{face_record.get('aluno_id')}: {e}")
-            print(f"Tipo do embedding: {type(face_record.get('embedding'))}")
-            continue
-    
-    if not known_encodings:
-        return None
-    
-    # Calcular distâncias
-    distances = [calculate_distance(unknown_encoding, known_enc, distance_metric) 
-                 for known_enc in known_encodings]
-    
-    # Encontrar o melhor match
-    best_match_index = np.argmin(distances)
-    min_distance = distances[best_match_index]
+    # Preparar embeddings conhecidos (apenas do mesmo modelo)
+    known_matrix = as_embedding_matrix(known_faces_data, model_name)
     
     # Obter threshold apropriado
     threshold = DEEPFACE_THRESHOLDS.get(model_name, {}).get(distance_metric, 0.4)
     
+    # Calcular distâncias e encontrar o melhor match (em lote com outras
+    # requisições simultâneas, ver batching.match_batcher)
+    best_match = batched_best_match(
+        known_matrix, unknown_encoding, distance_metric, threshold
+    )
+    if best_match is None:
+        return None
+    best_match_index, min_distance = best_match
+    
     # Verificar se está dentro do threshold
     if min_distance <= threshold:
-        matched_id = known_ids[best_match_index]
+        matched_id = int(known_matrix.ids[best_match_index])
         
         # Calcular confiança (inverso da distância normalizado)
         # Para distância cosseno: confidence = (1 - distance) * 100
@@ -224,9 +253,22 @@ def recognize_face_deepface(
     
     return None
 
+def _as_deepface_input(image: Union[str, bytes, np.ndarray]) -> Union[str, np.ndarray]:
+    """
+    Converte a imagem para o que o DeepFace aceita sem arquivos temporários:
+    caminhos passam direto; bytes são decodificados em memória e arrays
+    (RGB, como os de face_service.read_image) viram BGR.
+    """
+    if isinstance(image, str):
+        return image
+    if isinstance(image, (bytes, bytearray)):
+        image = load_image(bytes(image), preprocess=False)
+    return np.ascontiguousarray(np.asarray(image)[:, :, ::-1])
+
+
 def verify_faces_deepface(
-    img1_path: str,
-    img2_path: str,
+    img1_path: Union[str, bytes, np.ndarray],
+    img2_path: Union[str, bytes, np.ndarray],
     model_name: str = DEEPFACE_MODEL,
     detector_backend: str = DEEPFACE_DETECTOR,
     distance_metric: str = DEEPFACE_DISTANCE_METRIC
@@ -235,8 +277,8 @@ def verify_faces_deepface(
     Verifica se duas imagens contêm a mesma pessoa usando DeepFace.verify.
     
     Args:
-        img1_path: Caminho para primeira imagem
-        img2_path: Caminho para segunda imagem
+        img1_path: Primeira imagem (caminho, bytes do upload ou array RGB)
+        img2_path: Segunda imagem (caminho, bytes do upload ou array RGB)
         model_name: Modelo de reconhecimento facial
         detector_backend: Backend de detecção
         distance_metric: Métrica de distância
@@ -244,10 +286,12 @@ def verify_faces_deepface(
     Returns:
         Dicionário com resultado da verificação
     """
+    from deepface import DeepFace
+
     try:
         result = DeepFace.verify(
-            img1_path=img1_path,
-            img2_path=img2_path,
+            img1_path=_as_deepface_input(img1_path),
+            img2_path=_as_deepface_input(img2_path),
             model_name=model_name,
             detector_backend=detector_backend,
             distance_metric=distance_metric,
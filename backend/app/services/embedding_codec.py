@@ -0,0 +1,220 @@
+"""
+app/services/embedding_codec.py
+-------------------------------
+Formato binário compacto e versionado para os embeddings faciais.
+
+Layout (little-endian):
+
+    offset  tamanho  campo
+    0       4        magic b"FEMB"
+    4       1        versão do formato (1)
+    5       1        id do modelo (MODEL_IDS)
+    6       1        código do dtype (DTYPE_CODES)
+    7       1        reservado (0)
+    8       4        dimensão (uint32)
+    12      dim*n    vetor bruto
+
+Um embedding de 128 floats ocupa 524 bytes (contra ~1.5 KB de
+base64(pickle(float64)) + hex). A decodificação é um np.frombuffer, sem
+unpickling de conteúdo vindo do banco.
+
+O formato antigo (base64 de pickle, opcionalmente em hex) continua sendo
+lido para que linhas ainda não migradas funcionem; use
+scripts/migrate_embeddings.py para regravá-las.
+"""
+import base64
+import io
+import pickle
+import struct
+from typing import Any, Optional, Tuple
+
+import numpy as np
+
+MAGIC = b"FEMB"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sBBBxI")
+
+# Identificadores estáveis dos modelos (nunca reutilize um número)
+MODEL_IDS = {
+    "face_recognition": 1,
+    "VGG-Face": 2,
+    "Facenet": 3,
+    "Facenet512": 4,
+    "OpenFace": 5,
+    "DeepFace": 6,
+    "DeepID": 7,
+    "ArcFace": 8,
+    "Dlib": 9,
+    "SFace": 10,
+}
+MODEL_NAMES = {model_id: name for name, model_id in MODEL_IDS.items()}
+
+# Modelo assumido para embeddings no formato antigo (só face_recognition
+# era gravado por cadastrar_com_foto)
+LEGACY_MODEL = "face_recognition"
+
+DTYPE_CODES = {
+    "float32": 1,
+    "float16": 2,
+    "float64": 3,
+}
+DTYPES = {
+    1: np.dtype("<f4"),
+    2: np.dtype("<f2"),
+    3: np.dtype("<f8"),
+}
+
+# Permite ler linhas no formato antigo (pickle). Desligue depois de rodar
+# scripts/migrate_embeddings.py.
+LEGACY_PICKLE_ENABLED = True
+
+
+class EmbeddingFormatError(ValueError):
+    """Embedding em formato inválido ou não suportado"""
+
+
+def encode_embedding(
+    embedding: np.ndarray,
+    model_name: str = LEGACY_MODEL,
+    dtype: str = "float32"
+) -> bytes:
+    """
+    Serializa um embedding no formato binário versionado.
+
+    Args:
+        embedding: Vetor 1-D
+        model_name: Modelo que gerou o embedding (chave de MODEL_IDS)
+        dtype: float32 (padrão), float16 ou float64
+
+    Returns:
+        Bytes com cabeçalho + vetor little-endian
+    """
+    if model_name not in MODEL_IDS:
+        raise EmbeddingFormatError(f"Modelo desconhecido: {model_name}")
+    if dtype not in DTYPE_CODES:
+        raise EmbeddingFormatError(f"dtype não suportado: {dtype}")
+
+    dtype_code = DTYPE_CODES[dtype]
+    vector = np.asarray(embedding).ravel().astype(DTYPES[dtype_code])
+    header = HEADER.pack(
+        MAGIC, FORMAT_VERSION, MODEL_IDS[model_name], dtype_code,
+        vector.shape[0]
+    )
+    return header + vector.tobytes()
+
+
+def to_bytea_literal(data: bytes) -> str:
+    """
+    Converte bytes para o literal hex aceito pelo PostgREST em colunas
+    BYTEA ('\\x' seguido do hex).
+    """
+    return "\\x" + data.hex()
+
+
+def is_encoded(data: bytes) -> bool:
+    """Indica se os bytes estão no formato versionado"""
+    return len(data) >= HEADER.size and data[:4] == MAGIC
+
+
+def _to_bytes(embedding_data: Any) -> bytes:
+    """Normaliza o valor da coluna BYTEA para bytes"""
+    if isinstance(embedding_data, (bytes, bytearray)):
+        return bytes(embedding_data)
+    if isinstance(embedding_data, memoryview):
+        return embedding_data.tobytes()
+    if isinstance(embedding_data, str):
+        if embedding_data.startswith("\\x"):
+            return bytes.fromhex(embedding_data[2:])
+        # Formato antigo enviado/devolvido como texto base64
+        return embedding_data.encode("ascii")
+    raise EmbeddingFormatError(
+        f"Tipo de embedding não suportado: {type(embedding_data)}"
+    )
+
+
+def _decode_binary(data: bytes) -> Tuple[str, np.ndarray]:
+    magic, version, model_id, dtype_code, dimension = HEADER.unpack_from(data)
+    if version != FORMAT_VERSION:
+        raise EmbeddingFormatError(f"Versão de formato não suportada: {version}")
+    if dtype_code not in DTYPES:
+        raise EmbeddingFormatError(f"dtype desconhecido: {dtype_code}")
+    if model_id not in MODEL_NAMES:
+        raise EmbeddingFormatError(f"Modelo desconhecido: {model_id}")
+
+    dtype = DTYPES[dtype_code]
+    expected = HEADER.size + dimension * dtype.itemsize
+    if len(data) != expected:
+        raise EmbeddingFormatError(
+            f"Tamanho inválido: {len(data)} bytes (esperado {expected})"
+        )
+    vector = np.frombuffer(data, dtype=dtype, count=dimension,
+                           offset=HEADER.size)
+    return MODEL_NAMES[model_id], vector.astype(np.float32)
+
+
+class _NumpyUnpickler(pickle.Unpickler):
+    """Unpickler restrito aos tipos usados por um ndarray serializado"""
+
+    ALLOWED = {
+        ("numpy", "ndarray"),
+        ("numpy", "dtype"),
+        ("numpy.core.multiarray", "_reconstruct"),
+        ("numpy._core.multiarray", "_reconstruct"),
+        ("numpy.core.multiarray", "scalar"),
+        ("numpy._core.multiarray", "scalar"),
+    }
+
+    def find_class(self, module, name):
+        if (module, name) not in self.ALLOWED:
+            raise EmbeddingFormatError(
+                f"Tipo não permitido em embedding legado: {module}.{name}"
+            )
+        return super().find_class(module, name)
+
+
+def _decode_legacy(data: bytes) -> np.ndarray:
+    """Lê base64(pickle(ndarray)) do formato antigo"""
+    if not LEGACY_PICKLE_ENABLED:
+        raise EmbeddingFormatError("Embedding no formato antigo (pickle)")
+    try:
+        pickle_bytes = base64.b64decode(data, validate=True)
+    except Exception:
+        # Alguns registros antigos guardaram o pickle direto
+        pickle_bytes = data
+    array = _NumpyUnpickler(io.BytesIO(pickle_bytes)).load()
+    return np.asarray(array, dtype=np.float32).ravel()
+
+
+def decode_embedding_with_model(
+    embedding_data: Any
+) -> Tuple[Optional[str], np.ndarray]:
+    """
+    Desserializa o valor da coluna 'embedding'.
+
+    Args:
+        embedding_data: bytes, memoryview, literal hex '\\x...' devolvido
+                        pelo PostgREST, texto base64 antigo ou np.ndarray
+
+    Returns:
+        Tupla (modelo, vetor float32). O modelo é None quando não há como
+        saber (arrays já decodificados).
+    """
+    if isinstance(embedding_data, np.ndarray):
+        return None, embedding_data
+
+    data = _to_bytes(embedding_data)
+    if is_encoded(data):
+        return _decode_binary(data)
+    return LEGACY_MODEL, _decode_legacy(data)
+
+
+def decode_embedding(embedding_data: Any) -> np.ndarray:
+    """Desserializa o valor da coluna 'embedding' para um vetor float32"""
+    return decode_embedding_with_model(embedding_data)[1]
+
+
+def is_legacy(embedding_data: Any) -> bool:
+    """Indica se o valor ainda está no formato antigo (pickle)"""
+    if isinstance(embedding_data, np.ndarray):
+        return False
+    return not is_encoded(_to_bytes(embedding_data))
@@ -3,45 +3,147 @@ app/services/face_service.py
 ----------------------------
 Serviços para processamento de imagens e reconhecimento facial.
 Depende das bibliotecas numpy, io e face_recognition.
+
+face_recognition (dlib) é importado sob demanda, no primeiro uso: importar
+este módulo não carrega os modelos (ver APP_PROFILE em app/config.py).
 """
 import numpy as np
-import face_recognition
 from fastapi import UploadFile
-from typing import Optional, List, Dict, Tuple
+from typing import Any, Callable, Optional, List, Dict, Tuple, Union
 import io
-from PIL import Image
+import math
+import threading
+from PIL import Image, ImageOps
+from app.config import settings
+from app.services.matching_service import as_embedding_matrix
+from app.services.batching import best_match as batched_best_match
 
 # Defina a tolerância de distância facial (quanto menor, mais rigoroso)
 FACE_RECOGNITION_TOLERANCE = 0.55
 
+# Identificador dos embeddings gerados por face_recognition (coluna 'modelo')
+FACE_RECOGNITION_MODEL = "face_recognition"
+
 # Tamanho padrão para preprocessamento de imagens (melhor performance)
 TARGET_IMAGE_SIZE = (300, 300)
 
+# Margem em volta da caixa do rosto no recorte entregue ao DeepFace
+# (fração do maior lado da caixa; a caixa do HOG corta testa e queixo)
+FACE_CROP_MARGIN = 0.2
+
+# Perfis de detecção (settings.DETECTION_PROFILE / ENROLLMENT_DETECTION_PROFILE
+# ou o parâmetro 'perfil' dos endpoints):
+#   scale                  fator de redução da imagem antes do HOG (a janela do
+#                          HOG tem 80 px: com 0.5, rostos < 160 px somem)
+#   upsample               vezes que o HOG amplia a imagem (acha rostos menores)
+#   landmarks              modelo de pontos faciais: "small" (5) ou "large" (68)
+#   jitters                reamostragens do rosto no encoding (mais estável, mais lento)
+#   retry_full_resolution  sem rosto, repete a detecção na resolução cheia
+#                          com upsample 1
+DETECTION_PROFILES = {
+    # Quiosque: rosto frontal de pelo menos ~80 px na imagem 300x300, sem
+    # ampliação (a parte mais cara do HOG); menores caem na nova tentativa
+    "fast": {
+        "scale": 1.0, "upsample": 0, "landmarks": "small",
+        "jitters": 1, "retry_full_resolution": True
+    },
+    # Comportamento padrão do face_recognition
+    "default": {
+        "scale": 1.0, "upsample": 1, "landmarks": "large",
+        "jitters": 1, "retry_full_resolution": False
+    },
+    # Cadastro: roda uma vez por foto, prioriza a qualidade do embedding
+    "accurate": {
+        "scale": 1.0, "upsample": 1, "landmarks": "large",
+        "jitters": 5, "retry_full_resolution": False
+    },
+}
+
 
-def preprocess_image(image_bytes: bytes) -> bytes:
+class ImageTooLargeError(ValueError):
+    """Upload acima de MAX_UPLOAD_BYTES ou MAX_IMAGE_PIXELS"""
+
+
+def read_upload(file: UploadFile) -> bytes:
     """
-    Preprocessa a imagem redimensionando para 300x300px.
-    Mantém a proporção e adiciona padding se necessário.
-    
+    Lê o upload, rejeitando-o assim que passar de MAX_UPLOAD_BYTES (sem
+    ler o restante do arquivo).
+
+    Raises:
+        ImageTooLargeError: Se o arquivo for maior que o limite
+    """
+    limit = settings.MAX_UPLOAD_BYTES
+    image_bytes = file.file.read(limit + 1) if limit > 0 else file.file.read()
+    if limit > 0 and len(image_bytes) > limit:
+        raise ImageTooLargeError(f"Imagem com mais de {limit} bytes")
+    return image_bytes
+
+
+def open_image(
+    image_bytes: bytes,
+    target_size: Optional[Tuple[int, int]] = None
+) -> Image.Image:
+    """
+    Abre a imagem aplicando os limites de upload e a orientação EXIF.
+
     Args:
-        image_bytes: Bytes da imagem original
-        
-    Returns:
-        Bytes da imagem processada em 300x300px
+        image_bytes: Bytes da imagem enviada
+        target_size: Tamanho final desejado; JPEGs maiores são decodificados
+                     direto em 1/2, 1/4 ou 1/8 da resolução (draft), sem
+                     ficar menores que ele
+
+    Raises:
+        ImageTooLargeError: Se os bytes ou a resolução passarem dos limites
     """
-    # Carregar imagem
+    if 0 < settings.MAX_UPLOAD_BYTES < len(image_bytes):
+        raise ImageTooLargeError(f"Imagem com mais de {settings.MAX_UPLOAD_BYTES} bytes")
+
+    # Image.open lê apenas o cabeçalho: o tamanho é conhecido antes de decodificar
     img = Image.open(io.BytesIO(image_bytes))
-    
-    # Converter para RGB se necessário (remove canal alpha)
+    width, height = img.size
+    if 0 < settings.MAX_IMAGE_PIXELS < width * height:
+        raise ImageTooLargeError(
+            f"Imagem com {width}x{height} pixels (limite: {settings.MAX_IMAGE_PIXELS})"
+        )
+
+    if target_size is not None:
+        # Rotações de 90° pelo EXIF trocam largura e altura
+        side = max(target_size)
+        img.draft(None, (side, side))
+    return ImageOps.exif_transpose(img)
+
+
+def _to_rgb(img: Image.Image) -> Image.Image:
+    """Converte para RGB (canal alpha vira fundo branco)"""
     if img.mode in ('RGBA', 'LA', 'P'):
         background = Image.new('RGB', img.size, (255, 255, 255))
         if img.mode == 'P':
             img = img.convert('RGBA')
         mask = img.split()[-1] if img.mode in ('RGBA', 'LA') else None
         background.paste(img, mask=mask)
-        img = background
-    elif img.mode != 'RGB':
-        img = img.convert('RGB')
+        return background
+    if img.mode != 'RGB':
+        return img.convert('RGB')
+    return img
+
+
+def preprocess_image(image_bytes: bytes) -> np.ndarray:
+    """
+    Preprocessa a imagem redimensionando para 300x300px.
+    Mantém a proporção e adiciona padding se necessário.
+    
+    Args:
+        image_bytes: Bytes da imagem original
+        
+    Returns:
+        Imagem 300x300 RGB uint8 (H, W, 3), pronta para face_recognition
+        e DeepFace (sem reencodar em JPEG)
+    
+    Raises:
+        ImageTooLargeError: Se a imagem passar de MAX_UPLOAD_BYTES/MAX_IMAGE_PIXELS
+    """
+    # Carregar imagem (JPEGs grandes já decodificados em escala reduzida)
+    img = _to_rgb(open_image(image_bytes, target_size=TARGET_IMAGE_SIZE))
     
     # Calcular proporções mantendo aspect ratio
     width, height = img.size
@@ -61,50 +163,287 @@ def preprocess_image(image_bytes: bytes) -> bytes:
     paste_y = (target_height - new_height) // 2
     final_img.paste(img, (paste_x, paste_y))
     
-    # Converter de volta para bytes
-    output = io.BytesIO()
-    final_img.save(output, format='JPEG', quality=95)
-    output.seek(0)
+    return np.asarray(final_img, dtype=np.uint8)
+
+
+def load_image(image_bytes: bytes, preprocess: bool = True) -> np.ndarray:
+    """
+    Decodifica a imagem uma única vez como RGB uint8 (H, W, 3).
     
-    return output.read()
+    Args:
+        image_bytes: Bytes da imagem enviada
+        preprocess: Se True, redimensiona para 300x300px (padrão: True)
+    """
+    if preprocess:
+        return preprocess_image(image_bytes)
+    return np.asarray(_to_rgb(open_image(image_bytes)), dtype=np.uint8)
+
+
+def read_image(file: UploadFile, preprocess: bool = True) -> np.ndarray:
+    """Lê o upload e o decodifica com load_image"""
+    return load_image(read_upload(file), preprocess=preprocess)
+
+
+def get_detection_profile(name: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Perfil de detecção pelo nome (padrão: settings.DETECTION_PROFILE).
+
+    Raises:
+        ValueError: Se o perfil não existir
+    """
+    name = name or settings.DETECTION_PROFILE
+    if name not in DETECTION_PROFILES:
+        raise ValueError(
+            f"Perfil de detecção desconhecido: {name} "
+            f"(opções: {', '.join(DETECTION_PROFILES)})"
+        )
+    return DETECTION_PROFILES[name]
+
+
+class RecognitionContext:
+    """
+    Estado de uma requisição de reconhecimento, compartilhado pelos estágios
+    face_recognition e DeepFace.
+
+    O upload é lido e decodificado uma única vez; o rosto é detectado uma
+    única vez (na primeira consulta), com o perfil de detecção escolhido, e
+    a mesma caixa serve ao encoding do face_recognition e ao recorte
+    alinhado entregue ao DeepFace, que então dispensa o próprio detector
+    (detector_backend="skip"). Pontos faciais e recorte só são calculados
+    se algum estágio pedir.
+
+    As etapas pesadas (detecção, encoding e DeepFace) passam por run(): com
+    um pool (worker_pool.RecognitionPool) elas rodam em outro processo.
+
+    Attributes:
+        raw: Bytes do upload (None se criado a partir de um array)
+        image: Imagem RGB uint8 (H, W, 3), preprocessada
+        profile: Perfil de detecção (DETECTION_PROFILES)
+        pool: Pool de processos das etapas pesadas (None = no próprio thread)
+    """
+
+    def __init__(
+        self,
+        image: np.ndarray,
+        raw: Optional[bytes] = None,
+        profile: Optional[str] = None,
+        pool: Optional[Any] = None
+    ):
+        self.raw = raw
+        self.image = image
+        self.profile = get_detection_profile(profile)
+        self.pool = pool
+        self._lock = threading.Lock()  # estágios podem rodar em paralelo
+        self._detected = False
+        self._location: Optional[Tuple[int, int, int, int]] = None
+        self._landmarks: Optional[Dict[str, List[Tuple[int, int]]]] = None
+        self._crop: Optional[np.ndarray] = None
+        self._encoded = False
+        self._encoding: Optional[np.ndarray] = None
+
+    @classmethod
+    def from_bytes(
+        cls,
+        image_bytes: bytes,
+        preprocess: bool = True,
+        profile: Optional[str] = None,
+        pool: Optional[Any] = None
+    ) -> "RecognitionContext":
+        """Decodifica os bytes (uma vez) e cria o contexto"""
+        return cls(load_image(image_bytes, preprocess=preprocess),
+                   raw=image_bytes, profile=profile, pool=pool)
+
+    @classmethod
+    def from_upload(
+        cls,
+        file: UploadFile,
+        preprocess: bool = True,
+        profile: Optional[str] = None,
+        pool: Optional[Any] = None
+    ) -> "RecognitionContext":
+        """Lê o upload (uma vez) e cria o contexto"""
+        return cls.from_bytes(read_upload(file), preprocess=preprocess,
+                              profile=profile, pool=pool)
+
+    def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Executa uma etapa pesada no pool de processos, se houver"""
+        if self.pool is None:
+            return fn(*args)
+        return self.pool.run(fn, *args)
+
+    @property
+    def face_location(self) -> Optional[Tuple[int, int, int, int]]:
+        """Caixa (top, right, bottom, left) do rosto, ou None"""
+        self._detect()
+        return self._location
+
+    @property
+    def landmarks(self) -> Optional[Dict[str, List[Tuple[int, int]]]]:
+        """Pontos faciais do rosto detectado (olhos, nariz...), ou None"""
+        self._detect()
+        if self._location is not None and self._landmarks is None:
+            with self._lock:
+                if self._landmarks is None:
+                    import face_recognition
+
+                    marks = face_recognition.face_landmarks(
+                        self.image, [self._location], model=self.profile["landmarks"]
+                    )
+                    self._landmarks = marks[0] if marks else {}
+        return self._landmarks or None
+
+    @property
+    def face_crop(self) -> Optional[np.ndarray]:
+        """Recorte RGB do rosto, com margem e olhos nivelados, ou None"""
+        if self.face_location is not None and self._crop is None:
+            landmarks = self.landmarks
+            with self._lock:
+                if self._crop is None:
+                    self._crop = _aligned_crop(self.image, self._location, landmarks)
+        return self._crop
+
+    def encoding(self) -> Optional[np.ndarray]:
+        """Encoding do face_recognition do rosto detectado (calculado uma vez), ou None"""
+        if self.face_location is not None and not self._encoded:
+            with self._lock:
+                if not self._encoded:
+                    self._encoding = self.run(
+                        _encode_face, self.image, self._location,
+                        self.profile["jitters"], self.profile["landmarks"]
+                    )
+                    self._encoded = True
+        return self._encoding
+
+    def _detect(self) -> None:
+        if self._detected:
+            return
+        with self._lock:
+            if self._detected:
+                return
+            profile = self.profile
+            locations = self.run(
+                _face_locations, self.image, profile["scale"], profile["upsample"]
+            )
+            if not locations and profile["retry_full_resolution"] and (
+                    profile["scale"] < 1.0 or profile["upsample"] < 1):
+                # Nenhum rosto na resolução reduzida ou sem ampliação: tenta a
+                # imagem inteira com upsample 1 (rostos a partir de ~40 px)
+                locations = self.run(_face_locations, self.image, 1.0, 1)
+            if locations:
+                # Primeiro rosto, como em face_encodings(image)[0]
+                self._location = locations[0]
+            self._detected = True
+
+
+def _face_locations(
+    image: np.ndarray,
+    scale: float,
+    upsample: int
+) -> List[Tuple[int, int, int, int]]:
+    """Detecção HOG na imagem reduzida por scale, com caixas na escala original"""
+    import face_recognition
+
+    if scale >= 1.0:
+        return face_recognition.face_locations(image, number_of_times_to_upsample=upsample)
+    height, width = image.shape[:2]
+    small = np.asarray(Image.fromarray(image).resize(
+        (max(int(width * scale), 1), max(int(height * scale), 1)),
+        Image.Resampling.BILINEAR
+    ))
+    return [
+        (min(int(top / scale), height), min(int(right / scale), width),
+         min(int(bottom / scale), height), max(int(left / scale), 0))
+        for top, right, bottom, left in face_recognition.face_locations(
+            small, number_of_times_to_upsample=upsample
+        )
+    ]
+
+
+def _encode_face(
+    image: np.ndarray,
+    location: Tuple[int, int, int, int],
+    jitters: int,
+    landmarks_model: str
+) -> Optional[np.ndarray]:
+    """Encoding do face_recognition do rosto na caixa informada"""
+    import face_recognition
+
+    face_encodings = face_recognition.face_encodings(
+        image,
+        known_face_locations=[location],
+        num_jitters=jitters,
+        model=landmarks_model
+    )
+    return face_encodings[0] if face_encodings else None
+
+
+def _aligned_crop(
+    image: np.ndarray,
+    location: Tuple[int, int, int, int],
+    landmarks: Optional[Dict[str, List[Tuple[int, int]]]]
+) -> np.ndarray:
+    """Recorta o rosto com FACE_CROP_MARGIN, girando a imagem para nivelar os olhos"""
+    top, right, bottom, left = location
+    height, width = image.shape[:2]
+    margin = int(FACE_CROP_MARGIN * max(bottom - top, right - left))
+    box = (
+        max(left - margin, 0), max(top - margin, 0),
+        min(right + margin, width), min(bottom + margin, height)
+    )
+
+    img = Image.fromarray(image)
+    if landmarks and landmarks.get('left_eye') and landmarks.get('right_eye'):
+        eyes = sorted(
+            (np.mean(landmarks['left_eye'], axis=0), np.mean(landmarks['right_eye'], axis=0)),
+            key=lambda point: point[0]
+        )
+        (x1, y1), (x2, y2) = eyes
+        angle = math.degrees(math.atan2(y2 - y1, x2 - x1))
+        if abs(angle) > 1.0:
+            center = ((x1 + x2) / 2, (y1 + y2) / 2)
+            img = img.rotate(
+                angle, resample=Image.Resampling.BILINEAR,
+                center=center, fillcolor=(255, 255, 255)
+            )
+    return np.asarray(img.crop(box), dtype=np.uint8)
 
 
 def get_face_encoding(
-    file: UploadFile,
-    preprocess: bool = True
+    file: Union[UploadFile, np.ndarray, RecognitionContext],
+    preprocess: bool = True,
+    profile: Optional[str] = "default"
 ) -> Optional[np.ndarray]:
     """
     Carrega o arquivo de imagem, encontra um rosto e retorna seu
     encoding (vetor). Retorna None se nenhum rosto for detectado.
     
     Args:
-        file: Arquivo de imagem enviado
-        preprocess: Se True, redimensiona para 300x300px (padrão: True)
+        file: Arquivo de imagem enviado, imagem RGB uint8 já decodificada
+              (read_image) ou RecognitionContext (reaproveita a detecção)
+        preprocess: Se True, redimensiona para 300x300px (padrão: True);
+                    ignorado quando a imagem já vem decodificada
+        profile: Perfil de detecção (padrão: "default", o comportamento
+                 original do face_recognition; None usa
+                 settings.DETECTION_PROFILE); ignorado com
+                 RecognitionContext, que já tem o seu
     
     Returns:
         np.ndarray com o encoding do rosto ou None
     """
-    # 1. Ler o conteúdo do arquivo
-    image_bytes = file.file.read()
-    
-    # 2. Preprocessar imagem se solicitado
-    if preprocess:
-        image_bytes = preprocess_image(image_bytes)
-
-    # 3. Carregar a imagem a partir dos bytes
-    image = face_recognition.load_image_file(io.BytesIO(image_bytes))
-
-    # 4. Encontrar todos os encodings na imagem (pegamos apenas o primeiro)
-    face_encodings = face_recognition.face_encodings(image)
-
-    if face_encodings:
-        return face_encodings[0]
-    return None
+    # Ler e decodificar a imagem (a menos que já venha decodificada) e
+    # detectar o rosto com o perfil escolhido
+    if isinstance(file, RecognitionContext):
+        context = file
+    elif isinstance(file, np.ndarray):
+        context = RecognitionContext(file, profile=profile)
+    else:
+        context = RecognitionContext.from_upload(file, preprocess=preprocess, profile=profile)
+    return context.encoding()
 
 
 def recognize_face(
     unknown_encoding: np.ndarray,
-    known_faces_data: List[Dict[str, any]]
+    known_faces_data
 ) -> Optional[Tuple[int, float]]:
     """
     Compara o encoding de um rosto desconhecido com todos os rostos
@@ -112,84 +451,35 @@ def recognize_face(
 
     Args:
         unknown_encoding: O vetor numpy do rosto a ser identificado.
-        known_faces_data: Uma lista de dicionários, cada um com
-                          'aluno_id' e 'embedding' (o vetor de rosto
-                          salvo como bytes pickle).
+        known_faces_data: Um GallerySnapshot (usa a partição de
+                          face_recognition), uma EmbeddingMatrix ou uma
+                          lista de dicionários, cada um com 'aluno_id' e
+                          'embedding' (o vetor de rosto salvo no banco).
 
     Returns:
         Uma tupla (aluno_id, confidence) do rosto mais próximo, ou None.
     """
-    if not known_faces_data:
+    if known_faces_data is None or len(known_faces_data) == 0:
         return None
 
     # 1. Preparar os dados conhecidos para a comparação
-    known_encodings = []
-    known_ids = []
-    
-    import pickle
-    import base64
+    known_matrix = as_embedding_matrix(known_faces_data, FACE_RECOGNITION_MODEL)
     
-    for face_record in known_faces_data:
-        try:
-            # Desserializar o embedding de bytes pickle para numpy array
-            embedding_data = face_record['embedding']
-            
-            # Check if it's a hex-encoded string from Supabase BYTEA
-            is_hex = (isinstance(embedding_data, str) and
-                      embedding_data.startswith('\\x'))
-            if is_hex:
-                # Remove \x prefix and decode hex to get original base64
-                hex_str = embedding_data.replace('\\x', '')
-                embedding_bytes = bytes.fromhex(hex_str)
-                # The result is the base64 string as bytes, decode to str
-                embedding_b64_str = embedding_bytes.decode('utf-8')
-                # Now decode base64 to get pickle bytes
-                pickle_bytes = base64.b64decode(embedding_b64_str)
-                # Finally unpickle to numpy array
-                embedding_array = pickle.loads(pickle_bytes)
-            elif isinstance(embedding_data, str):
-                # Decode base64 string to bytes first
-                embedding_bytes = base64.b64decode(embedding_data)
-                # Then unpickle to numpy array
-                embedding_array = pickle.loads(embedding_bytes)
-            elif isinstance(embedding_data, bytes):
-                # Direct pickle deserialização
-                embedding_array = pickle.loads(embedding_data)
-            elif isinstance(embedding_data, memoryview):
-                # Se vier como memoryview, converter para bytes primeiro
-                embedding_array = pickle.loads(bytes(embedding_data))
-            else:
-                # Fallback: tentar converter diretamente
-                embedding_array = np.array(embedding_data)
-            
-            known_encodings.append(embedding_array)
-            known_ids.append(face_record['aluno_id'])
-            
-        except Exception as e:
-            # Ignora registros mal formatados, mas imprime erro para debug
-            aluno_id = face_record.get('aluno_id')
-            print(f"Erro ao processar embedding do aluno ID {aluno_id}: {e}")
-            print(f"Tipo do embedding: {type(face_record.get('embedding'))}")
-            continue
-
-    if not known_encodings:
-        return None
-        
     # 2. Comparar o rosto desconhecido com todos os conhecidos
-    # Retorna uma lista de distâncias. Quanto menor, mais parecido.
-    face_distances = face_recognition.face_distance(
-        known_encodings, unknown_encoding
-    )
-
+    # (distância euclidiana, a mesma de face_recognition.face_distance).
     # 3. Encontrar o rosto com a menor distância (mais parecido)
-    best_match_index = np.argmin(face_distances)
-    min_distance = face_distances[best_match_index]
+    best_match = batched_best_match(
+        known_matrix, unknown_encoding, "euclidean", FACE_RECOGNITION_TOLERANCE
+    )
+    if best_match is None:
+        return None
+    best_match_index, min_distance = best_match
     
     # 4. Verificar se a distância está dentro do limite de tolerância
     if min_distance <= FACE_RECOGNITION_TOLERANCE:
         # A similaridade é 1.0 - distância
         # Retornamos a similaridade (maior é melhor)
-        matched_id = known_ids[best_match_index]
+        matched_id = int(known_matrix.ids[best_match_index])
         confidence = 1.0 - min_distance  # Calcula a similaridade (0 a 1)
     
         # Retorna a similaridade em porcentagem (0 a 100)
@@ -197,3 +487,38 @@ def recognize_face(
     
     # Nenhuma correspondência encontrada dentro da tolerância
     return None
+
+
+def rank_faces(
+    unknown_encoding: np.ndarray,
+    known_faces_data,
+    top_k: int = 5
+) -> List[Dict[str, Any]]:
+    """
+    Lista os top_k alunos mais parecidos com o rosto, do mais para o menos
+    parecido (um candidato por aluno, pela sua foto mais próxima).
+
+    Ao contrário de recognize_face, não aplica a tolerância: serve para a
+    revisão do professor e para calibrar o sistema sem reenviar a imagem.
+
+    Returns:
+        Lista de dicionários com 'aluno_id', 'nome', 'check_professor',
+        'similaridade' (0 a 100), 'distancia' e 'dentro_tolerancia'.
+    """
+    if known_faces_data is None or len(known_faces_data) == 0 or top_k <= 0:
+        return []
+
+    known_matrix = as_embedding_matrix(known_faces_data, FACE_RECOGNITION_MODEL)
+    candidates = []
+    for row, distance in known_matrix.top_students(unknown_encoding, "euclidean", top_k):
+        record = known_matrix.records[row] if known_matrix.records else {}
+        aluno = record.get('alunos') or {}
+        candidates.append({
+            "aluno_id": int(known_matrix.ids[row]),
+            "nome": aluno.get('nome'),
+            "check_professor": bool(aluno.get('check_professor')),
+            "similaridade": float(max(0.0, 1.0 - distance) * 100),
+            "distancia": float(distance),
+            "dentro_tolerancia": distance <= FACE_RECOGNITION_TOLERANCE
+        })
+    return candidates
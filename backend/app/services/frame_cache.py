@@ -0,0 +1,234 @@
+"""
+app/services/frame_cache.py
+---------------------------
+Cache de quadros quase idênticos enviados pelos quiosques.
+
+Enquanto o aluno está parado em frente à câmera, o quiosque envia um quadro
+por segundo praticamente igual ao anterior. O cache guarda, por cliente, o
+resultado do reconhecimento de cada quadro recente e o devolve para quadros:
+
+1. Idênticos: mesmo SHA-256 da imagem preprocessada
+2. Quase idênticos: rosto detectado na mesma posição (caixas com IoU de
+   pelo menos MIN_FACE_IOU) e dHash (hash perceptual de 64 bits) do recorte
+   do rosto a no máximo FRAME_CACHE_MAX_DISTANCE bits de distância. O hash
+   é do rosto, não do quadro inteiro: num quadro dominado pelo fundo, outro
+   aluno entrando mudaria poucos bits. Quem chama pode ainda exigir uma
+   verificação (verify) antes de reaproveitar um resultado quase idêntico,
+   como /reconhecer faz antes de registrar presença.
+
+As entradas expiram após FRAME_CACHE_TTL segundos, o total é limitado a
+FRAME_CACHE_SIZE (a menos usada recentemente sai primeiro) e a chave inclui
+tudo o que muda o resultado (turmas, perfil, top_k e versão da galeria).
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from app.config import settings
+
+# Lado da miniatura do dHash (DHASH_SIZE x DHASH_SIZE bits)
+DHASH_SIZE = 8
+
+# Sobreposição mínima (interseção / união) entre as caixas do rosto de dois
+# quadros para que sejam considerados quase idênticos
+MIN_FACE_IOU = 0.5
+
+FaceBox = Tuple[int, int, int, int]  # (top, right, bottom, left)
+
+
+def dhash(image: np.ndarray) -> int:
+    """Hash perceptual (diferença horizontal) de 64 bits da imagem RGB"""
+    gray = Image.fromarray(image).convert('L').resize(
+        (DHASH_SIZE + 1, DHASH_SIZE), Image.Resampling.BILINEAR
+    )
+    pixels = np.asarray(gray, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).ravel()
+    return int(np.packbits(bits).view('>u8')[0])
+
+
+def content_hash(image: np.ndarray) -> str:
+    """SHA-256 dos pixels da imagem preprocessada"""
+    return hashlib.sha256(np.ascontiguousarray(image).data).hexdigest()
+
+
+def face_dhash(image: np.ndarray, box: FaceBox) -> int:
+    """dHash do recorte do rosto"""
+    top, right, bottom, left = box
+    return dhash(np.ascontiguousarray(image[top:bottom, left:right]))
+
+
+def _box_area(box: FaceBox) -> int:
+    top, right, bottom, left = box
+    return (bottom - top) * (right - left)
+
+
+def box_iou(a: FaceBox, b: FaceBox) -> float:
+    """Interseção sobre união de duas caixas (top, right, bottom, left)"""
+    height = min(a[2], b[2]) - max(a[0], b[0])
+    width = min(a[1], b[1]) - max(a[3], b[3])
+    if height <= 0 or width <= 0:
+        return 0.0
+    intersection = height * width
+    return intersection / float(_box_area(a) + _box_area(b) - intersection)
+
+
+class FrameCache:
+    """
+    Cache LRU com TTL dos resultados de reconhecimento por cliente.
+
+    Attributes:
+        ttl: Validade de cada entrada, em segundos (0 desliga o cache)
+        max_entries: Número máximo de entradas (todos os clientes)
+        max_distance: Distância de Hamming máxima entre dHashes
+    """
+
+    def __init__(self, ttl: float, max_entries: int, max_distance: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self._entries: "OrderedDict[Tuple[Hashable, str], Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"exact_hits": 0, "near_hits": 0, "misses": 0,
+                          "rejected": 0, "expired": 0, "evictions": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_entries > 0
+
+    def get(
+        self,
+        key: Hashable,
+        image: np.ndarray,
+        face_box: Optional[Callable[[], Optional[FaceBox]]] = None,
+        verify: Optional[Callable[[Any], bool]] = None
+    ) -> Optional[Any]:
+        """
+        Resultado em cache para a imagem, ou None.
+
+        Args:
+            key: Cliente e parâmetros do reconhecimento (ver make_key)
+            image: Imagem RGB preprocessada do quadro
+            face_box: Devolve a caixa do rosto do quadro; só é chamada se
+                      não houver acerto exato. Sem ela (ou sem rosto), só
+                      quadros idênticos acertam.
+            verify: Recebe o resultado de um quadro quase idêntico e diz se
+                    ele pode ser reaproveitado (False conta como "rejected")
+        """
+        if not self.enabled:
+            return None
+        digest = content_hash(image)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get((key, digest))
+            if entry is not None and entry["expires"] > now:
+                self._entries.move_to_end((key, digest))
+                self._counters["exact_hits"] += 1
+                return entry["result"]
+
+        box = face_box() if face_box is not None else None
+        if box is None:
+            with self._lock:
+                self._counters["misses"] += 1
+            return None
+        perceptual = face_dhash(image, box)
+        with self._lock:
+            best = None
+            for entry_key, entry in list(self._entries.items()):
+                if entry["expires"] <= now:
+                    del self._entries[entry_key]
+                    self._counters["expired"] += 1
+                    continue
+                if entry_key[0] != key or entry["box"] is None:
+                    continue
+                if box_iou(entry["box"], box) < MIN_FACE_IOU:
+                    continue
+                distance = bin(entry["dhash"] ^ perceptual).count("1")
+                if distance <= self.max_distance and (best is None or distance < best[0]):
+                    best = (distance, entry_key, entry["result"])
+            if best is None:
+                self._counters["misses"] += 1
+                return None
+
+        if verify is not None and not verify(best[2]):
+            with self._lock:
+                self._counters["rejected"] += 1
+            return None
+        with self._lock:
+            if best[1] in self._entries:
+                self._entries.move_to_end(best[1])
+            self._counters["near_hits"] += 1
+        return best[2]
+
+    def put(
+        self,
+        key: Hashable,
+        image: np.ndarray,
+        result: Any,
+        face_box: Optional[FaceBox] = None
+    ) -> None:
+        """
+        Guarda o resultado do reconhecimento da imagem.
+
+        Args:
+            face_box: Caixa do rosto do quadro; sem ela a entrada só serve
+                      a quadros idênticos
+        """
+        if not self.enabled:
+            return
+        entry = {
+            "box": face_box,
+            "dhash": face_dhash(image, face_box) if face_box is not None else None,
+            "result": result,
+            "expires": time.monotonic() + self.ttl,
+        }
+        entry_key = (key, content_hash(image))
+        with self._lock:
+            self._entries[entry_key] = entry
+            self._entries.move_to_end(entry_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores e taxa de acerto (endpoint de status)"""
+        with self._lock:
+            counters = dict(self._counters)
+            size = len(self._entries)
+        lookups = (counters["exact_hits"] + counters["near_hits"]
+                   + counters["misses"] + counters["rejected"])
+        hits = counters["exact_hits"] + counters["near_hits"]
+        return {
+            **counters,
+            "entradas": size,
+            "taxa_acerto": round(hits / lookups, 4) if lookups else None,
+            "ttl": self.ttl,
+            "tamanho_maximo": self.max_entries,
+            "distancia_maxima": self.max_distance,
+        }
+
+
+def make_key(client: str, *params: Hashable) -> Tuple[Hashable, ...]:
+    """Chave do cache: cliente mais os parâmetros que mudam o resultado"""
+    return (client,) + tuple(params)
+
+
+# Global instance and FastAPI dependency
+frame_cache = FrameCache(
+    ttl=settings.FRAME_CACHE_TTL,
+    max_entries=settings.FRAME_CACHE_SIZE,
+    max_distance=settings.FRAME_CACHE_MAX_DISTANCE
+)
+
+
+def get_frame_cache() -> FrameCache:
+    """Returns the global frame cache instance"""
+    return frame_cache
@@ -0,0 +1,742 @@
+"""
+app/services/gallery_service.py
+-------------------------------
+Galeria de embeddings faciais mantida em memória pelo processo.
+
+Evita chamar SupabaseDB.get_all_faces() (e desserializar cada embedding)
+a cada reconhecimento:
+1. A galeria é carregada uma única vez, já com os embeddings decodificados
+2. Cadastros, remoções e mudanças de status aplicam patches no snapshot
+3. Recargas completas rodam em background e trocam o snapshot atomicamente,
+   de forma que as requisições nunca esperam por uma recarga
+4. Com ANN_ENABLED, partições grandes ganham um índice IVF (ann_index),
+   treinado em background e atualizado incrementalmente a cada snapshot
+5. GALLERY_STORAGE_MODE (float16/int8) faz a busca grossa rodar sobre
+   códigos quantizados; os vetores float32 ficam para o re-ranqueamento
+   exato
+6. Com GALLERY_SNAPSHOT_DIR, cada carga completa é exportada para um
+   snapshot em disco (snapshot_file), por um processo de cada vez. A carga
+   inicial dos workers abre esse snapshot com mmap e busca no banco apenas
+   as linhas mais novas que a geração dele e as lápides posteriores à sua
+   marca (embeddings removidos, alunos alterados). As partições mantêm as
+   linhas do snapshot como fatias da matriz mapeada e os cadastros
+   posteriores em segmentos à parte
+7. A cada GALLERY_SYNC_INTERVAL segundos a galeria busca apenas as linhas
+   e as lápides de gallery_tombstones (embeddings apagados, alunos
+   alterados) acima das suas marcas d'água, mais as criadas na janela de
+   SYNC_LOOKBACK_SECONDS (confirmadas fora de ordem), de modo que vários
+   nós convergem segundos após um cadastro sem recarregar a tabela
+   inteira. Só um marcador 'purge' (lápides expurgadas acima da marca do
+   nó) força a recarga completa
+8. A carga completa lê a tabela em páginas buscadas em paralelo e decodifica
+   cada página assim que ela chega; o total carregado é comparado com a
+   contagem exata do banco (status()), então um corte no limite de linhas
+   do PostgREST não passa despercebido
+"""
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.config import settings
+from app.services.ann_index import IVFIndex
+from app.services.db_service import SupabaseDB, db_manager
+from app.services.embedding_codec import LEGACY_MODEL, decode_embedding_with_model
+from app.services.matching_service import EmbeddingMatrix, GallerySnapshot
+from app.services import snapshot_file
+
+
+# Linhas e lápides criadas nesta janela (relógio local, antes da consulta
+# anterior) são re-consultadas mesmo com id abaixo da marca d'água, para não
+# perder inserções confirmadas fora de ordem
+SYNC_LOOKBACK_SECONDS = 30
+
+
+class FaceGallery:
+    """
+    Snapshot imutável dos rostos cadastrados, com troca atômica.
+
+    Cada registro mantém o formato devolvido por get_all_faces()
+    ('id', 'aluno_id', 'modelo', 'embedding', 'foto_nome', 'alunos'), mas
+    com 'embedding' já decodificado como np.ndarray. Leitores recebem uma tupla
+    que nunca é modificada; escritores constroem uma nova tupla e a trocam
+    sob lock (copy-on-write).
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[Dict[str, int]], Iterable[List[Dict[str, Any]]]],
+        db: Optional[SupabaseDB] = None
+    ):
+        """
+        Args:
+            loader: Função que devolve as linhas de face_embeddings em
+                    páginas e preenche o dicionário recebido com 'expected'
+                    e 'loaded' (normalmente SupabaseDB.iter_all_faces)
+            db: Banco usado nas cargas incrementais (snapshot em disco e
+                sincronização periódica); sem ele, só há cargas completas
+        """
+        self._loader = loader
+        self._db = db
+        self._faces: Optional[Tuple[Dict[str, Any], ...]] = None
+        self._lock = threading.Lock()       # protege a troca do snapshot
+        self._load_lock = threading.Lock()  # serializa as cargas no banco
+        self._version = 0                   # incrementado a cada mutação
+        self._rebuild_requested = False
+        self._rebuild_thread: Optional[threading.Thread] = None
+        self._snapshot_cache: Optional[GallerySnapshot] = None
+        self._ann_indexes: Dict[str, IVFIndex] = {}
+        self._ann_training: set = set()
+        # Marcas d'água da sincronização incremental
+        self._generation = 0                # maior id de face_embeddings visto
+        self._newest_created_at: Optional[str] = None
+        self._tombstone_mark = 0            # maior id de gallery_tombstones visto
+        self._sync_window: Optional[str] = None  # início da janela de re-consulta
+        self._seen_tombstones: set = set()  # lápides já aplicadas na janela
+        self._last_sync_at: Optional[float] = None
+        self._sync_lock = threading.Lock()
+        self._sync_thread: Optional[threading.Thread] = None
+        self._load_report: Dict[str, int] = {}  # última carga completa
+
+    # ========================================
+    # LEITURA
+    # ========================================
+
+    def get_faces(self) -> Tuple[Dict[str, Any], ...]:
+        """
+        Retorna o snapshot atual da galeria.
+
+        Apenas a primeira chamada do processo bloqueia (carga inicial);
+        depois disso o snapshot corrente é devolvido imediatamente, mesmo
+        que uma recarga esteja em andamento.
+        """
+        faces = self._faces
+        if faces is None:
+            with self._load_lock:
+                if self._faces is None:
+                    self._reload()
+            faces = self._faces
+            self._start_sync()
+        return faces
+
+    def snapshot(self) -> GallerySnapshot:
+        """
+        Retorna o snapshot atual particionado por modelo.
+
+        As matrizes de cada modelo são montadas uma vez por snapshot e
+        reaproveitadas até a próxima troca (patch ou recarga).
+        """
+        faces = self.get_faces()
+        cached = self._snapshot_cache
+        if cached is not None and cached.faces is faces:
+            return cached
+        snapshot = GallerySnapshot(
+            faces,
+            prepare_matrix=self._attach_ann,
+            storage=settings.GALLERY_STORAGE_MODE
+        )
+        self._snapshot_cache = snapshot
+        return snapshot
+
+    @property
+    def loaded(self) -> bool:
+        """Indica se a carga inicial já foi feita"""
+        return self._faces is not None
+
+    @property
+    def version(self) -> int:
+        """Incrementado a cada troca do snapshot (patch ou recarga)"""
+        return self._version
+
+    def __len__(self) -> int:
+        return len(self._faces or ())
+
+    # ========================================
+    # RECARGA EM BACKGROUND
+    # ========================================
+
+    def invalidate(self) -> None:
+        """
+        Agenda uma recarga completa em background.
+
+        O snapshot atual continua sendo servido até a nova versão ficar
+        pronta. Várias invalidações seguidas resultam em uma única recarga.
+        """
+        with self._lock:
+            self._rebuild_requested = True
+            if self._rebuild_thread and self._rebuild_thread.is_alive():
+                return
+            self._rebuild_thread = threading.Thread(
+                target=self._rebuild_loop,
+                name="face-gallery-rebuild",
+                daemon=True
+            )
+            self._rebuild_thread.start()
+
+    def _rebuild_loop(self) -> None:
+        while True:
+            with self._lock:
+                if not self._rebuild_requested:
+                    self._rebuild_thread = None
+                    return
+                self._rebuild_requested = False
+            try:
+                with self._load_lock:
+                    self._reload()
+            except Exception as e:
+                print(f"Erro ao recarregar galeria de rostos: {e}")
+
+    def _reload(self) -> None:
+        """
+        Carrega a tabela e troca o snapshot.
+
+        Se algum patch for aplicado enquanto a carga está em andamento, o
+        resultado pode não conter aquela mudança; nesse caso a carga é
+        descartada e refeita.
+        """
+        while True:
+            with self._lock:
+                start_version = self._version
+            # Lápides posteriores a esta marca são reaplicadas pela
+            # sincronização (a carga pode ou não já refleti-las)
+            sync_window = self._lookback_start()
+            tombstone_mark = self._tombstone_watermark()
+            faces = self._load_faces(tombstone_mark, sync_window)
+            with self._lock:
+                if self._version == start_version:
+                    self._faces = faces
+                    self._version += 1
+                    self._generation = snapshot_file.snapshot_generation(faces)
+                    self._newest_created_at = max(
+                        (face['created_at'] for face in faces
+                         if face.get('created_at')), default=None
+                    )
+                    self._tombstone_mark = tombstone_mark
+                    self._sync_window = sync_window
+                    self._seen_tombstones = set()
+                    self._last_sync_at = time.time()
+                    return
+
+    def _load_faces(
+        self,
+        tombstone_mark: int,
+        sync_window: str
+    ) -> Tuple[Dict[str, Any], ...]:
+        """
+        Carga inicial pelo snapshot em disco, se houver; senão, completa.
+
+        Args:
+            tombstone_mark: Marca de lápides lida antes da carga
+            sync_window: Início da janela de re-consulta no momento da
+                         leitura da marca (ambos gravados no snapshot)
+        """
+        if self._faces is None and self._snapshot_enabled:
+            try:
+                faces = self._load_from_snapshot(tombstone_mark, sync_window)
+                if faces is not None:
+                    return faces
+            except Exception as e:
+                print(f"Erro ao abrir snapshot da galeria: {e}")
+
+        faces = self._load_all()
+        self._export_async(faces, tombstone_mark, sync_window)
+        return faces
+
+    def _load_all(self) -> Tuple[Dict[str, Any], ...]:
+        """
+        Carga completa, decodificando cada página à medida que chega.
+
+        As páginas chegam fora de ordem (e podem se sobrepor se houver
+        inserções durante a carga); o resultado é deduplicado e ordenado
+        por id.
+        """
+        start = time.time()
+        stats: Dict[str, int] = {}
+        by_id: Dict[Any, Dict[str, Any]] = {}
+        pending = []
+        for page in self._loader(stats):
+            for face in self._decode_rows(page):
+                if face.get('id') is None:
+                    pending.append(face)
+                else:
+                    by_id[face['id']] = face
+        faces = tuple(by_id[key] for key in sorted(by_id)) + tuple(pending)
+
+        self._load_report = stats
+        print(f"Galeria carregada: {stats.get('loaded', 0)}/"
+              f"{stats.get('expected', 0)} linhas em {stats.get('pages', 0)} "
+              f"páginas ({len(faces)} embeddings, {time.time() - start:.2f}s)")
+        return faces
+
+    @property
+    def _snapshot_enabled(self) -> bool:
+        return bool(settings.GALLERY_SNAPSHOT_DIR and self._db is not None)
+
+    def _load_from_snapshot(
+        self,
+        tombstone_mark: int,
+        sync_window: str
+    ) -> Optional[Tuple[Dict[str, Any], ...]]:
+        """
+        Abre o snapshot com mmap e aplica as mudanças posteriores a ele.
+
+        Só as lápides e linhas acima das marcas do snapshot (mais as da sua
+        janela de re-consulta) vêm do banco, com o mesmo patch da
+        sincronização, sem reler o índice da tabela inteira. Se lápides
+        posteriores ao snapshot já foram expurgadas, devolve None e a carga
+        é completa.
+        """
+        loaded = snapshot_file.load_snapshot(settings.GALLERY_SNAPSHOT_DIR)
+        if loaded is None:
+            return None
+        meta, cached = loaded
+        generation = meta["generation"]
+
+        tombstones = self._tombstones_after(
+            meta["tombstone_mark"], meta.get("sync_window")
+        )
+        if tombstones is None:
+            return None
+        patch, rows = self._catch_up(
+            cached, tombstones,
+            self._db.get_faces_since(generation, created_after=meta.get("sync_window"))
+        )
+        faces = patch(cached) if patch is not None else cached
+
+        print(f"Galeria aberta do snapshot (geração {generation}): "
+              f"{len(cached)} do disco, {len(rows)} novos, "
+              f"{len(tombstones)} lápides")
+        if patch is not None:
+            self._export_async(faces, tombstone_mark, sync_window)
+        return faces
+
+    def _export_async(
+        self,
+        faces: Tuple[Dict[str, Any], ...],
+        tombstone_mark: int,
+        sync_window: str
+    ) -> None:
+        if not settings.GALLERY_SNAPSHOT_DIR:
+            return
+
+        def export():
+            try:
+                snapshot_file.export_snapshot(
+                    faces, settings.GALLERY_SNAPSHOT_DIR,
+                    tombstone_mark, sync_window
+                )
+            except Exception as e:
+                print(f"Erro ao exportar snapshot da galeria: {e}")
+
+        threading.Thread(
+            target=export, name="face-gallery-export", daemon=True
+        ).start()
+
+    @staticmethod
+    def _decode_rows(
+        rows: List[Dict[str, Any]]
+    ) -> Tuple[Dict[str, Any], ...]:
+        faces = []
+        for row in rows or []:
+            aluno = row.get('alunos') or {}
+            if aluno.get('ativo') is False:
+                continue
+            try:
+                model_name, embedding = decode_embedding_with_model(
+                    row['embedding']
+                )
+            except Exception as e:
+                print(f"Erro ao processar embedding do aluno ID "
+                      f"{row.get('aluno_id')}: {e}")
+                continue
+            faces.append({
+                **row,
+                'modelo': row.get('modelo') or model_name,
+                'embedding': embedding
+            })
+        return tuple(faces)
+
+    # ========================================
+    # SINCRONIZAÇÃO INCREMENTAL
+    # ========================================
+
+    def _start_sync(self) -> None:
+        """Inicia a sincronização periódica (uma vez por processo)"""
+        if self._db is None or settings.GALLERY_SYNC_INTERVAL <= 0:
+            return
+        with self._lock:
+            if self._sync_thread is not None:
+                return
+            self._sync_thread = threading.Thread(
+                target=self._sync_loop, name="face-gallery-sync", daemon=True
+            )
+            self._sync_thread.start()
+
+    def _sync_loop(self) -> None:
+        while True:
+            time.sleep(settings.GALLERY_SYNC_INTERVAL)
+            try:
+                self.sync()
+            except Exception as e:
+                print(f"Erro ao sincronizar galeria de rostos: {e}")
+
+    @staticmethod
+    def _lookback_start() -> str:
+        start = datetime.now(timezone.utc) - timedelta(seconds=SYNC_LOOKBACK_SECONDS)
+        return start.isoformat()
+
+    def _tombstone_watermark(self) -> int:
+        if self._db is None:
+            return 0
+        try:
+            return self._db.get_tombstone_watermark()
+        except Exception as e:
+            # Banco ainda sem a tabela gallery_tombstones
+            print(f"Erro ao ler lápides da galeria: {e}")
+            return 0
+
+    def sync(self) -> None:
+        """
+        Aplica as mudanças do banco desde a última sincronização.
+
+        Busca as linhas de face_embeddings e as lápides acima das marcas
+        d'água, mais as criadas desde SYNC_LOOKBACK_SECONDS antes da
+        sincronização anterior (confirmadas fora de ordem; lápides já
+        aplicadas são ignoradas): embeddings apagados saem da galeria,
+        alunos alterados têm nome, turma e status atualizados (inativos
+        saem, reativados têm os embeddings buscados). Se um marcador de
+        expurgo indicar lápides removidas antes de serem vistas, agenda uma
+        recarga completa.
+        """
+        if self._faces is None or self._db is None:
+            return
+
+        with self._sync_lock:
+            next_window = self._lookback_start()
+            tombstones = self._tombstones_after(self._tombstone_mark, self._sync_window)
+            if tombstones is None:
+                self.invalidate()
+                return
+
+            rows = self._db.get_faces_since(
+                self._generation, created_after=self._sync_window
+            )
+            patch, rows = self._catch_up(
+                self._faces,
+                [t for t in tombstones if t['id'] not in self._seen_tombstones],
+                rows
+            )
+            if patch is not None:
+                self._apply(patch)
+
+            if rows:
+                self._generation = max(self._generation,
+                                       max(row['id'] for row in rows))
+                self._newest_created_at = max(
+                    [self._newest_created_at or ''] +
+                    [row['created_at'] for row in rows if row.get('created_at')]
+                ) or None
+            if tombstones:
+                self._tombstone_mark = max(self._tombstone_mark,
+                                           max(t['id'] for t in tombstones))
+            # A próxima janela começa depois desta, então só estas lápides
+            # podem voltar na próxima consulta
+            self._seen_tombstones = {t['id'] for t in tombstones}
+            self._sync_window = next_window
+            self._last_sync_at = time.time()
+
+    def _tombstones_after(
+        self,
+        mark: int,
+        created_after: Optional[str]
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Lápides acima da marca (mais as criadas após created_after).
+
+        Buracos na sequência de ids (inserções desfeitas) não significam
+        nada; só um marcador 'purge' novo cujo purged_until_id passa da
+        marca indica lápides apagadas antes de serem vistas.
+
+        Returns:
+            As lápides, ou None se é preciso recarregar tudo
+        """
+        tombstones = self._db.get_tombstones_since(mark, created_after=created_after)
+        for tombstone in tombstones:
+            if (tombstone['tipo'] == 'purge' and tombstone['id'] > mark
+                    and (tombstone.get('purged_until_id') or 0) > mark):
+                print("Lápides da galeria expurgadas antes da sincronização, "
+                      "recarregando tudo")
+                return None
+        return tombstones
+
+    def _catch_up(
+        self,
+        faces: Tuple[Dict[str, Any], ...],
+        tombstones: List[Dict[str, Any]],
+        rows: List[Dict[str, Any]]
+    ) -> Tuple[Optional[Callable], List[Dict[str, Any]]]:
+        """
+        Patch que aplica lápides e linhas novas a `faces`.
+
+        Returns:
+            (patch ou None se não houver mudança, linhas buscadas, incluindo
+            os embeddings de alunos reativados)
+        """
+        removed = {t['embedding_id'] for t in tombstones
+                   if t['tipo'] == 'embedding'}
+        changed = sorted({t['aluno_id'] for t in tombstones
+                          if t['tipo'] == 'aluno'})
+        alunos = {
+            aluno['id']: aluno
+            for aluno in (self._db.get_alunos_by_ids(changed) if changed else [])
+        }
+
+        # Alunos reativados: os embeddings precisam vir do banco
+        present = {face['aluno_id'] for face in faces}
+        reactivated = [aluno_id for aluno_id, aluno in alunos.items()
+                       if aluno.get('ativo') is not False
+                       and aluno_id not in present]
+        if reactivated:
+            rows = rows + self._db.get_faces_by_alunos(reactivated)
+        # Linhas re-consultadas na janela que a galeria já tem
+        known_ids = {face['id'] for face in faces}
+        new_faces = tuple(face for face in self._decode_rows(rows)
+                          if face['id'] not in known_ids)
+
+        def patch(faces):
+            known = {face['id'] for face in faces}
+            kept = []
+            for face in faces:
+                if face['id'] in removed:
+                    continue
+                aluno = alunos.get(face['aluno_id'])
+                if aluno is not None:
+                    if aluno.get('ativo') is False:
+                        continue
+                    face = {**face, 'alunos': _aluno_info(aluno)}
+                kept.append(face)
+            for face in new_faces:
+                if face['id'] in known or face['id'] in removed:
+                    continue
+                aluno = alunos.get(face['aluno_id'])
+                if aluno is not None:
+                    face = {**face, 'alunos': _aluno_info(aluno)}
+                known.add(face['id'])
+                kept.append(face)
+            return tuple(kept)
+
+        if (removed & known_ids) or alunos or new_faces:
+            return patch, rows
+        return None, rows
+
+    def status(self) -> Dict[str, Any]:
+        """Geração, marcas d'água e atraso da galeria (endpoint de status)"""
+        last_sync = self._last_sync_at
+        return {
+            "carregada": self.loaded,
+            "embeddings": len(self),
+            "geracao": self._generation,
+            "embedding_mais_recente": self._newest_created_at,
+            "lapide": self._tombstone_mark,
+            "ultima_sincronizacao": (
+                datetime.fromtimestamp(last_sync).isoformat() if last_sync else None
+            ),
+            "atraso_segundos": (
+                round(time.time() - last_sync, 1) if last_sync else None
+            ),
+            "intervalo_sincronizacao": settings.GALLERY_SYNC_INTERVAL,
+            "carga_linhas": self._load_report.get("loaded"),
+            "carga_esperadas": self._load_report.get("expected"),
+        }
+
+    # ========================================
+    # ÍNDICE ANN
+    # ========================================
+
+    def _attach_ann(self, model_name: str, matrix: EmbeddingMatrix) -> None:
+        """
+        Anexa o índice IVF do modelo à partição, se habilitado.
+
+        O índice é sincronizado de forma incremental com a partição
+        (inserções de cadastros e remoções de alunos). O treino roda em
+        background; até lá a partição usa a busca exaustiva.
+        """
+        if not settings.ANN_ENABLED or len(matrix) < settings.ANN_MIN_GALLERY_SIZE:
+            return
+
+        index = self._ann_indexes.get(model_name)
+        if index is None:
+            index = self._load_ann(model_name)
+        if index is None or index.needs_training(len(matrix)):
+            self._train_ann_async(model_name, matrix)
+            if index is None:
+                return
+
+        if index.sync(matrix.keys, matrix.row_vectors):
+            self._save_ann_async(model_name, index)
+        matrix.ann = index
+        matrix.ann_nprobe = settings.ANN_NPROBE
+
+    @staticmethod
+    def _ann_path(model_name: str) -> Optional[str]:
+        if not settings.ANN_INDEX_DIR:
+            return None
+        return os.path.join(settings.ANN_INDEX_DIR, f"ivf_{model_name}.npz")
+
+    def _load_ann(self, model_name: str) -> Optional[IVFIndex]:
+        path = self._ann_path(model_name)
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            index = IVFIndex.load(path)
+        except Exception as e:
+            print(f"Erro ao carregar índice ANN de {path}: {e}")
+            return None
+        self._ann_indexes[model_name] = index
+        return index
+
+    def _train_ann_async(self, model_name: str, matrix: EmbeddingMatrix) -> None:
+        with self._lock:
+            if model_name in self._ann_training:
+                return
+            self._ann_training.add(model_name)
+
+        def train():
+            try:
+                # face_recognition usa distância euclidiana; os modelos
+                # DeepFace usam cosine, então agrupamos vetores normalizados
+                index = IVFIndex(normalize=model_name != LEGACY_MODEL)
+                index.train(matrix.vectors)
+                index.sync(matrix.keys, matrix.vectors)
+                self._ann_indexes[model_name] = index
+                self._snapshot_cache = None  # próximas partições usam o índice
+                self._save_ann(model_name, index)
+                print(f"Índice ANN {model_name}: {len(index)} embeddings "
+                      f"em {index.n_lists} listas")
+            except Exception as e:
+                print(f"Erro ao treinar índice ANN {model_name}: {e}")
+            finally:
+                with self._lock:
+                    self._ann_training.discard(model_name)
+
+        threading.Thread(
+            target=train, name=f"ann-train-{model_name}", daemon=True
+        ).start()
+
+    def _save_ann(self, model_name: str, index: IVFIndex) -> None:
+        path = self._ann_path(model_name)
+        if path:
+            try:
+                index.save(path)
+            except Exception as e:
+                print(f"Erro ao salvar índice ANN em {path}: {e}")
+
+    def _save_ann_async(self, model_name: str, index: IVFIndex) -> None:
+        if self._ann_path(model_name):
+            threading.Thread(
+                target=self._save_ann, args=(model_name, index), daemon=True
+            ).start()
+
+    # ========================================
+    # PATCHES
+    # ========================================
+
+    def _apply(
+        self,
+        patch: Callable[[Tuple[Dict[str, Any], ...]], Tuple[Dict[str, Any], ...]]
+    ) -> None:
+        with self._lock:
+            self._version += 1
+            if self._faces is not None:
+                self._faces = patch(self._faces)
+
+    def add_face(
+        self,
+        aluno_id: int,
+        embedding: np.ndarray,
+        modelo: str,
+        foto_nome: Optional[str] = None,
+        nome: Optional[str] = None,
+        turma_id: Optional[int] = None,
+        embedding_id: Optional[int] = None,
+        check_professor: bool = False
+    ) -> None:
+        """Adiciona um embedding recém-cadastrado ao snapshot"""
+        record = {
+            'id': embedding_id,
+            'aluno_id': aluno_id,
+            'modelo': modelo,
+            'embedding': embedding,
+            'foto_nome': foto_nome,
+            'alunos': {
+                'nome': nome,
+                'turma_id': turma_id,
+                'ativo': True,
+                'check_professor': check_professor
+            }
+        }
+        self._apply(lambda faces: faces + (record,))
+
+    def remove_aluno(self, aluno_id: int) -> None:
+        """Remove todos os embeddings de um aluno do snapshot"""
+        self._apply(lambda faces: tuple(
+            face for face in faces if face['aluno_id'] != aluno_id
+        ))
+
+    def update_aluno(self, aluno: Dict[str, Any], reactivated: bool = False) -> None:
+        """
+        Reflete no snapshot uma atualização da tabela alunos.
+
+        Args:
+            aluno: Linha atualizada do aluno (como devolvida por
+                   SupabaseDB.update_aluno)
+            reactivated: A atualização marcou o aluno como ativo
+        """
+        aluno_id = aluno['id']
+        if aluno.get('ativo') is False:
+            self.remove_aluno(aluno_id)
+            return
+
+        faces = self._faces
+        if faces is None:
+            return
+        if not any(face['aluno_id'] == aluno_id for face in faces):
+            # Sem embeddings na galeria: aluno sem fotos (nada a fazer) ou
+            # reativado, cujos embeddings vêm do banco só para ele
+            if reactivated:
+                patch, _ = self._catch_up(
+                    faces, [], self._db.get_faces_by_alunos([aluno_id])
+                )
+                if patch is not None:
+                    self._apply(patch)
+            return
+
+        def patch(faces):
+            return tuple(
+                {**face, 'alunos': _aluno_info(aluno)}
+                if face['aluno_id'] == aluno_id else face
+                for face in faces
+            )
+        self._apply(patch)
+
+
+def _aluno_info(aluno: Dict[str, Any]) -> Dict[str, Any]:
+    """Dados do aluno guardados em cada registro ('alunos' do join)"""
+    return {
+        'nome': aluno.get('nome'),
+        'turma_id': aluno.get('turma_id'),
+        'ativo': aluno.get('ativo') is not False,
+        'check_professor': aluno.get('check_professor')
+    }
+
+
+# Global instance and FastAPI dependency
+face_gallery = FaceGallery(loader=db_manager.iter_all_faces, db=db_manager)
+
+
+def get_face_gallery() -> FaceGallery:
+    """Returns the global face gallery instance"""
+    return face_gallery
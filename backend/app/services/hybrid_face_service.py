@@ -5,17 +5,30 @@ Serviço híbrido de reconhecimento facial que combina face_recognition e DeepFa
 para obter a melhor combinação de velocidade e precisão.
 
 Estratégia:
+0. Rejeita quadros inutilizáveis (sem rosto, rosto pequeno, escuros,
+   estourados ou tremidos) antes de extrair embeddings (quality_service)
 1. Usa face_recognition primeiro (rápido)
 2. Se confiança alta: aceita resultado
 3. Se confiança média/baixa: valida com DeepFace
 4. Se não encontrar: tenta DeepFace como fallback
+
+Execução (HYBRID_PARALLEL_STAGES): nos modos "smart" e "always_both" a etapa
+DeepFace começa logo após a detecção, em outro thread, enquanto o
+face_recognition roda; a latência passa de FR + DF para max(FR, DF). No
+"smart" ela é especulativa: se o face_recognition tiver alta confiança, é
+cancelada (antes de começar, ou entre a extração e a busca na galeria).
 """
 import numpy as np
 from fastapi import UploadFile
-from typing import Optional, List, Dict, Tuple, Any
+from typing import Optional, List, Dict, Tuple, Any, Union
 import io
-from app.services.face_service import get_face_encoding, recognize_face
-from app.services.deepface_service import get_deepface_encoding, recognize_face_deepface
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from app.services.face_service import RecognitionContext, get_face_encoding, recognize_face, rank_faces
+from app.services.deepface_service import get_deepface_encoding, recognize_face_deepface, DEEPFACE_MODEL
+from app.services.matching_service import EmbeddingMatrix, GallerySnapshot, as_embedding_matrix
+from app.services.quality_service import check_quality
+from app.config import settings
 import time
 
 # Thresholds de confiança para a estratégia híbrida
@@ -25,6 +38,16 @@ LOW_CONFIDENCE_THRESHOLD = 35.0   # Abaixo disto, usa apenas DeepFace
 # Modo de operação
 HYBRID_MODE = "smart"  # Opções: "smart", "always_both", "fallback"
 
+# Modos em que a etapa DeepFace roda junto com o face_recognition
+# ("fallback" só a usa se o face_recognition falhar)
+PARALLEL_MODES = ("smart", "always_both")
+
+# Threads da etapa DeepFace concorrente
+_deepface_stage_pool = ThreadPoolExecutor(
+    max_workers=max(1, settings.HYBRID_STAGE_WORKERS),
+    thread_name_prefix="hybrid-deepface"
+)
+
 class HybridRecognitionResult:
     """Classe para armazenar resultado do reconhecimento híbrido"""
     def __init__(
@@ -35,7 +58,9 @@ class HybridRecognitionResult:
         fr_result: Optional[Tuple] = None,
         df_result: Optional[Tuple] = None,
         processing_time: float = 0.0,
-        agreement: Optional[bool] = None
+        agreement: Optional[bool] = None,
+        candidates: Optional[List[Dict[str, Any]]] = None,
+        rejection: Optional[Dict[str, Any]] = None
     ):
         self.aluno_id = aluno_id
         self.confidence = confidence
@@ -44,6 +69,8 @@ class HybridRecognitionResult:
         self.df_result = df_result  # (id, confidence, distance) from deepface
         self.processing_time = processing_time
         self.agreement = agreement  # True if both models agree
+        self.candidates = candidates or []  # top-k alunos (face_service.rank_faces)
+        self.rejection = rejection  # motivo do filtro de qualidade (quality_service)
     
     def to_dict(self) -> Dict:
         """Converte resultado para dicionário"""
@@ -63,28 +90,37 @@ class HybridRecognitionResult:
                     "confidence": round(self.df_result[1], 2) if self.df_result else None,
                     "distance": round(self.df_result[2], 4) if self.df_result else None
                 } if self.df_result else None
-            }
+            },
+            "candidates": self.candidates,
+            "rejection": self.rejection
         }
 
 
 def recognize_face_hybrid(
-    file: UploadFile,
-    known_faces_data: List[Dict[str, Any]],
-    mode: str = HYBRID_MODE
+    file: Union[UploadFile, RecognitionContext],
+    known_faces_data: Union[GallerySnapshot, EmbeddingMatrix, List[Dict[str, Any]]],
+    mode: str = HYBRID_MODE,
+    top_k: int = 0,
+    profile: Optional[str] = None
 ) -> HybridRecognitionResult:
     """
     Realiza reconhecimento facial usando estratégia híbrida.
     
     Args:
-        file: Arquivo de imagem
-        known_faces_data: Lista de rostos conhecidos
+        file: Arquivo de imagem, ou RecognitionContext já criado (ex.: pelo
+              cache de quadros, que precisa da imagem decodificada)
+        known_faces_data: Galeria (GallerySnapshot particionado por modelo) ou lista de rostos conhecidos
         mode: Modo de operação ("smart", "always_both", "fallback")
+        top_k: Se > 0, preenche result.candidates com os top_k alunos mais
+               próximos pelo embedding do face_recognition
+        profile: Perfil de detecção (padrão: settings.DETECTION_PROFILE)
     
     Returns:
         HybridRecognitionResult com informações detalhadas
     """
     start_time = time.time()
     result = HybridRecognitionResult()
+    deepface = None
     
     if not known_faces_data:
         result.processing_time = time.time() - start_time
@@ -93,10 +129,37 @@ def recognize_face_hybrid(
     # PASSO 1: Tentar face_recognition primeiro (sempre mais rápido)
     print("🚀 Iniciando reconhecimento com face_recognition...")
     try:
-        fr_encoding = get_face_encoding(file)
+        # Upload lido, decodificado e com o rosto detectado uma única vez,
+        # compartilhado pelos dois modelos
+        if isinstance(file, RecognitionContext):
+            context = file
+        else:
+            context = RecognitionContext.from_upload(file, profile=profile)
+        
+        # PASSO 0: Filtro de qualidade (usa a detecção do contexto)
+        if settings.QUALITY_GATE_ENABLED:
+            result.rejection = check_quality(context)
+            if result.rejection:
+                print(f"🚫 Quadro rejeitado pelo filtro de qualidade: {result.rejection['motivo']}")
+                result.method_used = "quality_rejected"
+                result.processing_time = time.time() - start_time
+                return result
+        
+        # DeepFace já começa, em paralelo ao face_recognition (ver docstring)
+        deepface = _DeepFaceStage(
+            context, known_faces_data,
+            parallel=settings.HYBRID_PARALLEL_STAGES and mode in PARALLEL_MODES
+        )
+        
+        fr_encoding = get_face_encoding(context)
         
         if fr_encoding is not None:
-            fr_match = recognize_face(fr_encoding, known_faces_data)
+            if top_k > 0:
+                result.candidates = rank_faces(fr_encoding, known_faces_data, top_k)
+            
+            fr_match = _match_with_fallback(
+                recognize_face, fr_encoding, known_faces_data
+            )
             result.fr_result = fr_match
             
             if fr_match:
@@ -108,6 +171,7 @@ def recognize_face_hybrid(
                     # Alta confiança: aceita direto
                     if fr_confidence >= HIGH_CONFIDENCE_THRESHOLD:
                         print(f"✨ Alta confiança ({fr_confidence:.2f}%), aceitando resultado")
+                        deepface.cancel()
                         result.aluno_id = fr_id
                         result.confidence = fr_confidence
                         result.method_used = "face_recognition_only"
@@ -117,7 +181,7 @@ def recognize_face_hybrid(
                     # Confiança média: validar com DeepFace
                     elif fr_confidence >= LOW_CONFIDENCE_THRESHOLD:
                         print(f"⚠️ Confiança média ({fr_confidence:.2f}%), validando com DeepFace...")
-                        df_result = _validate_with_deepface(file, known_faces_data)
+                        df_result = deepface.result()
                         result.df_result = df_result
                         
                         if df_result:
@@ -154,7 +218,7 @@ def recognize_face_hybrid(
                     # Baixa confiança: tentar DeepFace como autoridade
                     else:
                         print(f"⚠️ Baixa confiança ({fr_confidence:.2f}%), priorizando DeepFace...")
-                        df_result = _validate_with_deepface(file, known_faces_data)
+                        df_result = deepface.result()
                         result.df_result = df_result
                         
                         if df_result:
@@ -171,7 +235,7 @@ def recognize_face_hybrid(
                 # MODO 2: ALWAYS_BOTH - Sempre usa ambos
                 elif mode == "always_both":
                     print("🔄 Modo always_both: executando DeepFace...")
-                    df_result = _validate_with_deepface(file, known_faces_data)
+                    df_result = deepface.result()
                     result.df_result = df_result
                     
                     if df_result:
@@ -210,7 +274,7 @@ def recognize_face_hybrid(
                 
                 if mode in ["smart", "fallback"]:
                     print("🔄 Tentando DeepFace como fallback...")
-                    df_result = _validate_with_deepface(file, known_faces_data)
+                    df_result = deepface.result()
                     result.df_result = df_result
                     
                     if df_result:
@@ -224,7 +288,7 @@ def recognize_face_hybrid(
         else:
             print("❌ Nenhum rosto detectado por face_recognition")
             # Tentar DeepFace se não detectou rosto
-            df_result = _validate_with_deepface(file, known_faces_data)
+            df_result = deepface.result()
             result.df_result = df_result
             
             if df_result:
@@ -237,26 +301,84 @@ def recognize_face_hybrid(
         print(f"❌ Erro no reconhecimento híbrido: {e}")
         result.method_used = "error"
     
+    finally:
+        # Resultado já decidido: a etapa DeepFace não usada é descartada
+        if deepface is not None:
+            deepface.cancel()
+    
     result.processing_time = time.time() - start_time
     return result
 
 
+class _DeepFaceStage:
+    """
+    Etapa DeepFace de um reconhecimento híbrido.
+    
+    Com parallel=True roda desde já em _deepface_stage_pool; senão, só
+    quando result() for chamado (execução sequencial).
+    """
+    
+    def __init__(
+        self,
+        context: RecognitionContext,
+        known_faces_data: Union[GallerySnapshot, EmbeddingMatrix, List[Dict[str, Any]]],
+        parallel: bool
+    ):
+        self._context = context
+        self._known_faces_data = known_faces_data
+        self._cancelled = threading.Event()
+        self._future: Optional[Future] = None
+        if parallel:
+            self._future = _deepface_stage_pool.submit(self._run)
+    
+    def _run(self) -> Optional[Tuple[str, float, float]]:
+        return _validate_with_deepface(
+            self._context, self._known_faces_data, self._cancelled
+        )
+    
+    def result(self) -> Optional[Tuple[str, float, float]]:
+        """Resultado da etapa (espera a execução em paralelo, se houver)"""
+        if self._future is None:
+            return self._run()
+        return self._future.result()
+    
+    def cancel(self) -> None:
+        """Descarta a etapa: não começa, ou para antes da próxima fase"""
+        if self._cancelled.is_set():
+            return
+        self._cancelled.set()
+        if self._future is not None and self._future.cancel():
+            print("⏹️ DeepFace especulativo cancelado antes de começar")
+
+
 def _validate_with_deepface(
-    file: UploadFile, 
-    known_faces_data: List[Dict[str, Any]]
+    context: RecognitionContext, 
+    known_faces_data: Union[GallerySnapshot, EmbeddingMatrix, List[Dict[str, Any]]],
+    cancelled: Optional[threading.Event] = None
 ) -> Optional[Tuple[str, float, float]]:
     """
     Função auxiliar para validar com DeepFace.
     Retorna (student_id, confidence, distance) ou None.
+    
+    Compara apenas com embeddings do próprio modelo DeepFace; se nenhum
+    aluno tiver esse embedding, a extração nem é executada. Se cancelled
+    for sinalizado, para antes da extração ou antes da busca na galeria.
     """
     try:
-        # Reset file pointer
-        file.file.seek(0)
+        if not _has_embeddings(known_faces_data, DEEPFACE_MODEL):
+            print(f"⚠️ Nenhum embedding {DEEPFACE_MODEL} cadastrado, pulando DeepFace")
+            return None
         
-        df_encoding = get_deepface_encoding(file)
+        if cancelled is not None and cancelled.is_set():
+            return None
+        df_encoding = get_deepface_encoding(context)
+        if cancelled is not None and cancelled.is_set():
+            return None
         
         if df_encoding is not None:
-            df_match = recognize_face_deepface(df_encoding, known_faces_data)
+            df_match = _match_with_fallback(
+                recognize_face_deepface, df_encoding, known_faces_data
+            )
             return df_match
         
     except Exception as e:
@@ -265,6 +387,30 @@ def _validate_with_deepface(
     return None
 
 
+def _match_with_fallback(match_fn, encoding, known_faces_data):
+    """
+    Executa um reconhecedor na galeria informada.
+    
+    Se a galeria for uma visão restrita a turmas com global_fallback, e
+    não houver match nelas, repete a busca na galeria inteira.
+    """
+    match = match_fn(encoding, known_faces_data)
+    if (match is None and isinstance(known_faces_data, GallerySnapshot)
+            and known_faces_data.global_fallback):
+        print("🔄 Nenhum match na turma, buscando em todos os alunos...")
+        match = match_fn(encoding, known_faces_data.parent)
+    return match
+
+
+def _has_embeddings(known_faces_data, model_name: str) -> bool:
+    """Indica se há embeddings do modelo onde a busca pode ocorrer"""
+    if len(as_embedding_matrix(known_faces_data, model_name)) > 0:
+        return True
+    if isinstance(known_faces_data, GallerySnapshot) and known_faces_data.global_fallback:
+        return len(known_faces_data.parent.matrix(model_name)) > 0
+    return False
+
+
 def get_hybrid_statistics(results: List[HybridRecognitionResult]) -> Dict:
     """
     Gera estatísticas sobre o desempenho do sistema híbrido.
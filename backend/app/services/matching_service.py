@@ -0,0 +1,942 @@
+"""
+app/services/matching_service.py
+--------------------------------
+Busca vetorizada do rosto mais próximo na galeria.
+
+Os embeddings conhecidos ficam em uma única matriz float32 contígua com as
+normas pré-calculadas. Todas as distâncias (cosine, euclidean e
+euclidean_l2) de um probe contra a galeria saem de um único produto
+matriz-vetor (BLAS), e o melhor candidato é escolhido com argmin.
+
+Em galerias grandes a matriz pode ter um índice IVF (ann_index) anexado:
+a busca então re-ranqueia com distância exata os candidatos das listas
+visitadas e só aceita o melhor deles quando ele não passa do limite
+inferior das listas não visitadas (centróide menos raio). Sem essa prova
+a busca segue pelo caminho exato, então o resultado é o da busca exata.
+
+Matrizes com várias fotos por aluno usam protótipos (PrototypeIndex): a
+busca começa pelos centróides de cada aluno e só re-ranqueia as fotos dos
+alunos mais próximos. Um limite inferior pela desigualdade triangular
+garante o mesmo resultado da varredura completa.
+
+top_students devolve os k alunos mais próximos (menor distância por aluno)
+com seleção parcial (argpartition), sem ordenar a galeria inteira.
+
+Os vetores float32 exatos ficam em segmentos contíguos: com o snapshot
+em mmap, fatias da matriz mapeada (sem cópia, páginas compartilhadas entre
+os workers) mais um segmento próprio para os cadastros posteriores, de
+modo que patches não copiam a partição inteira para cada processo.
+
+Com storage float16/int8 (quantization) a busca grossa roda nos códigos
+quantizados e só a shortlist lê os vetores float32 exatos. Linhas cujo
+limite inferior (distância aproximada menos o erro máximo de quantização)
+ainda possa vencer também são re-ranqueadas, então o resultado é o exato.
+"""
+from typing import (
+    Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+)
+
+import numpy as np
+
+from app.config import settings
+from app.services.embedding_codec import LEGACY_MODEL, decode_embedding
+from app.services.quantization import QuantizedVectors, STORAGE_MODES
+
+DISTANCE_METRICS = ("cosine", "euclidean", "euclidean_l2")
+
+# Busca em dois estágios por protótipos de aluno (PROTOTYPE_MIN_ROWS e
+# PROTOTYPE_TOP_K ficam em settings)
+PROTOTYPE_OUTLIER_FACTOR = 2.0 # Foto > fator * distância média ao centróide vira exemplar
+
+# Linhas re-ranqueadas em float32 após a busca grossa quantizada
+QUANTIZED_SHORTLIST = 32
+
+# Acima deste número de segmentos (muitas remoções no meio do snapshot),
+# os vetores são copiados para uma única matriz
+MAX_SEGMENTS = 64
+
+
+def _root_array(array: np.ndarray) -> np.ndarray:
+    while isinstance(array.base, np.ndarray):
+        array = array.base
+    return array
+
+
+def _row_position(vector: np.ndarray) -> Optional[Tuple[np.ndarray, int]]:
+    """(matriz, linha) se o vetor for uma linha (view) de uma matriz float32"""
+    root = _root_array(vector)
+    if (root is vector or root.ndim != 2 or root.dtype != np.float32
+            or not root.flags.c_contiguous or vector.dtype != np.float32
+            or vector.shape != (root.shape[1],)):
+        return None
+    offset = (vector.__array_interface__['data'][0]
+              - root.__array_interface__['data'][0])
+    if offset % root.strides[0] != 0:
+        return None
+    return root, offset // root.strides[0]
+
+
+def _row_segments(vectors: List[np.ndarray]) -> List[np.ndarray]:
+    """
+    Agrupa vetores 1-D em segmentos (n, D), preservando a ordem.
+
+    Sequências de linhas consecutivas de uma mesma matriz (ex.: o snapshot
+    aberto com mmap por snapshot_file) viram fatias dessa matriz, sem
+    cópia; os demais vetores (deltas) são empilhados em segmentos próprios.
+    Uma remoção apenas parte uma fatia em duas.
+    """
+    segments: List[np.ndarray] = []
+    root, first, count = None, 0, 0   # fatia em andamento
+    loose: List[np.ndarray] = []      # deltas em andamento
+
+    def flush():
+        nonlocal root, count
+        if count:
+            segments.append(root[first:first + count])
+        if loose:
+            segments.append(np.stack(loose).astype(np.float32, copy=False))
+            loose.clear()
+        root, count = None, 0
+
+    for vector in vectors:
+        position = _row_position(vector)
+        if position is None:
+            if count:
+                flush()
+            loose.append(vector)
+        elif root is position[0] and position[1] == first + count:
+            count += 1
+        else:
+            flush()
+            root, first, count = position[0], position[1], 1
+    flush()
+
+    if len(segments) > MAX_SEGMENTS:
+        return [np.concatenate(segments)]
+    return segments
+
+
+def _turma_of(record: Dict[str, Any]) -> int:
+    turma_id = (record.get('alunos') or {}).get('turma_id')
+    return -1 if turma_id is None else int(turma_id)
+
+
+class EmbeddingMatrix:
+    """
+    Galeria de embeddings como matriz (N, D) float32.
+
+    Attributes:
+        vectors: Matriz float32 com um embedding por linha (cópia se os
+                 vetores estiverem em mais de um segmento)
+        storage: float32, float16 ou int8
+        quantized: Códigos quantizados (None em float32)
+        ids: aluno_id de cada linha
+        keys: id em face_embeddings de cada linha (chave do índice ANN)
+        records: Registro de origem de cada linha (mesma ordem)
+        turma_ids: turma_id do aluno de cada linha (-1 se sem turma)
+        norms: Norma L2 de cada linha
+        sq_norms: Quadrado da norma de cada linha
+        ann: Índice IVF opcional usado por best_match
+        ann_nprobe: Listas do índice visitadas por busca
+    """
+
+    def __init__(
+        self,
+        vectors: np.ndarray,
+        ids: Sequence[int],
+        records: Optional[Sequence[Dict[str, Any]]] = None,
+        keys: Optional[Sequence[int]] = None,
+        storage: str = "float32"
+    ):
+        """
+        Args:
+            vectors: Matriz (N, D) ou lista de vetores 1-D float32. Linhas
+                     consecutivas de uma mesma matriz (snapshot em mmap)
+                     viram uma fatia dela, sem cópia.
+            ids: aluno_id de cada linha
+            records: Registro de origem de cada linha
+            keys: id em face_embeddings de cada linha
+            storage: float32 (padrão), float16 ou int8
+        """
+        if storage not in STORAGE_MODES:
+            raise ValueError(f"Modo de armazenamento desconhecido: {storage}")
+        self.ids = np.asarray(ids)
+        self.records = list(records) if records is not None else []
+        self.storage = storage
+        self.quantized: Optional[QuantizedVectors] = None
+        if isinstance(vectors, list) and vectors:
+            self._segments = _row_segments(vectors)
+        else:
+            vectors = vectors if len(vectors) else np.empty((0, 0))
+            self._segments = [np.ascontiguousarray(vectors, dtype=np.float32)]
+        self._offsets = np.cumsum([0] + [len(segment) for segment in self._segments])
+        self._dimension = self._segments[0].shape[1] if self._segments[0].ndim == 2 else 0
+        self.sq_norms = np.concatenate([
+            np.einsum('ij,ij->i', segment, segment) for segment in self._segments
+        ])
+        if storage != "float32" and self._offsets[-1] > 0:
+            self.quantized = QuantizedVectors(
+                self._segments[0] if len(self._segments) == 1
+                else self._row_views(np.arange(self._offsets[-1])),
+                storage
+            )
+        self.norms = np.sqrt(self.sq_norms)
+        if keys is None:
+            keys = np.arange(len(self.ids))
+        self.keys = np.asarray(keys, dtype=np.int64)
+        self._key_order = np.argsort(self.keys, kind='stable')
+        self._sorted_keys = self.keys[self._key_order]
+        self.turma_ids = np.fromiter(
+            (_turma_of(record) for record in self.records),
+            dtype=np.int64, count=len(self.records)
+        )
+        self.ann = None
+        self.ann_nprobe = 8
+        self._prototypes: Dict[str, "PrototypeIndex"] = {}
+        self._students: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+    @classmethod
+    def from_faces(
+        cls,
+        known_faces_data: Iterable[Dict[str, Any]],
+        storage: str = "float32"
+    ) -> "EmbeddingMatrix":
+        """
+        Monta a matriz a partir de registros no formato de get_all_faces().
+
+        Registros que não puderem ser decodificados, ou cuja dimensão for
+        diferente da do primeiro embedding válido, são ignorados.
+        """
+        vectors, ids, records, keys = [], [], [], []
+        dimension = None
+        for face_record in known_faces_data:
+            try:
+                embedding = np.asarray(
+                    decode_embedding(face_record['embedding']),
+                    dtype=np.float32
+                ).ravel()
+            except Exception as e:
+                print(f"Erro ao processar embedding do aluno ID "
+                      f"{face_record.get('aluno_id')}: {e}")
+                continue
+            if dimension is None:
+                dimension = embedding.shape[0]
+            elif embedding.shape[0] != dimension:
+                print(f"Embedding do aluno ID {face_record.get('aluno_id')} "
+                      f"ignorado: dimensão {embedding.shape[0]} != {dimension}")
+                continue
+            vectors.append(embedding)
+            ids.append(face_record['aluno_id'])
+            records.append(face_record)
+            # Registros sem id (ex.: listas montadas à mão) recebem chaves
+            # negativas, que nunca colidem com ids do banco
+            key = face_record.get('id')
+            keys.append(key if key is not None else -len(keys) - 1)
+
+        if not vectors:
+            return cls(np.empty((0, 0), dtype=np.float32), [], [], [])
+        return cls(vectors, ids, records, keys, storage=storage)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def dimension(self) -> int:
+        return self._dimension
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """Matriz float32 exata (N, D) (cópia se houver mais de um segmento)"""
+        if len(self._segments) == 1:
+            return self._segments[0]
+        return np.concatenate(self._segments)
+
+    def _locate(self, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        rows = np.asarray(rows, dtype=np.int64)
+        segment = np.searchsorted(self._offsets, rows, side='right') - 1
+        return segment, rows - self._offsets[segment]
+
+    def row_vectors(self, rows: np.ndarray) -> np.ndarray:
+        """Vetores float32 exatos das linhas indicadas"""
+        if len(self._segments) == 1:
+            return self._segments[0][rows]
+        segment, local = self._locate(rows)
+        result = np.empty((len(segment), self._dimension), dtype=np.float32)
+        for index in np.unique(segment).tolist():
+            mask = segment == index
+            result[mask] = self._segments[index][local[mask]]
+        return result
+
+    def _row_views(self, rows: np.ndarray) -> List[np.ndarray]:
+        """Linhas como views dos segmentos (sem cópia)"""
+        segment, local = self._locate(rows)
+        return [self._segments[s][r] for s, r in zip(segment.tolist(), local.tolist())]
+
+    def _dots(self, queries: np.ndarray) -> np.ndarray:
+        """Produtos internos de queries (D,) ou (B, D) com todas as linhas"""
+        parts = [queries @ segment.T for segment in self._segments]
+        return parts[0] if len(parts) == 1 else np.concatenate(parts, axis=-1)
+
+    def memory_usage(self) -> Dict[str, Any]:
+        """
+        Bytes da matriz varrida na busca e dos vetores float32 exatos.
+
+        Em float32 as duas são os mesmos arrays. exact_mapped_bytes são os
+        vetores exatos que ficam em páginas do snapshot em mmap
+        (compartilhadas entre os workers, não memória privada do processo).
+        """
+        exact_bytes = sum(segment.nbytes for segment in self._segments)
+        if self.quantized is not None:
+            matrix_bytes = self.quantized.nbytes
+        else:
+            matrix_bytes = exact_bytes
+        rows = max(len(self), 1)
+        return {
+            "storage": self.storage,
+            "rows": len(self),
+            "dimension": self.dimension,
+            "matrix_bytes": int(matrix_bytes),
+            "matrix_bytes_per_embedding": round(matrix_bytes / rows, 1),
+            "exact_bytes": int(exact_bytes),
+            "exact_mapped_bytes": int(sum(
+                segment.nbytes for segment in self._segments
+                if isinstance(_root_array(segment), np.memmap)
+            )),
+            "segments": len(self._segments),
+        }
+
+    def subset(self, rows: np.ndarray) -> "EmbeddingMatrix":
+        """Nova matriz apenas com as linhas indicadas (sem índice ANN)"""
+        records = [self.records[row] for row in rows.tolist()]
+        vectors = self._row_views(rows) if len(rows) else np.empty((0, 0))
+        return EmbeddingMatrix(
+            vectors, self.ids[rows], records, self.keys[rows],
+            storage=self.storage
+        )
+
+    def rows_for_turmas(self, turma_ids: Iterable[int]) -> np.ndarray:
+        """Linhas cujos alunos pertencem a alguma das turmas"""
+        return np.flatnonzero(np.isin(self.turma_ids, list(turma_ids)))
+
+    def rows_for_keys(self, keys: np.ndarray) -> np.ndarray:
+        """Converte chaves (ids de face_embeddings) em índices de linha"""
+        if len(keys) == 0 or len(self) == 0:
+            return np.empty(0, dtype=np.int64)
+        positions = np.searchsorted(self._sorted_keys, keys)
+        positions = np.minimum(positions, len(self._sorted_keys) - 1)
+        found = self._sorted_keys[positions] == keys
+        return self._key_order[positions[found]]
+
+    def distances(
+        self,
+        probe: np.ndarray,
+        metric: str = "euclidean",
+        rows: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """
+        Calcula a distância do probe para todas as linhas da matriz.
+
+        Args:
+            probe: Embedding do rosto desconhecido (D,)
+            metric: cosine, euclidean ou euclidean_l2
+            rows: Se informado, calcula apenas para estas linhas
+
+        Returns:
+            Array (N,) (ou (len(rows),)) com as distâncias
+        """
+        if metric not in DISTANCE_METRICS:
+            raise ValueError(f"Métrica desconhecida: {metric}")
+
+        query = np.asarray(probe, dtype=np.float32).ravel()
+        if query.shape[0] != self.dimension:
+            raise ValueError(
+                f"Dimensão do embedding ({query.shape[0]}) diferente da "
+                f"galeria ({self.dimension})"
+            )
+
+        if rows is None:
+            dots, sq_norms, norms = self._dots(query), self.sq_norms, self.norms
+        else:
+            dots = self.row_vectors(rows) @ query
+            sq_norms, norms = self.sq_norms[rows], self.norms[rows]
+
+        return self._from_dots(
+            dots, metric, float(query @ query), sq_norms, norms
+        )
+
+    @staticmethod
+    def _from_dots(
+        dots: np.ndarray,
+        metric: str,
+        query_sq_norm: Union[float, np.ndarray],
+        sq_norms: np.ndarray,
+        norms: np.ndarray
+    ) -> np.ndarray:
+        """
+        Converte produtos internos em distâncias (decrescente no dot).
+
+        Para um lote, dots é (B, N) e query_sq_norm é (B, 1).
+        """
+        if metric == "euclidean":
+            sq = sq_norms - 2.0 * dots + query_sq_norm
+            return np.sqrt(np.maximum(sq, 0.0))
+
+        denom = norms * np.sqrt(query_sq_norm)
+        cosine_similarity = dots / np.where(denom == 0, 1.0, denom)
+        if metric == "cosine":
+            return 1.0 - cosine_similarity
+        return np.sqrt(np.maximum(2.0 - 2.0 * cosine_similarity, 0.0))
+
+    def exact_distance(
+        self,
+        index: int,
+        probe: np.ndarray,
+        metric: str = "euclidean"
+    ) -> float:
+        """Distância em float64 entre o probe e uma linha específica"""
+        a = np.asarray(probe, dtype=np.float64).ravel()
+        b = self.row_vectors([index])[0].astype(np.float64)
+        if metric == "euclidean":
+            return float(np.linalg.norm(a - b))
+        if metric == "euclidean_l2":
+            return float(np.linalg.norm(
+                a / np.linalg.norm(a) - b / np.linalg.norm(b)
+            ))
+        if metric == "cosine":
+            return float(
+                1.0 - (a @ b) / (np.linalg.norm(a) * np.linalg.norm(b))
+            )
+        raise ValueError(f"Métrica desconhecida: {metric}")
+
+    def best_match(
+        self,
+        probe: np.ndarray,
+        metric: str = "euclidean",
+        threshold: Optional[float] = None
+    ) -> Optional[Tuple[int, float]]:
+        """
+        Encontra a linha mais próxima do probe.
+
+        Args:
+            probe: Embedding do rosto desconhecido
+            metric: cosine, euclidean ou euclidean_l2
+            threshold: Distância máxima aceita pelo chamador (permite
+                       encerrar cedo buscas que terminariam em rejeição)
+
+        Returns:
+            Tupla (índice, distância) ou None se a matriz estiver vazia.
+            A distância do vencedor é recalculada em float64. Se nenhuma
+            linha estiver dentro do threshold, a linha devolvida pode não
+            ser a mais próxima (a decisão continua sendo rejeitar).
+        """
+        if len(self) == 0:
+            return None
+
+        if self.ann is not None:
+            result = self._ann_best_match(probe, metric, threshold)
+            if result is not None:
+                return result
+
+        if self.quantized is not None:
+            return self._quantized_best_match(probe, metric, threshold)
+
+        if len(self) >= settings.PROTOTYPE_MIN_ROWS:
+            return self.prototypes(metric).best_match(probe, metric, threshold)
+
+        distances = self.distances(probe, metric)
+        best_index = int(np.argmin(distances))
+        return best_index, self.exact_distance(best_index, probe, metric)
+
+    def _ann_best_match(
+        self,
+        probe: np.ndarray,
+        metric: str,
+        threshold: Optional[float]
+    ) -> Optional[Tuple[int, float]]:
+        """
+        Candidato do índice IVF, só quando o resultado é garantido.
+
+        O índice mede distância euclidiana nos vetores crus (normalize=False)
+        ou normalizados; cosine e euclidean_l2 são convertidos para esse
+        espaço. Nenhuma linha das listas não visitadas fica mais perto que
+        `bound`, então o candidato é aceito se não passar dele, e a
+        rejeição é certa se o threshold também ficar abaixo dele. Fora
+        disso (ou com métrica de outro espaço) devolve None e best_match
+        segue pela busca exata.
+        """
+        if (metric == "euclidean") == self.ann.normalize:
+            return None
+        keys, bound = self.ann.search_bounded(probe, self.ann_nprobe)
+        rows = self.rows_for_keys(keys)
+        if len(rows) == 0:
+            return None
+
+        candidate = int(rows[np.argmin(self.distances(probe, metric, rows))])
+        distance = self.exact_distance(candidate, probe, metric)
+        if PrototypeIndex._to_space(metric, distance) <= bound:
+            return candidate, distance
+        if (threshold is not None and distance > threshold
+                and PrototypeIndex._to_space(metric, threshold) < bound):
+            return candidate, distance
+        return None
+
+    @property
+    def can_batch(self) -> bool:
+        """
+        best_matches junta os probes em um único produto matriz-matriz?
+
+        Só na busca exaustiva: com índice ANN, matriz quantizada ou
+        protótipos cada probe segue sozinho, e esperar a janela do
+        match_batcher seria apenas latência.
+        """
+        return (len(self) > 0 and self.ann is None and self.quantized is None
+                and len(self) < settings.PROTOTYPE_MIN_ROWS)
+
+    def best_matches(
+        self,
+        probes: Sequence[np.ndarray],
+        metric: str = "euclidean",
+        threshold: Optional[float] = None
+    ) -> List[Optional[Tuple[int, float]]]:
+        """
+        best_match para vários probes (lote do batching.match_batcher).
+
+        Na busca exaustiva, as distâncias de todos os probes saem de um
+        único produto matriz-matriz (B, D) x (D, N); com índice ANN, matriz
+        quantizada ou protótipos, cada probe usa o caminho de best_match.
+
+        Returns:
+            Um resultado de best_match por probe, na mesma ordem
+        """
+        if len(probes) < 2 or not self.can_batch:
+            return [self.best_match(probe, metric, threshold) for probe in probes]
+        if metric not in DISTANCE_METRICS:
+            raise ValueError(f"Métrica desconhecida: {metric}")
+
+        queries = np.stack([np.asarray(probe, dtype=np.float32).ravel() for probe in probes])
+        if queries.shape[1] != self.dimension:
+            raise ValueError(
+                f"Dimensão do embedding ({queries.shape[1]}) diferente da "
+                f"galeria ({self.dimension})"
+            )
+        query_sq_norms = np.einsum('ij,ij->i', queries, queries)[:, None]
+        distances = self._from_dots(
+            self._dots(queries), metric, query_sq_norms, self.sq_norms, self.norms
+        )
+        best = np.argmin(distances, axis=1)
+        return [
+            (int(index), self.exact_distance(int(index), probe, metric))
+            for index, probe in zip(best, probes)
+        ]
+
+    def student_index(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(aluno_ids distintos, índice do aluno de cada linha)"""
+        if self._students is None:
+            self._students = np.unique(self.ids, return_inverse=True)
+        return self._students
+
+    def top_students(
+        self,
+        probe: np.ndarray,
+        metric: str = "euclidean",
+        k: int = 5
+    ) -> List[Tuple[int, float]]:
+        """
+        Os k alunos distintos mais próximos do probe.
+
+        A distância de cada aluno é a da sua foto mais próxima; a seleção
+        usa argpartition (O(N)) e só os k escolhidos são ordenados.
+
+        Returns:
+            Lista de (linha da foto mais próxima, distância exata), da
+            menor para a maior distância
+        """
+        if len(self) == 0 or k <= 0:
+            return []
+
+        students, inverse = self.student_index()
+        k = min(k, len(students))
+        if self.quantized is None:
+            rows = np.arange(len(self))
+            distances = self.distances(probe, metric)
+        else:
+            rows, distances = self._quantized_student_rows(probe, metric, k)
+
+        per_student = np.full(len(students), np.inf, dtype=np.float64)
+        np.minimum.at(per_student, inverse[rows], distances)
+
+        top = np.argpartition(per_student, k - 1)[:k]
+        top = top[np.argsort(per_student[top], kind='stable')]
+
+        # Foto mais próxima de cada aluno escolhido
+        chosen = np.isin(inverse[rows], top)
+        rows, distances = rows[chosen], distances[chosen]
+        order = np.lexsort((distances, inverse[rows]))
+        rows = rows[order]
+        first = np.concatenate(([True], inverse[rows][1:] != inverse[rows][:-1]))
+        best_row = dict(zip(inverse[rows][first].tolist(), rows[first].tolist()))
+
+        return [
+            (best_row[student], self.exact_distance(best_row[student], probe, metric))
+            for student in top.tolist()
+        ]
+
+    # ========================================
+    # BUSCA QUANTIZADA
+    # ========================================
+
+    def _coarse_distances(
+        self,
+        probe: np.ndarray,
+        metric: str
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """(distâncias aproximadas, limite inferior da distância exata)"""
+        query = np.asarray(probe, dtype=np.float32).ravel()
+        query_sq_norm = float(query @ query)
+        dots, errors = self.quantized.dots(query, self.norms)
+        approx = self._from_dots(dots, metric, query_sq_norm, self.sq_norms, self.norms)
+        lower = self._from_dots(dots + errors, metric, query_sq_norm, self.sq_norms, self.norms)
+        return approx, lower
+
+    def _quantized_best_match(
+        self,
+        probe: np.ndarray,
+        metric: str,
+        threshold: Optional[float]
+    ) -> Tuple[int, float]:
+        """
+        Busca grossa nos códigos e re-ranqueamento float32 da shortlist.
+
+        Se nenhuma linha ficar dentro do threshold, a linha devolvida pode
+        não ser a mais próxima (a decisão continua sendo rejeitar).
+        """
+        approx, lower = self._coarse_distances(probe, metric)
+        size = min(QUANTIZED_SHORTLIST, len(self))
+        shortlist = np.argpartition(approx, size - 1)[:size]
+        distances = self.distances(probe, metric, shortlist)
+        position = int(np.argmin(distances))
+        best_row, best_distance = int(shortlist[position]), float(distances[position])
+
+        # Linhas fora da shortlist que ainda podem vencer
+        bound = best_distance if threshold is None else min(best_distance, threshold)
+        pending = np.flatnonzero(lower <= bound * (1 + 1e-5) + 1e-6)
+        pending = pending[~np.isin(pending, shortlist)]
+        if len(pending) > 0:
+            distances = self.distances(probe, metric, pending)
+            position = int(np.argmin(distances))
+            if distances[position] < best_distance:
+                best_row = int(pending[position])
+
+        return best_row, self.exact_distance(best_row, probe, metric)
+
+    def _quantized_student_rows(
+        self,
+        probe: np.ndarray,
+        metric: str,
+        k: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Linhas (e distâncias exatas) suficientes para achar os k alunos
+        mais próximos: as dos k melhores alunos pela busca grossa e as de
+        qualquer aluno cujo limite inferior fique abaixo do k-ésimo.
+        """
+        students, inverse = self.student_index()
+        approx, lower = self._coarse_distances(probe, metric)
+        approx_per_student = np.full(len(students), np.inf, dtype=np.float64)
+        lower_per_student = np.full(len(students), np.inf, dtype=np.float64)
+        np.minimum.at(approx_per_student, inverse, approx)
+        np.minimum.at(lower_per_student, inverse, lower)
+
+        top = np.argpartition(approx_per_student, k - 1)[:k]
+        rows = np.flatnonzero(np.isin(inverse, top))
+        exact_per_student = np.full(len(students), np.inf, dtype=np.float64)
+        np.minimum.at(exact_per_student, inverse[rows], self.distances(probe, metric, rows))
+        kth = exact_per_student[top].max()
+
+        needed = np.flatnonzero(lower_per_student <= kth * (1 + 1e-5) + 1e-6)
+        rows = np.flatnonzero(np.isin(inverse, needed))
+        return rows, self.distances(probe, metric, rows)
+
+    def prototypes(self, metric: str) -> "PrototypeIndex":
+        """Índice de protótipos por aluno (montado uma vez por métrica)"""
+        normalized = metric != "euclidean"
+        key = "normalized" if normalized else "raw"
+        index = self._prototypes.get(key)
+        if index is None:
+            index = PrototypeIndex(self, normalized)
+            self._prototypes[key] = index
+        return index
+
+
+class PrototypeIndex:
+    """
+    Protótipo (centróide) por aluno mais exemplares atípicos.
+
+    A busca trabalha em um espaço euclidiano (vetores crus para a métrica
+    euclidean, normalizados para cosine/euclidean_l2, em que
+    cosine = l2² / 2). Para cada aluno guarda-se o centróide c e o raio r
+    das suas fotos típicas; pela desigualdade triangular, nenhuma dessas
+    fotos fica a menos de d(q, c) - r do probe. Fotos muito distantes do
+    centróide (exemplares) são comparadas diretamente, para não inflar r.
+
+    A busca compara o probe com os centróides e exemplares, re-ranqueia as
+    fotos dos PROTOTYPE_TOP_K alunos (settings) de menor limite inferior e,
+    por fim, qualquer aluno cujo limite ainda seja menor que a melhor distância
+    encontrada (ou que o threshold). O vencedor é o mesmo da varredura
+    completa sempre que estiver dentro do threshold.
+    """
+
+    def __init__(self, matrix: EmbeddingMatrix, normalized: bool):
+        self.matrix = matrix
+        self.normalized = normalized
+        self.metric = "euclidean_l2" if normalized else "euclidean"
+
+        vectors = matrix.vectors
+        if normalized:
+            vectors = vectors / np.where(matrix.norms == 0, 1.0, matrix.norms)[:, None]
+
+        self.students, inverse = np.unique(matrix.ids, return_inverse=True)
+        n_students = len(self.students)
+        counts = np.bincount(inverse, minlength=n_students)
+
+        # Exemplares: fotos muito distantes do centróide de todas as fotos
+        centroids = self._centroids(vectors, inverse, n_students)
+        spread = np.linalg.norm(vectors - centroids[inverse], axis=1)
+        mean_spread = np.bincount(inverse, weights=spread, minlength=n_students) / counts
+        outlier = (
+            (counts[inverse] >= 3)
+            & (spread > PROTOTYPE_OUTLIER_FACTOR * mean_spread[inverse])
+        )
+        inlier = ~outlier
+        self.exemplar_rows = np.flatnonzero(outlier)
+
+        # Protótipos e raios apenas com as fotos típicas
+        inlier_rows = np.flatnonzero(inlier)
+        self.centroids = self._centroids(
+            vectors[inlier_rows], inverse[inlier_rows], n_students
+        ).astype(np.float32)
+        self.centroid_sq_norms = np.einsum(
+            'ij,ij->i', self.centroids, self.centroids
+        )
+        inlier_spread = np.linalg.norm(
+            vectors[inlier_rows] - self.centroids[inverse[inlier_rows]], axis=1
+        )
+        self.radius = np.zeros(n_students, dtype=np.float32)
+        np.maximum.at(self.radius, inverse[inlier_rows], inlier_spread)
+
+        # Linhas típicas agrupadas por aluno (formato CSR)
+        order = np.argsort(inverse[inlier_rows], kind='stable')
+        self.student_rows = inlier_rows[order]
+        self.offsets = np.concatenate(([0], np.cumsum(
+            np.bincount(inverse[inlier_rows], minlength=n_students)
+        )))
+
+    @staticmethod
+    def _centroids(vectors, inverse, n_students) -> np.ndarray:
+        sums = np.zeros((n_students, vectors.shape[1]), dtype=np.float64)
+        np.add.at(sums, inverse, vectors)
+        counts = np.bincount(inverse, minlength=n_students)
+        return sums / np.maximum(counts, 1)[:, None]
+
+    @staticmethod
+    def _to_space(metric: str, threshold: Optional[float]) -> float:
+        if threshold is None:
+            return np.inf
+        if metric == "cosine":
+            return float(np.sqrt(max(2.0 * threshold, 0.0)))
+        return float(threshold)
+
+    def _rows_of(self, students: np.ndarray) -> np.ndarray:
+        starts = self.offsets[students]
+        lengths = self.offsets[students + 1] - starts
+        total = int(lengths.sum())
+        if total == 0:
+            return np.empty(0, dtype=np.int64)
+        # Índices CSR concatenados sem laço em Python
+        shifts = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        return self.student_rows[shifts + np.arange(total)]
+
+    @property
+    def vectors_per_query(self) -> int:
+        """Vetores tocados no primeiro passo (protótipos + exemplares)"""
+        return len(self.students) + len(self.exemplar_rows)
+
+    def best_match(
+        self,
+        probe: np.ndarray,
+        metric: str = "euclidean",
+        threshold: Optional[float] = None
+    ) -> Optional[Tuple[int, float]]:
+        """
+        Busca em dois estágios com o mesmo resultado da varredura completa.
+
+        Returns:
+            Tupla (linha, distância na métrica pedida) ou None. Se nenhuma
+            foto estiver dentro do threshold, a linha devolvida pode não ser
+            a mais próxima (a decisão continua sendo rejeitar).
+        """
+        if len(self.students) == 0:
+            return None
+
+        query = np.asarray(probe, dtype=np.float32).ravel()
+        if self.normalized:
+            norm = np.linalg.norm(query)
+            query = query / (norm if norm > 0 else 1.0)
+
+        # 1º passo: protótipos (limite inferior) e exemplares (exatos)
+        centroid_sq = self.centroid_sq_norms - 2.0 * (self.centroids @ query) + query @ query
+        lower_bounds = np.maximum(np.sqrt(np.maximum(centroid_sq, 0.0)) - self.radius, 0.0)
+
+        best_row, best_distance = -1, np.inf
+        if len(self.exemplar_rows) > 0:
+            distances = self.matrix.distances(probe, self.metric, self.exemplar_rows)
+            position = int(np.argmin(distances))
+            best_row, best_distance = int(self.exemplar_rows[position]), float(distances[position])
+
+        limit = self._to_space(metric, threshold)
+        top_k = min(settings.PROTOTYPE_TOP_K, len(self.students))
+        candidates = np.argpartition(lower_bounds, top_k - 1)[:top_k]
+        checked = np.zeros(len(self.students), dtype=bool)
+
+        # 2º passo: fotos dos candidatos, até nenhum limite inferior
+        # poder superar a melhor distância (margem para erro de float32)
+        while len(candidates) > 0:
+            if len(candidates) > len(self.students) // 2:
+                # Limites fracos (ex.: fotos muito dispersas): a varredura
+                # completa sai mais barata que coletar as linhas
+                distances = self.matrix.distances(probe, self.metric)
+                best_row = int(np.argmin(distances))
+                break
+            rows = self._rows_of(candidates)
+            checked[candidates] = True
+            if len(rows) > 0:
+                distances = self.matrix.distances(probe, self.metric, rows)
+                position = int(np.argmin(distances))
+                if distances[position] < best_distance:
+                    best_row, best_distance = int(rows[position]), float(distances[position])
+            bound = min(best_distance, limit) * (1 + 1e-5) + 1e-6
+            candidates = np.flatnonzero(~checked & (lower_bounds <= bound))
+
+        if best_row < 0:
+            return None
+        return best_row, self.matrix.exact_distance(best_row, probe, metric)
+
+
+class GallerySnapshot:
+    """
+    Snapshot da galeria particionado por modelo de embedding.
+
+    Cada modelo (face_recognition, Facenet512, ...) gera vetores em um
+    espaço próprio; cada estágio do reconhecimento híbrido busca apenas na
+    partição do seu modelo. As matrizes são montadas sob demanda e
+    reaproveitadas enquanto o snapshot existir.
+
+    Um snapshot também pode ser restrito a turmas (scoped): cada partição
+    passa a conter apenas os alunos dessas turmas (alunos.turma_id).
+    """
+
+    def __init__(
+        self,
+        faces: Sequence[Dict[str, Any]],
+        prepare_matrix: Optional[Callable[[str, EmbeddingMatrix], None]] = None,
+        storage: str = "float32"
+    ):
+        """
+        Args:
+            faces: Registros no formato de get_all_faces(), com a chave
+                   'modelo' indicando o modelo de cada embedding
+            prepare_matrix: Chamado com (modelo, matriz) quando uma partição
+                            global é montada (ex.: para anexar o índice ANN)
+            storage: Armazenamento das matrizes (float32, float16 ou int8)
+        """
+        self.faces = faces
+        self._prepare_matrix = prepare_matrix
+        self.storage = storage
+        self._matrices: Dict[Any, EmbeddingMatrix] = {}
+        self.parent: Optional["GallerySnapshot"] = None
+        self.turma_ids: Optional[frozenset] = None
+        self.global_fallback = False
+
+    def scoped(
+        self,
+        turma_ids: Iterable[int],
+        global_fallback: bool = False
+    ) -> "GallerySnapshot":
+        """
+        Visão do snapshot restrita aos alunos das turmas informadas.
+
+        Args:
+            turma_ids: Turmas cujos alunos podem ser reconhecidos
+            global_fallback: Se True, os reconhecedores buscam na galeria
+                             inteira quando não há match nas turmas
+        """
+        root = self.parent or self
+        view = GallerySnapshot(root.faces)
+        view.parent = root
+        view.turma_ids = frozenset(turma_ids)
+        view.global_fallback = global_fallback
+        return view
+
+    def __len__(self) -> int:
+        return len(self.faces)
+
+    @property
+    def models(self) -> List[str]:
+        """Modelos presentes no snapshot"""
+        return sorted({face.get('modelo') or LEGACY_MODEL
+                       for face in self.faces})
+
+    def matrix(self, model_name: str) -> EmbeddingMatrix:
+        """Retorna a partição da galeria com os embeddings de um modelo"""
+        if self.parent is not None:
+            return self.parent.turma_matrix(model_name, self.turma_ids)
+
+        matrix = self._matrices.get(model_name)
+        if matrix is None:
+            matrix = EmbeddingMatrix.from_faces(
+                (face for face in self.faces
+                 if (face.get('modelo') or LEGACY_MODEL) == model_name),
+                storage=self.storage
+            )
+            if self._prepare_matrix is not None:
+                self._prepare_matrix(model_name, matrix)
+            self._matrices[model_name] = matrix
+        return matrix
+
+    def turma_matrix(
+        self,
+        model_name: str,
+        turma_ids: frozenset
+    ) -> EmbeddingMatrix:
+        """Partição de um modelo restrita aos alunos das turmas"""
+        key = (model_name, turma_ids)
+        matrix = self._matrices.get(key)
+        if matrix is None:
+            full = self.matrix(model_name)
+            matrix = full.subset(full.rows_for_turmas(turma_ids))
+            self._matrices[key] = matrix
+        return matrix
+
+    def memory_usage(self) -> Dict[str, Dict[str, Any]]:
+        """memory_usage() de cada partição global (monta as que faltarem)"""
+        root = self.parent or self
+        return {model: root.matrix(model).memory_usage() for model in root.models}
+
+
+def as_embedding_matrix(
+    known_faces_data: Union[GallerySnapshot, EmbeddingMatrix, List[Dict[str, Any]]],
+    model_name: str = LEGACY_MODEL
+) -> EmbeddingMatrix:
+    """
+    Aceita um GallerySnapshot (usa a partição de model_name), uma
+    EmbeddingMatrix pronta ou registros de get_all_faces().
+    """
+    if isinstance(known_faces_data, GallerySnapshot):
+        return known_faces_data.matrix(model_name)
+    if isinstance(known_faces_data, EmbeddingMatrix):
+        return known_faces_data
+    # Registros sem a chave 'modelo' (chamadores antigos) não são filtrados
+    return EmbeddingMatrix.from_faces(
+        face for face in known_faces_data
+        if (face.get('modelo', model_name) or LEGACY_MODEL) == model_name
+    )
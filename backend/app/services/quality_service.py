@@ -0,0 +1,110 @@
+"""
+app/services/quality_service.py
+-------------------------------
+Filtro barato de qualidade aplicado antes da extração de embeddings.
+
+Boa parte dos quadros do quiosque está tremida, escura ou com o rosto
+pequeno demais; eles passariam pelo face_recognition e muitas vezes pelo
+DeepFace só para falhar. O filtro usa a detecção já feita pelo
+RecognitionContext e métricas simples de pixels da região do rosto:
+
+1. Rosto com lado mínimo de QUALITY_MIN_FACE_SIZE pixels
+2. Exposição: brilho médio e fração de pixels saturados (histograma)
+3. Nitidez: variância do Laplaciano
+
+Quadros em que o HOG não achou rosto passam sem verificação: o
+reconhecimento híbrido ainda tenta o detector do DeepFace neles
+("deepface_only").
+
+O motivo da rejeição é devolvido em formato legível por máquina
+({'motivo': ..., 'valor': ..., 'limite': ...}).
+"""
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from app.config import settings
+from app.services.face_service import RecognitionContext
+
+# Motivos de rejeição
+FACE_TOO_SMALL = "face_too_small"
+TOO_DARK = "too_dark"
+TOO_BRIGHT = "too_bright"
+BLURRY = "blurry"
+
+# Níveis de cinza considerados saturados no histograma
+DARK_LEVEL = 16
+BRIGHT_LEVEL = 240
+
+
+def to_gray(image: np.ndarray) -> np.ndarray:
+    """Luminância (ITU-R 601) de uma imagem RGB, em float32"""
+    return image[..., :3].astype(np.float32) @ np.array(
+        [0.299, 0.587, 0.114], dtype=np.float32
+    )
+
+
+def sharpness(gray: np.ndarray) -> float:
+    """Variância do Laplaciano (4-vizinhos); baixa em imagens tremidas"""
+    if gray.shape[0] < 3 or gray.shape[1] < 3:
+        return 0.0
+    laplacian = (
+        gray[1:-1, :-2] + gray[1:-1, 2:] + gray[:-2, 1:-1] + gray[2:, 1:-1]
+        - 4.0 * gray[1:-1, 1:-1]
+    )
+    return float(laplacian.var())
+
+
+def exposure(gray: np.ndarray) -> Dict[str, float]:
+    """Brilho médio e frações de pixels escuros/claros saturados"""
+    histogram = np.bincount(
+        np.clip(gray, 0, 255).astype(np.uint8).ravel(), minlength=256
+    )
+    total = max(int(histogram.sum()), 1)
+    return {
+        "brilho": float(gray.mean()) if gray.size else 0.0,
+        "escuros": float(histogram[:DARK_LEVEL].sum() / total),
+        "claros": float(histogram[BRIGHT_LEVEL + 1:].sum() / total),
+    }
+
+
+def _rejection(reason: str, value: Optional[float] = None, limit: Optional[float] = None) -> Dict[str, Any]:
+    return {
+        "motivo": reason,
+        "valor": round(value, 3) if value is not None else None,
+        "limite": limit,
+    }
+
+
+def check_quality(context: RecognitionContext) -> Optional[Dict[str, Any]]:
+    """
+    Verifica se o quadro vale a extração de embeddings.
+
+    Returns:
+        None se o quadro for utilizável (ou não tiver rosto para o HOG,
+        ver docstring do módulo), ou o motivo da rejeição
+    """
+    location = context.face_location
+    if location is None:
+        return None
+
+    top, right, bottom, left = location
+    face_size = min(bottom - top, right - left)
+    if face_size < settings.QUALITY_MIN_FACE_SIZE:
+        return _rejection(FACE_TOO_SMALL, face_size, settings.QUALITY_MIN_FACE_SIZE)
+
+    gray = to_gray(context.image[max(top, 0):bottom, max(left, 0):right])
+    levels = exposure(gray)
+    if levels["brilho"] < settings.QUALITY_MIN_BRIGHTNESS:
+        return _rejection(TOO_DARK, levels["brilho"], settings.QUALITY_MIN_BRIGHTNESS)
+    if levels["escuros"] > settings.QUALITY_MAX_CLIPPED:
+        return _rejection(TOO_DARK, levels["escuros"], settings.QUALITY_MAX_CLIPPED)
+    if levels["brilho"] > settings.QUALITY_MAX_BRIGHTNESS:
+        return _rejection(TOO_BRIGHT, levels["brilho"], settings.QUALITY_MAX_BRIGHTNESS)
+    if levels["claros"] > settings.QUALITY_MAX_CLIPPED:
+        return _rejection(TOO_BRIGHT, levels["claros"], settings.QUALITY_MAX_CLIPPED)
+
+    score = sharpness(gray)
+    if score < settings.QUALITY_MIN_SHARPNESS:
+        return _rejection(BLURRY, score, settings.QUALITY_MIN_SHARPNESS)
+    return None
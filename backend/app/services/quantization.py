@@ -0,0 +1,196 @@
+"""
+app/services/quantization.py
+----------------------------
+Armazenamento quantizado (float16 / int8) da matriz de embeddings.
+
+A busca grossa roda sobre os vetores quantizados; a EmbeddingMatrix
+re-ranqueia a shortlist com os vetores float32 exatos. Para que o
+re-ranqueamento preserve o resultado da busca exata, dots() devolve também
+um limite para o erro de quantização de cada produto interno.
+
+Modos:
+    float32  sem quantização (4 bytes por dimensão)
+    float16  meia precisão (2 bytes por dimensão)
+    int8     escalar simétrico com um fator de escala por dimensão
+             (1 byte por dimensão + D floats de escala por matriz)
+"""
+from typing import Dict, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+STORAGE_MODES = ("float32", "float16", "int8")
+
+# Linhas convertidas para float32 por vez (limita a memória temporária)
+CHUNK_ROWS = 4096
+
+# Erro relativo máximo do arredondamento para float16 (2^-11)
+FLOAT16_RELATIVE_ERROR = 2.0 ** -11
+# Erro absoluto dos subnormais de float16 (|x| < 2^-14)
+FLOAT16_ABSOLUTE_ERROR = 2.0 ** -25
+
+# Tamanho aproximado de um ndarray 1-D vazio (cabeçalho do objeto)
+NDARRAY_OVERHEAD = 112
+
+
+def _chunks(n: int):
+    for start in range(0, n, CHUNK_ROWS):
+        yield start, min(start + CHUNK_ROWS, n)
+
+
+def _stack(vectors: Union[np.ndarray, Sequence[np.ndarray]], start: int, stop: int) -> np.ndarray:
+    if isinstance(vectors, np.ndarray):
+        return np.asarray(vectors[start:stop], dtype=np.float32)
+    return np.stack(vectors[start:stop]).astype(np.float32, copy=False)
+
+
+class QuantizedVectors:
+    """
+    Matriz (N, D) quantizada.
+
+    Attributes:
+        mode: float16 ou int8
+        codes: Matriz quantizada (float16 ou int8)
+        scales: Fator de escala por dimensão (apenas int8)
+    """
+
+    def __init__(
+        self,
+        vectors: Union[np.ndarray, Sequence[np.ndarray]],
+        mode: str,
+        scales: Optional[np.ndarray] = None
+    ):
+        """
+        Args:
+            vectors: Matriz (N, D) ou sequência de vetores 1-D (quantizados em
+                     blocos, sem montar a matriz float32 inteira)
+            mode: float16 ou int8
+            scales: Escalas int8 já calculadas (ex.: subconjunto de outra
+                    matriz); por padrão max(|x|) / 127 de cada dimensão
+        """
+        if mode not in ("float16", "int8"):
+            raise ValueError(f"Modo de quantização desconhecido: {mode}")
+        self.mode = mode
+        n = len(vectors)
+        dimension = len(vectors[0]) if n else 0
+        dtype = np.float16 if mode == "float16" else np.int8
+        self.codes = np.empty((n, dimension), dtype=dtype)
+
+        if mode == "int8" and scales is None:
+            max_abs = np.zeros(dimension, dtype=np.float32)
+            for start, stop in _chunks(n):
+                np.maximum(max_abs, np.abs(_stack(vectors, start, stop)).max(axis=0), out=max_abs)
+            scales = np.where(max_abs > 0, max_abs / 127.0, 1.0).astype(np.float32)
+        self.scales = scales
+
+        for start, stop in _chunks(n):
+            block = _stack(vectors, start, stop)
+            if mode == "float16":
+                self.codes[start:stop] = block
+            else:
+                self.codes[start:stop] = np.clip(
+                    np.rint(block / self.scales), -127, 127
+                )
+
+    def __len__(self) -> int:
+        return self.codes.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def dequantize(self, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Vetores float32 aproximados (todas as linhas ou as indicadas)"""
+        codes = self.codes if rows is None else self.codes[rows]
+        block = codes.astype(np.float32)
+        if self.mode == "int8":
+            block *= self.scales
+        return block
+
+    def dots(
+        self,
+        query: np.ndarray,
+        norms: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Produtos internos aproximados do probe com todas as linhas.
+
+        Args:
+            query: Probe float32 (D,)
+            norms: Norma exata de cada linha (para o limite do float16)
+
+        Returns:
+            (dots, erro máximo de cada dot em relação ao vetor exato)
+        """
+        query = np.asarray(query, dtype=np.float32)
+        n = len(self)
+        dots = np.empty(n, dtype=np.float32)
+        if self.mode == "int8":
+            scaled = query * self.scales
+            for start, stop in _chunks(n):
+                dots[start:stop] = self.codes[start:stop].astype(np.float32) @ scaled
+            # Arredondamento: |x - código * escala| <= escala / 2 por dimensão
+            bound = 0.5 * float(np.abs(query) @ self.scales)
+            errors = np.full(n, bound, dtype=np.float32)
+        else:
+            for start, stop in _chunks(n):
+                dots[start:stop] = self.codes[start:stop].astype(np.float32) @ query
+            query_norm = float(np.linalg.norm(query))
+            errors = (
+                FLOAT16_RELATIVE_ERROR * query_norm * norms
+                + FLOAT16_ABSOLUTE_ERROR * float(np.abs(query).sum())
+            ).astype(np.float32)
+        # Folga para o erro de acumulação em float32
+        errors += 1e-5 * np.abs(dots) + 1e-6
+        return dots, errors
+
+    def subset(self, rows: np.ndarray) -> "QuantizedVectors":
+        """Linhas indicadas, com as mesmas escalas"""
+        view = object.__new__(QuantizedVectors)
+        view.mode = self.mode
+        view.codes = self.codes[rows]
+        view.scales = self.scales
+        return view
+
+
+def matrix_bytes_per_embedding(dimension: int, mode: str, rows: int = 1) -> float:
+    """Bytes por embedding da matriz de busca (escalas int8 rateadas)"""
+    if mode == "float32":
+        return 4.0 * dimension
+    if mode == "float16":
+        return 2.0 * dimension
+    if mode == "int8":
+        return dimension + 4.0 * dimension / max(rows, 1)
+    raise ValueError(f"Modo de quantização desconhecido: {mode}")
+
+
+def memory_report(dimension: int, rows: int) -> Dict[str, Dict[str, float]]:
+    """
+    Estimativa de memória residente da galeria para cada modo.
+
+    Os registros da galeria guardam o vetor float32 de cada embedding (um
+    ndarray por linha) e a EmbeddingMatrix guarda os vetores float32 exatos
+    em um único array contíguo. Em float32 esse array é a própria matriz de
+    busca; nos modos quantizados a busca varre só os códigos e o array
+    exato é lido apenas no re-ranqueamento. Com o snapshot em mmap
+    (GALLERY_SNAPSHOT_DIR), vetores dos registros e array exato são páginas
+    do arquivo compartilhadas entre os workers.
+
+    Returns:
+        {modo: {'matrix_bytes': ..., 'exact_bytes': ...,
+                'bytes_per_embedding': ..., 'total_mb': ...}}
+    """
+    record_bytes = 4.0 * dimension + NDARRAY_OVERHEAD
+    exact_bytes = 4.0 * dimension
+    report = {}
+    for mode in STORAGE_MODES:
+        matrix_bytes = matrix_bytes_per_embedding(dimension, mode, rows)
+        per_embedding = record_bytes + (
+            exact_bytes if mode == "float32" else matrix_bytes + exact_bytes
+        )
+        report[mode] = {
+            "matrix_bytes": round(matrix_bytes, 1),
+            "exact_bytes": round(0.0 if mode == "float32" else exact_bytes, 1),
+            "bytes_per_embedding": round(per_embedding, 1),
+            "total_mb": round(per_embedding * rows / 2 ** 20, 2),
+        }
+    return report
@@ -0,0 +1,229 @@
+"""
+app/services/snapshot_file.py
+-----------------------------
+Snapshot da galeria em disco, aberto com mmap pelos workers.
+
+Cada exportação é um diretório com, por modelo:
+
+    vectors_<modelo>.npy    matriz (N, D) float32
+    keys_<modelo>.npy       id em face_embeddings de cada linha (int64)
+    aluno_ids_<modelo>.npy  aluno_id de cada linha (int64)
+
+e um meta.json com a versão do formato, a geração, a marca de lápides, a
+janela de re-consulta e os metadados textuais de cada linha (foto_nome,
+created_at e os dados do aluno). A geração é o maior id de face_embeddings
+incluído e a marca é o maior id de gallery_tombstones já refletido: quem
+abre o snapshot só precisa buscar no banco as linhas e lápides com id
+maior, mais as criadas depois do início da janela (sync_window).
+
+Só um processo exporta por vez (trava .export.lock, criada com O_EXCL), e
+a exportação é descartada se o snapshot vigente já cobre a mesma geração
+e marca, então os workers que sobem juntos não regravam o mesmo snapshot.
+
+O arquivo CURRENT aponta para a exportação vigente e é trocado com
+os.replace, então leitores nunca veem uma exportação pela metade. As
+matrizes são abertas com np.load(mmap_mode='r'): todos os workers
+compartilham as mesmas páginas pelo page cache do sistema operacional.
+"""
+import json
+import os
+import shutil
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.services.embedding_codec import LEGACY_MODEL
+
+FORMAT_VERSION = 2
+CURRENT_FILE = "CURRENT"
+META_FILE = "meta.json"
+EXPORT_LOCK = ".export.lock"
+# Trava de exportação mais antiga que isto é de um processo que morreu
+EXPORT_LOCK_STALE_SECONDS = 600
+# Exportações antigas mantidas (workers podem ainda estar com elas abertas;
+# no Linux o mmap continua válido mesmo após a remoção)
+KEEP_EXPORTS = 2
+
+
+def snapshot_generation(faces: Sequence[Dict[str, Any]]) -> int:
+    """Maior id de face_embeddings presente nos registros (0 se nenhum)"""
+    return max((face['id'] for face in faces if face.get('id') is not None),
+               default=0)
+
+
+def _acquire_export_lock(directory: str) -> Optional[str]:
+    path = os.path.join(directory, EXPORT_LOCK)
+    try:
+        if time.time() - os.path.getmtime(path) > EXPORT_LOCK_STALE_SECONDS:
+            os.remove(path)
+    except FileNotFoundError:
+        pass
+    try:
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return None
+    with os.fdopen(fd, "w") as f:
+        f.write(str(os.getpid()))
+    return path
+
+
+def _current_meta(directory: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """(caminho, meta) da exportação vigente, ou None"""
+    try:
+        with open(os.path.join(directory, CURRENT_FILE), encoding="utf-8") as f:
+            path = os.path.join(directory, f.read().strip())
+        with open(os.path.join(path, META_FILE), encoding="utf-8") as f:
+            meta = json.load(f)
+    except FileNotFoundError:
+        return None
+    if meta.get("format") != FORMAT_VERSION:
+        return None
+    return path, meta
+
+
+def export_snapshot(
+    faces: Sequence[Dict[str, Any]],
+    directory: str,
+    tombstone_mark: int = 0,
+    sync_window: Optional[str] = None
+) -> Optional[str]:
+    """
+    Grava os registros decodificados da galeria como um novo snapshot.
+
+    Registros sem id (ainda não confirmados pelo banco) ficam de fora; eles
+    voltam pela busca incremental, pois terão id maior que a geração.
+
+    Args:
+        faces: Registros da galeria
+        directory: Diretório dos snapshots
+        tombstone_mark: Maior id de gallery_tombstones refletido nos registros
+        sync_window: Início (ISO) da janela de re-consulta de linhas e
+                     lápides confirmadas fora de ordem
+
+    Returns:
+        Caminho da exportação criada, ou None se outro processo estiver
+        exportando ou o snapshot vigente já cobrir esta geração e marca
+    """
+    os.makedirs(directory, exist_ok=True)
+    lock = _acquire_export_lock(directory)
+    if lock is None:
+        return None
+    try:
+        generation = snapshot_generation(faces)
+        current = _current_meta(directory)
+        if current is not None and (
+            current[1]["generation"] >= generation
+            and current[1]["tombstone_mark"] >= tombstone_mark
+        ):
+            return None
+        return _write_export(
+            faces, directory, generation, tombstone_mark, sync_window
+        )
+    finally:
+        os.remove(lock)
+
+
+def _write_export(
+    faces: Sequence[Dict[str, Any]],
+    directory: str,
+    generation: int,
+    tombstone_mark: int,
+    sync_window: Optional[str]
+) -> str:
+    partitions: Dict[str, List[Dict[str, Any]]] = {}
+    for face in faces:
+        if face.get('id') is None:
+            continue
+        partitions.setdefault(face.get('modelo') or LEGACY_MODEL, []).append(face)
+
+    name = f"gallery-{generation}-{time.time_ns()}-{os.getpid()}-{threading.get_ident()}"
+    tmp_path = os.path.join(directory, f".{name}.tmp")
+    os.makedirs(tmp_path)
+
+    meta = {
+        "format": FORMAT_VERSION,
+        "generation": generation,
+        "tombstone_mark": tombstone_mark,
+        "sync_window": sync_window,
+        "exported_at": time.time(),
+        "models": {}
+    }
+    for model_name, rows in partitions.items():
+        dimension = np.asarray(rows[0]['embedding']).shape[-1]
+        rows = [row for row in rows
+                if np.asarray(row['embedding']).shape[-1] == dimension]
+        np.save(os.path.join(tmp_path, f"vectors_{model_name}.npy"),
+                np.stack([np.asarray(row['embedding'], dtype=np.float32).ravel()
+                          for row in rows]))
+        np.save(os.path.join(tmp_path, f"keys_{model_name}.npy"),
+                np.asarray([row['id'] for row in rows], dtype=np.int64))
+        np.save(os.path.join(tmp_path, f"aluno_ids_{model_name}.npy"),
+                np.asarray([row['aluno_id'] for row in rows], dtype=np.int64))
+        meta["models"][model_name] = {
+            "rows": len(rows),
+            "dimension": int(dimension),
+            "foto_nome": [row.get('foto_nome') for row in rows],
+            "created_at": [row.get('created_at') for row in rows],
+            "alunos": [row.get('alunos') or {} for row in rows],
+        }
+    with open(os.path.join(tmp_path, META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+    final_path = os.path.join(directory, name)
+    os.replace(tmp_path, final_path)
+    pointer = os.path.join(directory, f".{CURRENT_FILE}.{name}.tmp")
+    with open(pointer, "w", encoding="utf-8") as f:
+        f.write(name)
+    os.replace(pointer, os.path.join(directory, CURRENT_FILE))
+
+    _prune(directory, keep=name)
+    return final_path
+
+
+def _prune(directory: str, keep: str) -> None:
+    exports = sorted(
+        (entry for entry in os.listdir(directory)
+         if entry.startswith("gallery-") and entry != keep),
+        key=lambda entry: os.path.getmtime(os.path.join(directory, entry))
+    )
+    for entry in exports[:max(len(exports) - (KEEP_EXPORTS - 1), 0)]:
+        shutil.rmtree(os.path.join(directory, entry), ignore_errors=True)
+
+
+def load_snapshot(
+    directory: str
+) -> Optional[Tuple[Dict[str, Any], Tuple[Dict[str, Any], ...]]]:
+    """
+    Abre o snapshot vigente com mmap.
+
+    Returns:
+        (meta, registros): meta com generation, tombstone_mark e
+        sync_window; registros no formato de FaceGallery, com 'embedding'
+        sendo uma linha (view) da matriz mapeada. None se não houver
+        snapshot (ou se ele for de um formato antigo).
+    """
+    current = _current_meta(directory)
+    if current is None:
+        return None
+    path, meta = current
+
+    faces = []
+    for model_name, info in meta["models"].items():
+        vectors = np.load(os.path.join(path, f"vectors_{model_name}.npy"), mmap_mode='r')
+        keys = np.load(os.path.join(path, f"keys_{model_name}.npy")).tolist()
+        aluno_ids = np.load(os.path.join(path, f"aluno_ids_{model_name}.npy")).tolist()
+        for row in range(info["rows"]):
+            faces.append({
+                'id': keys[row],
+                'aluno_id': aluno_ids[row],
+                'modelo': model_name,
+                'embedding': vectors[row],
+                'foto_nome': info["foto_nome"][row],
+                'created_at': info["created_at"][row],
+                'alunos': info["alunos"][row],
+            })
+    info = {key: meta.get(key)
+            for key in ("generation", "tombstone_mark", "sync_window")}
+    return info, tuple(faces)
@@ -0,0 +1,192 @@
+"""
+app/services/warmup.py
+----------------------
+Pré-carregamento e aquecimento dos modelos na inicialização.
+
+Sem isto, o primeiro reconhecimento depois de cada deploy ou autoscale
+paga a carga dos modelos do dlib, a construção do Facenet512 e do detector
+OpenCV do DeepFace e a carga da galeria. O lifespan de app/main.py roda
+as etapas abaixo em background; /ready responde 503 até todas terminarem,
+de modo que o balanceador não manda tráfego para um worker frio:
+
+1. dlib: detecção HOG e encoding (modelos de pontos de todos os perfis)
+   em uma imagem sintética
+2. deepface: constrói o modelo e roda um forward com detector "skip"
+3. detector: constrói o detector OpenCV do DeepFace (fallback sem rosto)
+4. pool: com RECOGNITION_WORKERS > 0, inicia e aquece cada processo
+5. galeria: carga da galeria e uma busca em cada partição
+
+Uma etapa que falha (ex.: banco ou download de pesos fora do ar) não
+impede as seguintes e volta a ser tentada em background até dar certo: a
+espera começa em WARMUP_RETRY_DELAY segundos e dobra a cada rodada, até
+WARMUP_RETRY_MAX_DELAY. O último erro aparece em /ready como detalhe da
+etapa, e o worker fica pronto assim que o serviço voltar.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+
+from app.config import settings
+
+# Imagem sintética do aquecimento e a caixa de "rosto" usada no encoding
+WARMUP_IMAGE_SIZE = (300, 300)
+WARMUP_FACE_BOX = (50, 250, 250, 50)
+
+PENDING = "pendente"
+RUNNING = "executando"
+DONE = "ok"
+RETRYING = "aguardando nova tentativa"
+
+
+def _synthetic_image() -> np.ndarray:
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 256, (*WARMUP_IMAGE_SIZE[::-1], 3), dtype=np.uint8)
+
+
+def warm_dlib() -> None:
+    """Detecção e encoding do face_recognition (todos os modelos de pontos)"""
+    from app.services.face_service import DETECTION_PROFILES, _encode_face, _face_locations
+
+    image = _synthetic_image()
+    _face_locations(image, 1.0, 0)
+    for landmarks_model in {profile["landmarks"] for profile in DETECTION_PROFILES.values()}:
+        _encode_face(image, WARMUP_FACE_BOX, 1, landmarks_model)
+
+
+def warm_deepface() -> None:
+    """Constrói o modelo DeepFace e roda um forward (detector "skip")"""
+    from app.services.deepface_service import DEEPFACE_MODEL, _represent
+
+    top, right, bottom, left = WARMUP_FACE_BOX
+    _represent(_synthetic_image()[top:bottom, left:right], DEEPFACE_MODEL, "skip")
+
+
+def warm_detector() -> None:
+    """Constrói o detector do DeepFace (usado quando o HOG não acha rosto)"""
+    from deepface import DeepFace
+    from app.services.deepface_service import DEEPFACE_DETECTOR, _as_deepface_input
+
+    DeepFace.extract_faces(
+        img_path=_as_deepface_input(_synthetic_image()),
+        detector_backend=DEEPFACE_DETECTOR,
+        enforce_detection=False
+    )
+
+
+def warm_worker() -> None:
+    """Aquecimento de um processo do pool (roda dentro dele)"""
+    warm_dlib()
+    warm_deepface()
+
+
+def warm_pool() -> None:
+    """Inicia todos os processos do pool e aquece cada um"""
+    from app.services.worker_pool import get_recognition_pool
+
+    pool = get_recognition_pool()
+    if pool is None:
+        return
+    # Tarefas simultâneas fazem o executor criar todos os processos
+    with ThreadPoolExecutor(max_workers=pool.workers) as threads:
+        for future in [threads.submit(pool.run, warm_worker) for _ in range(pool.workers)]:
+            future.result()
+
+
+def warm_gallery() -> None:
+    """Carrega a galeria e roda uma busca em cada partição"""
+    from app.services.gallery_service import face_gallery
+
+    snapshot = face_gallery.snapshot()
+    rng = np.random.default_rng(0)
+    for model_name in snapshot.models:
+        matrix = snapshot.matrix(model_name)
+        if len(matrix) > 0:
+            matrix.best_match(rng.normal(size=matrix.dimension).astype(np.float32))
+
+
+STAGES: List[Tuple[str, Callable[[], None]]] = [
+    ("dlib", warm_dlib),
+    ("deepface", warm_deepface),
+    ("detector", warm_detector),
+    ("pool", warm_pool),
+    ("galeria", warm_gallery),
+]
+
+
+class WarmupState:
+    """Progresso do aquecimento, consultado pelo endpoint /ready"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages: Dict[str, Dict[str, Any]] = {
+            name: {"status": PENDING} for name, _ in STAGES
+        }
+        self._thread: threading.Thread = None
+
+    @property
+    def ready(self) -> bool:
+        with self._lock:
+            return all(stage["status"] == DONE for stage in self._stages.values())
+
+    def start(self) -> None:
+        """Roda as etapas em background (uma vez por processo)"""
+        if not settings.WARMUP_ENABLED:
+            self.skip()
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="warmup", daemon=True)
+            self._thread.start()
+
+    def skip(self) -> None:
+        """Marca o processo como pronto sem aquecer (perfil crud ou desligado)"""
+        with self._lock:
+            for name in self._stages:
+                self._stages[name] = {"status": DONE, "ignorada": True}
+
+    def _run(self) -> None:
+        failed = [(name, warm) for name, warm in STAGES if not self._attempt(name, warm)]
+        delay = settings.WARMUP_RETRY_DELAY
+        while failed:
+            print(f"⚠️ Aquecimento incompleto ({', '.join(name for name, _ in failed)}), "
+                  f"nova tentativa em {delay:.1f}s")
+            time.sleep(delay)
+            delay = min(delay * 2, settings.WARMUP_RETRY_MAX_DELAY)
+            failed = [(name, warm) for name, warm in failed if not self._attempt(name, warm)]
+        print("✅ Aquecimento concluído")
+
+    def _attempt(self, name: str, warm: Callable[[], None]) -> bool:
+        """Uma tentativa de uma etapa; se falhar, o erro fica até a próxima"""
+        with self._lock:
+            attempts = self._stages[name].get("tentativas", 0) + 1
+            self._stages[name] = {
+                **self._stages[name], "status": RUNNING, "tentativas": attempts
+            }
+        start = time.time()
+        try:
+            warm()
+            stage = {"status": DONE}
+        except Exception as e:
+            print(f"❌ Erro no aquecimento ({name}, tentativa {attempts}): {e}")
+            stage = {"status": RETRYING, "erro": str(e)}
+        stage["tentativas"] = attempts
+        stage["tempo_segundos"] = round(time.time() - start, 2)
+        with self._lock:
+            self._stages[name] = stage
+        return stage["status"] == DONE
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            stages = {name: dict(stage) for name, stage in self._stages.items()}
+        return {
+            "pronto": all(stage["status"] == DONE for stage in stages.values()),
+            "etapas": stages,
+        }
+
+
+# Global instance
+warmup_state = WarmupState()
@@ -0,0 +1,112 @@
+"""
+app/services/worker_pool.py
+---------------------------
+Pool de processos para as etapas pesadas do reconhecimento.
+
+Detecção (HOG do dlib), encoding do face_recognition e DeepFace.represent
+seguram o GIL ou a CPU por dezenas de milissegundos; rodando no processo
+da API, um único reconhecimento trava todas as outras requisições. Com
+RECOGNITION_WORKERS > 0 essas etapas vão para um ProcessPoolExecutor:
+
+1. Cada processo carrega os modelos uma única vez (initializer)
+2. Só as etapas pesadas atravessam o pool (a imagem 300x300 e a caixa do
+   rosto vão, o vetor volta); decodificação, cache de quadros e a busca na
+   galeria continuam no processo da API, que mantém a galeria em memória
+3. Os processos são criados com 'spawn' (TensorFlow não sobrevive a fork)
+
+Com RECOGNITION_WORKERS = 0 as etapas rodam no próprio thread que chamou
+(os endpoints já o tiram do event loop com run_in_threadpool).
+"""
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+
+from app.config import settings
+
+
+def _init_worker() -> None:
+    """Carrega os modelos uma vez por processo do pool"""
+    import face_recognition  # noqa: F401  (carrega os modelos do dlib)
+    from deepface import DeepFace
+    from app.services.deepface_service import DEEPFACE_MODEL
+
+    try:
+        DeepFace.build_model(DEEPFACE_MODEL)
+    except Exception as e:
+        print(f"Erro ao carregar modelo DeepFace no worker: {e}")
+
+
+class RecognitionPool:
+    """
+    ProcessPoolExecutor recriado automaticamente se um processo morrer.
+
+    Attributes:
+        workers: Número de processos
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker
+                )
+            return self._executor
+
+    def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """
+        Executa fn(*args) em um processo do pool e espera o resultado.
+
+        fn precisa ser uma função de módulo (serializável por nome).
+        """
+        executor = self._get_executor()
+        try:
+            return executor.submit(fn, *args).result()
+        except BrokenProcessPool:
+            # Um worker morreu (ex.: falta de memória): recria o pool e
+            # tenta uma vez mais
+            print("⚠️ Pool de reconhecimento quebrado, recriando...")
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            executor.shutdown(wait=False)
+            return self._get_executor().submit(fn, *args).result()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Global instance and accessor
+_pool: Optional[RecognitionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_recognition_pool() -> Optional[RecognitionPool]:
+    """Returns the global recognition pool (None if RECOGNITION_WORKERS is 0)"""
+    global _pool
+    if settings.RECOGNITION_WORKERS <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = RecognitionPool(settings.RECOGNITION_WORKERS)
+        return _pool
+
+
+def shutdown_recognition_pool() -> None:
+    """Stops the pool processes (application shutdown)"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown()
@@ -84,17 +84,54 @@ COMMENT ON COLUMN alunos.ativo IS 'Whether student account is active';
 CREATE TABLE IF NOT EXISTS face_embeddings (
     id SERIAL PRIMARY KEY,
     aluno_id INTEGER NOT NULL REFERENCES alunos(id) ON DELETE CASCADE,
+    modelo VARCHAR(50) NOT NULL DEFAULT 'face_recognition',
     embedding BYTEA NOT NULL,
     foto_nome VARCHAR(255),
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Upgrade for databases created before per-model embeddings
+ALTER TABLE face_embeddings
+    ADD COLUMN IF NOT EXISTS modelo VARCHAR(50) NOT NULL DEFAULT 'face_recognition';
+
 CREATE INDEX idx_face_embeddings_aluno ON face_embeddings(aluno_id);
+CREATE INDEX IF NOT EXISTS idx_face_embeddings_modelo ON face_embeddings(modelo);
 
 COMMENT ON TABLE face_embeddings IS 'Face embedding vectors for facial recognition';
-COMMENT ON COLUMN face_embeddings.embedding IS 'Serialized face embedding vector (128-dim or 512-dim)';
+COMMENT ON COLUMN face_embeddings.embedding IS 'Face embedding in the versioned binary format: "FEMB" header (version, model id, dtype, dimension) + little-endian float32 vector. See app/services/embedding_codec.py';
+COMMENT ON COLUMN face_embeddings.modelo IS 'Model that produced the embedding (face_recognition, Facenet512, ...). Each model is matched only against its own rows';
 COMMENT ON COLUMN face_embeddings.foto_nome IS 'Original photo filename for reference';
 
+-- =====================================================
+-- TABLE: gallery_tombstones (Gallery change log)
+-- =====================================================
+-- Filled by triggers; API nodes poll it (together with the highest
+-- face_embeddings id they have seen) to sync their in-memory gallery
+-- without reloading the whole table.
+CREATE TABLE IF NOT EXISTS gallery_tombstones (
+    id BIGSERIAL PRIMARY KEY,
+    tipo VARCHAR(20) NOT NULL CHECK (tipo IN ('embedding', 'aluno', 'purge')),
+    embedding_id INTEGER,
+    aluno_id INTEGER,
+    purged_until_id BIGINT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Upgrade for databases created before purge markers
+ALTER TABLE gallery_tombstones
+    ADD COLUMN IF NOT EXISTS purged_until_id BIGINT;
+ALTER TABLE gallery_tombstones ALTER COLUMN aluno_id DROP NOT NULL;
+ALTER TABLE gallery_tombstones DROP CONSTRAINT IF EXISTS gallery_tombstones_tipo_check;
+ALTER TABLE gallery_tombstones ADD CONSTRAINT gallery_tombstones_tipo_check
+    CHECK (tipo IN ('embedding', 'aluno', 'purge'));
+
+CREATE INDEX IF NOT EXISTS idx_gallery_tombstones_created ON gallery_tombstones(created_at);
+CREATE INDEX IF NOT EXISTS idx_face_embeddings_created ON face_embeddings(created_at);
+
+COMMENT ON TABLE gallery_tombstones IS 'Deleted embeddings and changed students, polled by the API gallery sync';
+COMMENT ON COLUMN gallery_tombstones.tipo IS '"embedding": embedding_id was deleted; "aluno": nome, turma_id, ativo or check_professor of aluno_id changed; "purge": tombstones up to purged_until_id were deleted';
+COMMENT ON COLUMN gallery_tombstones.purged_until_id IS 'Purge markers only: highest tombstone id removed by purge_gallery_tombstones';
+
 -- =====================================================
 -- TABLE: presencas (Attendances)
 -- =====================================================
@@ -148,6 +185,62 @@ CREATE TRIGGER update_professores_updated_at BEFORE UPDATE ON professores
 CREATE TRIGGER update_alunos_updated_at BEFORE UPDATE ON alunos
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
+-- =====================================================
+-- TRIGGERS: Gallery tombstones
+-- =====================================================
+
+CREATE OR REPLACE FUNCTION log_face_embedding_delete()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO gallery_tombstones (tipo, embedding_id, aluno_id)
+    VALUES ('embedding', OLD.id, OLD.aluno_id);
+    RETURN OLD;
+END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER log_face_embeddings_delete AFTER DELETE ON face_embeddings
+    FOR EACH ROW EXECUTE FUNCTION log_face_embedding_delete();
+
+CREATE OR REPLACE FUNCTION log_aluno_gallery_change()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.nome IS DISTINCT FROM OLD.nome
+       OR NEW.turma_id IS DISTINCT FROM OLD.turma_id
+       OR NEW.ativo IS DISTINCT FROM OLD.ativo
+       OR NEW.check_professor IS DISTINCT FROM OLD.check_professor THEN
+        INSERT INTO gallery_tombstones (tipo, aluno_id)
+        VALUES ('aluno', NEW.id);
+    END IF;
+    RETURN NEW;
+END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER log_alunos_gallery_change AFTER UPDATE ON alunos
+    FOR EACH ROW EXECUTE FUNCTION log_aluno_gallery_change();
+
+-- Purge old tombstones (run periodically, e.g. with pg_cron). The purge
+-- leaves a 'purge' marker with the highest removed id; nodes whose sync
+-- mark is below it reload the whole gallery. Gaps in the id sequence
+-- (rolled back inserts) mean nothing.
+CREATE OR REPLACE FUNCTION purge_gallery_tombstones(dias INTEGER DEFAULT 7)
+RETURNS INTEGER AS $$
+DECLARE
+    removidos INTEGER;
+    ultimo BIGINT;
+BEGIN
+    SELECT MAX(id) INTO ultimo FROM gallery_tombstones
+    WHERE created_at < CURRENT_TIMESTAMP - make_interval(days => dias);
+    IF ultimo IS NULL THEN
+        RETURN 0;
+    END IF;
+    DELETE FROM gallery_tombstones WHERE id <= ultimo;
+    GET DIAGNOSTICS removidos = ROW_COUNT;
+    INSERT INTO gallery_tombstones (tipo, purged_until_id)
+    VALUES ('purge', ultimo);
+    RETURN removidos;
+END;
+$$ LANGUAGE plpgsql;
+
 -- =====================================================
 -- VIEWS: Useful queries for common operations
 -- =====================================================
@@ -309,6 +402,10 @@ DROP VIEW IF EXISTS vw_professores_turmas CASCADE;
 DROP VIEW IF EXISTS vw_alunos_completo CASCADE;
 DROP FUNCTION IF EXISTS get_presencas_by_date CASCADE;
 DROP FUNCTION IF EXISTS update_updated_at_column CASCADE;
+DROP FUNCTION IF EXISTS purge_gallery_tombstones CASCADE;
+DROP FUNCTION IF EXISTS log_aluno_gallery_change CASCADE;
+DROP FUNCTION IF EXISTS log_face_embedding_delete CASCADE;
+DROP TABLE IF EXISTS gallery_tombstones CASCADE;
 DROP TABLE IF EXISTS presencas CASCADE;
 DROP TABLE IF EXISTS face_embeddings CASCADE;
 DROP TABLE IF EXISTS turmas_professores CASCADE;
@@ -0,0 +1,78 @@
+"""
+DeepFace batch equivalence check.
+---------------------------------
+Embeds the same face crop alone (a batch of one goes through
+DeepFace.represent) and as the first item of a batch of two (the single
+forward of deepface_service._represent_batch) and fails (exit code 1) if
+the two embeddings differ. Catches preprocessing drift in the batched
+path, such as a swapped channel order.
+
+Usage:
+    cd backend
+    python scripts/check_embedding_batch.py                      # synthetic crops
+    python scripts/check_embedding_batch.py --image face1.jpg --image face2.jpg
+"""
+import argparse
+import sys
+from pathlib import Path
+
+import numpy as np
+
+# Add backend directory to path for imports
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.deepface_service import DEEPFACE_MODEL, _represent_batch
+
+
+def load_crops(paths: list) -> list:
+    """RGB crops from the given files, or two synthetic ones"""
+    if paths:
+        from app.services.face_service import load_image
+
+        crops = []
+        for path in paths:
+            with open(path, "rb") as f:
+                crops.append(load_image(f.read(), preprocess=False))
+        return crops
+
+    rng = np.random.default_rng(0)
+    # Different red/blue levels so a swapped channel order changes the result
+    base = rng.integers(0, 256, (160, 160, 3), dtype=np.uint8)
+    base[:, :, 0] = base[:, :, 0] // 2 + 120
+    base[:, :, 2] = base[:, :, 2] // 4
+    return [base, rng.integers(0, 256, (180, 150, 3), dtype=np.uint8)]
+
+
+def cosine_distance(a: np.ndarray, b: np.ndarray) -> float:
+    return float(1.0 - (a @ b) / (np.linalg.norm(a) * np.linalg.norm(b)))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--image", action="append", default=[],
+                        help="Face crop file (repeat for the second crop)")
+    parser.add_argument("--model", default=DEEPFACE_MODEL,
+                        help=f"DeepFace model (default: {DEEPFACE_MODEL})")
+    parser.add_argument("--max-distance", type=float, default=1e-4,
+                        help="Largest accepted cosine distance (default: 1e-4)")
+    args = parser.parse_args()
+
+    crops = load_crops(args.image)
+    if len(crops) < 2:
+        crops.append(crops[0][:, ::-1].copy())
+
+    single = _represent_batch(crops[:1], args.model)[0]
+    batched = _represent_batch(crops[:2], args.model)[0]
+    if single is None or batched is None:
+        print("❌ Could not extract the embeddings")
+        return 1
+
+    distance = cosine_distance(np.asarray(single), np.asarray(batched))
+    ok = distance <= args.max_distance
+    print(f"{'✅' if ok else '❌'} {args.model}: batch of 1 vs batch of 2, "
+          f"cosine distance {distance:.2e} (max {args.max_distance:.0e})")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""
+Import-time regression check.
+-----------------------------
+Imports app.main in a fresh interpreter for each APP_PROFILE and fails
+(exit code 1) if the import pulls in a heavy dependency, builds the
+SQLAlchemy engine, or takes longer than the time budget.
+
+Heavy dependencies (face_recognition/dlib, DeepFace/TensorFlow and the
+comparison_service plotting/metrics stack) must only load on first use.
+The "crud" profile must not even import the recognition modules.
+
+Usage:
+    cd backend
+    python scripts/check_import_time.py                  # both profiles
+    python scripts/check_import_time.py --profile crud --max-seconds 1.5
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Must never be imported by `import app.main`, in any profile
+HEAVY_MODULES = [
+    "face_recognition", "dlib", "deepface", "tensorflow", "keras",
+    "matplotlib", "seaborn", "pandas", "sklearn",
+]
+
+# Must not be imported by `import app.main` in the crud profile
+RECOGNITION_MODULES = [
+    "app.routers.reconhecimento",
+    "app.services.face_service",
+    "app.services.deepface_service",
+    "app.services.hybrid_face_service",
+    "app.services.warmup",
+]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - start
+import app.models.db_session as db_session
+print(json.dumps({
+    "seconds": elapsed,
+    "modules": [name for name in %r if name in sys.modules],
+    "engine_created": db_session._engine is not None,
+}))
+"""
+
+
+def probe(profile: str, modules: list) -> dict:
+    """Import app.main in a fresh interpreter and report what it loaded"""
+    env = dict(os.environ, APP_PROFILE=profile)
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE % (modules,)],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import app.main failed:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def check(profile: str, max_seconds: float) -> bool:
+    modules = HEAVY_MODULES + (RECOGNITION_MODULES if profile == "crud" else [])
+    report = probe(profile, modules)
+    errors = []
+    if report["modules"]:
+        errors.append(f"imported at startup: {', '.join(report['modules'])}")
+    if report["engine_created"]:
+        errors.append("SQLAlchemy engine created at import time")
+    if report["seconds"] > max_seconds:
+        errors.append(f"import took {report['seconds']:.2f}s (budget {max_seconds:.2f}s)")
+
+    status = "❌" if errors else "✅"
+    print(f"{status} APP_PROFILE={profile}: import app.main in {report['seconds']:.2f}s")
+    for error in errors:
+        print(f"   - {error}")
+    return not errors
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--profile", choices=["full", "crud"], action="append",
+                        help="Profile to check (default: both)")
+    parser.add_argument("--max-seconds", type=float, default=3.0,
+                        help="Time budget for `import app.main` (default: 3.0)")
+    args = parser.parse_args()
+
+    profiles = args.profile or ["full", "crud"]
+    ok = all([check(profile, args.max_seconds) for profile in profiles])
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
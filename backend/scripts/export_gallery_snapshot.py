@@ -0,0 +1,60 @@
+"""
+Export the face gallery to a local snapshot.
+--------------------------------------------
+Loads every face_embeddings row, decodes it and writes the mmap-able
+snapshot used by the API workers at startup (see
+app/services/snapshot_file.py). Run it after a deploy or from cron so new
+workers start from a recent generation.
+
+Usage:
+    cd backend
+    python scripts/export_gallery_snapshot.py                # GALLERY_SNAPSHOT_DIR
+    python scripts/export_gallery_snapshot.py --dir /var/cache/chamada
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# Add backend directory to path for imports
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.config import settings
+from app.services.db_service import db_manager
+from app.services.gallery_service import FaceGallery
+from app.services import snapshot_file
+
+
+def export(directory: str) -> None:
+    print("=" * 60)
+    print("💾 EXPORTAÇÃO DO SNAPSHOT DA GALERIA")
+    print("=" * 60)
+
+    if not directory:
+        print("❌ Informe --dir ou defina GALLERY_SNAPSHOT_DIR")
+        return
+
+    start = time.time()
+    faces = FaceGallery._decode_rows(db_manager.get_all_faces())
+    if not faces:
+        print("❌ No face embeddings found in database")
+        return
+    loaded = time.time()
+
+    path = snapshot_file.export_snapshot(faces, directory)
+    print(f"✅ {len(faces)} embeddings exportados para {path}")
+    print(f"🔢 Geração: {snapshot_file.snapshot_generation(faces)}")
+    print(f"⏱️  Carga: {loaded - start:.2f}s | escrita: {time.time() - loaded:.2f}s")
+
+    start = time.time()
+    snapshot_file.load_snapshot(directory)
+    print(f"⚡ Abertura com mmap: {(time.time() - start) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--dir", default=settings.GALLERY_SNAPSHOT_DIR,
+        help="snapshot directory (default: GALLERY_SNAPSHOT_DIR)"
+    )
+    export(parser.parse_args().dir)
@@ -7,6 +7,7 @@ import os
 sys.path.insert(0, os.path.dirname(__file__))
 
 from app.services.db_service import db_manager
+from app.services.embedding_codec import decode_embedding, is_legacy
 import base64
 import pickle
 
@@ -33,12 +34,11 @@ def check_embeddings():
         if isinstance(embedding_data, str):
             print(f"    Tamanho: {len(embedding_data)} caracteres")
             
-            # Check if base64 is valid
+            # Check if the embedding can be decoded (binary or legacy format)
             try:
-                # Try to decode
-                embedding_bytes = base64.b64decode(embedding_data)
-                embedding_array = pickle.loads(embedding_bytes)
-                print(f"    ✅ Base64 válido! Array shape: {embedding_array.shape}")
+                embedding_array = decode_embedding(embedding_data)
+                formato = "antigo (pickle)" if is_legacy(embedding_data) else "binário"
+                print(f"    ✅ Formato {formato} válido! Array shape: {embedding_array.shape}")
             except Exception as e:
                 print(f"    ❌ ERRO ao decodificar: {e}")
                 
@@ -66,7 +66,7 @@ def fix_embeddings():
         aluno_id = face.get('aluno_id')
         embedding_data = face.get('embedding')
         
-        if not isinstance(embedding_data, str):
+        if not isinstance(embedding_data, str) or not is_legacy(embedding_data):
             continue
         
         # Check if needs padding
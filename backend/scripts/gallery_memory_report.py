@@ -0,0 +1,63 @@
+"""
+Gallery memory report.
+----------------------
+Shows the resident bytes per embedding of the in-memory gallery for each
+storage mode (float32, float16, int8) and the actual usage of the mode
+configured in GALLERY_STORAGE_MODE.
+
+Usage:
+    cd backend
+    python scripts/gallery_memory_report.py                     # current gallery
+    python scripts/gallery_memory_report.py --rows 50000 --dim 512   # estimate only
+"""
+import argparse
+import sys
+from pathlib import Path
+
+# Add backend directory to path for imports
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.quantization import memory_report
+
+
+def print_estimate(model_name: str, rows: int, dimension: int) -> None:
+    print(f"\n📦 {model_name}: {rows} embeddings x {dimension} dimensões")
+    print(f"   {'modo':<8} {'matriz (B)':>11} {'exato (B)':>10} "
+          f"{'total (B)':>10} {'total (MB)':>11}")
+    for mode, usage in memory_report(dimension, rows).items():
+        print(f"   {mode:<8} {usage['matrix_bytes']:>11} {usage['exact_bytes']:>10} "
+              f"{usage['bytes_per_embedding']:>10} {usage['total_mb']:>11}")
+
+
+def report_gallery() -> None:
+    from app.config import settings
+    from app.services.gallery_service import face_gallery
+
+    snapshot = face_gallery.snapshot()
+    if len(snapshot) == 0:
+        print("❌ No face embeddings found in database")
+        return
+
+    print(f"Modo configurado: GALLERY_STORAGE_MODE={settings.GALLERY_STORAGE_MODE}")
+    for model_name, usage in snapshot.memory_usage().items():
+        print_estimate(model_name, usage["rows"], usage["dimension"])
+        print(f"   atual ({usage['storage']}): {usage['matrix_bytes']} bytes na matriz "
+              f"({usage['matrix_bytes_per_embedding']} B/embedding)")
+        print(f"   vetores exatos: {usage['exact_bytes']} bytes, "
+              f"{usage['exact_mapped_bytes']} no mmap do snapshot "
+              f"({usage['segments']} segmentos)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, help="estimate for this many embeddings")
+    parser.add_argument("--dim", type=int, default=512, help="embedding dimension")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("📊 MEMÓRIA DA GALERIA DE ROSTOS")
+    print("=" * 60)
+    if args.rows:
+        print_estimate("estimativa", args.rows, args.dim)
+    else:
+        report_gallery()
@@ -0,0 +1,85 @@
+"""
+Migrate face embeddings to the versioned binary format.
+--------------------------------------------------------
+Rewrites every face_embeddings row still stored as base64(pickle(ndarray))
+using app/services/embedding_codec.py (header + raw little-endian float32).
+Rows already in the new format are skipped, so the script can be re-run.
+
+Usage:
+    cd backend
+    python scripts/migrate_embeddings.py            # dry run (report only)
+    python scripts/migrate_embeddings.py --apply    # rewrite rows
+"""
+import argparse
+import sys
+from pathlib import Path
+
+# Add backend directory to path for imports
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.db_service import db_manager
+from app.services.embedding_codec import (
+    LEGACY_MODEL,
+    decode_embedding,
+    encode_embedding,
+    is_legacy,
+    to_bytea_literal,
+)
+
+
+def migrate(apply: bool) -> None:
+    print("=" * 60)
+    print("🔄 MIGRAÇÃO DE EMBEDDINGS PARA O FORMATO BINÁRIO")
+    print("=" * 60)
+
+    faces = db_manager.get_all_faces()
+    if not faces:
+        print("❌ No face embeddings found in database")
+        return
+
+    migrated = skipped = failed = 0
+    bytes_before = bytes_after = 0
+
+    for face in faces:
+        embedding_id = face.get('id')
+        embedding_data = face.get('embedding')
+
+        try:
+            if not is_legacy(embedding_data):
+                skipped += 1
+                continue
+
+            vector = decode_embedding(embedding_data)
+            new_data = to_bytea_literal(
+                encode_embedding(vector, model_name=LEGACY_MODEL)
+            )
+            bytes_before += len(embedding_data)
+            bytes_after += len(new_data)
+
+            if apply:
+                db_manager.update_embedding(embedding_id, new_data)
+            migrated += 1
+        except Exception as e:
+            failed += 1
+            print(f"  ❌ Embedding {embedding_id} "
+                  f"(aluno {face.get('aluno_id')}): {e}")
+
+    action = "migrados" if apply else "a migrar"
+    print(f"\n✅ {migrated} embeddings {action}")
+    print(f"⏭️  {skipped} já no formato novo")
+    if failed:
+        print(f"❌ {failed} com erro (recadastre esses alunos)")
+    if migrated:
+        print(f"📦 Payload: {bytes_before} → {bytes_after} caracteres "
+              f"({bytes_after / bytes_before:.0%})")
+    if not apply and migrated:
+        print("\n💡 Execute com --apply para gravar as alterações")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--apply", action="store_true",
+        help="rewrite rows (default: dry run)"
+    )
+    migrate(parser.parse_args().apply)